@@ -0,0 +1,152 @@
+# answer_index.py
+# Serves precomputed answers to STAGE_CARDS common_questions (see precompute_answers.py).
+# - Store: JSON file {stage_id: [{question, answer, vetted, ...}]}; only vetted answers are served
+# - Index: character-trigram TF-IDF vectors per question, cosine similarity against the message
+# - Matches are stage-scoped (an answer is written for one stage card) and must clear a threshold;
+#   below it the caller falls back to the LLM
+# - The question must also cover most of the message: trigram cosine stays high when a known
+#   question is followed by something else ("What is discovery? and when is my next date?")
+# - The store is reloaded when the file changes, so re-running the job needs no restart
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import math
+import os
+import re
+import threading
+
+
+PRECOMPUTED_ANSWERS_PATH = os.getenv(
+    "PRECOMPUTED_ANSWERS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "precomputed_answers.json"),
+)
+ANSWER_INDEX_THRESHOLD = float(os.getenv("ANSWER_INDEX_THRESHOLD", "0.6"))
+# a message longer than this many times the matched question is asking more than that question
+ANSWER_INDEX_MAX_LENGTH_RATIO = float(os.getenv("ANSWER_INDEX_MAX_LENGTH_RATIO", "1.3"))
+ANSWER_INDEX_ENABLED = os.getenv("ANSWER_INDEX_ENABLED", "1") != "0"
+
+
+def normalize_question(text: str) -> str:
+    t = (text or "").lower().replace("’", "'")
+    t = re.sub(r"[^a-z0-9' ]+", " ", t)
+    return " ".join(t.split())
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    t = f" {normalize_question(text)} "
+    return Counter(t[i:i + n] for i in range(max(0, len(t) - n + 1)))
+
+
+@dataclass(frozen=True)
+class AnswerMatch:
+    stage_id: str
+    question: str
+    answer: str
+    score: float
+
+
+class AnswerIndex:
+    def __init__(
+        self,
+        entries: Dict[str, List[Dict[str, Any]]],
+        *,
+        threshold: float = ANSWER_INDEX_THRESHOLD,
+        max_length_ratio: float = ANSWER_INDEX_MAX_LENGTH_RATIO,
+    ):
+        self.threshold = threshold
+        self.max_length_ratio = max_length_ratio
+        self._docs: Dict[str, List[Tuple[Dict[str, float], float, Dict[str, Any]]]] = {}
+
+        served = [(sid, e) for sid, items in (entries or {}).items() for e in items or [] if e.get("vetted")]
+        grams = [(sid, e, char_ngrams(e.get("question", ""))) for sid, e in served]
+
+        # idf over every served question, so generic grams ("what", "is ") weigh little
+        df: Counter = Counter()
+        for _, _, g in grams:
+            df.update(g.keys())
+        n_docs = max(1, len(grams))
+        self._idf = {g: math.log((1 + n_docs) / (1 + d)) + 1.0 for g, d in df.items()}
+
+        for sid, e, g in grams:
+            vec = self._weigh(g)
+            self._docs.setdefault(sid, []).append((vec, _norm(vec), e))
+
+    def _weigh(self, grams: Counter) -> Dict[str, float]:
+        # unseen grams get the max idf: they make a message less similar, never more
+        max_idf = max(self._idf.values(), default=1.0)
+        return {g: c * self._idf.get(g, max_idf) for g, c in grams.items()}
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._docs.values())
+
+    def best(self, stage_id: Optional[str], message: str) -> Optional[AnswerMatch]:
+        """Best match for this stage regardless of threshold (None if the stage has no answers)."""
+        docs = self._docs.get(stage_id or "")
+        if not docs:
+            return None
+        q = self._weigh(char_ngrams(message))
+        q_norm = _norm(q)
+        if not q_norm:
+            return None
+
+        best: Optional[AnswerMatch] = None
+        for vec, d_norm, e in docs:
+            dot = sum(w * vec.get(g, 0.0) for g, w in q.items())
+            score = dot / (q_norm * d_norm) if d_norm else 0.0
+            if best is None or score > best.score:
+                best = AnswerMatch(stage_id=stage_id, question=e["question"], answer=e["answer"], score=round(score, 3))
+        return best
+
+    def match(self, stage_id: Optional[str], message: str) -> Optional[AnswerMatch]:
+        hit = self.best(stage_id, message)
+        if hit is None or hit.score < self.threshold:
+            return None
+        if len(normalize_question(message)) > self.max_length_ratio * len(normalize_question(hit.question)):
+            return None
+        return hit
+
+
+def _norm(vec: Dict[str, float]) -> float:
+    return math.sqrt(sum(w * w for w in vec.values()))
+
+
+# -------------------------
+# Store loading (reloaded when the file changes)
+# -------------------------
+
+def load_answers(path: str = PRECOMPUTED_ANSWERS_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_index_lock = threading.Lock()
+_index: Optional[AnswerIndex] = None
+# (path, mtime) the cached index was loaded from
+_index_source: Optional[Tuple[str, Optional[float]]] = None
+
+
+def get_answer_index(path: str = PRECOMPUTED_ANSWERS_PATH) -> AnswerIndex:
+    global _index, _index_source
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    source = (os.path.abspath(path), mtime)
+    with _index_lock:
+        if _index is None or source != _index_source:
+            _index = AnswerIndex(load_answers(path))
+            _index_source = source
+        return _index
+
+
+def match_common_question(stage_id: Optional[str], message: str) -> Optional[AnswerMatch]:
+    if not ANSWER_INDEX_ENABLED:
+        return None
+    return get_answer_index().match(stage_id, message)
@@ -5,18 +5,39 @@ load_dotenv()
 print("OPENAI_API_KEY loaded:", os.getenv("OPENAI_API_KEY")) # loads env var so OpenAI API key is available
 
 # importing FastAPI framework and typing utilities
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Optional, List, Any, Dict
+import json
+import time
+
+import openai
 
 # internal project imports for use by API endpoints
 from main import fetch_case_by_id, build_llm_context_pack
-from llm_client_openai import call_llm_with_context_pack
-from memory_store import InMemorySessionStore
-from stats_service import compute_comparison_stats_for_user_context
-from tools import build_timeline
+from deadline import CHAT_DEADLINE_SEC, Deadline, DeadlineExceeded
+from llm_client_openai import (
+    call_llm_with_context_pack,
+    prefetch_metrics,
+    run_tool,
+    stream_llm_with_context_pack,
+)
+from llm_cache import RESPONSE_CACHE
+from llm_telemetry import TELEMETRY
+from memory_store import InMemorySessionStore, Session
+from cache_warmer import CohortStatsWarmer
+from conversation_summary import ConversationSummarizer
+from tool_memo import ToolMemo
+from tools import build_timeline, get_outcome_stats
+from answer_index import match_common_question
+from explanation_batch import EXPLANATION_STORE
+from intent_engine import SEARCH_PREFIX, classify_intents
+from template_answers import fast_path_mode, render_timeline_summary, render_where_am_i
 
 from simulator_tree_loader import get_sim_tree_v1, pick_root_for_stage  # ✅ new
 
@@ -32,6 +53,47 @@ print("LOADED api.py")
 def health():
     return {"status": "ok"}
 
+# --------------------------------------------------------------------------------------------------------------------------------------------
+# cohort stats warmer - precomputes popular cohorts at startup + on a schedule (background thread)
+
+warmer = CohortStatsWarmer()
+
+
+@app.on_event("startup")
+def start_stats_warmer():
+    if os.getenv("STATS_WARMER_ENABLED", "1") != "0":
+        warmer.start()
+    else:
+        warmer.disable()
+
+
+@app.on_event("shutdown")
+def stop_stats_warmer():
+    warmer.stop()
+
+# readiness endpoint - 503 until the first warming pass has finished
+
+@app.get("/ready")
+def ready():
+    status = warmer.status()
+    body = {"status": "ready" if status["ready"] else "warming", "warmer": status}
+    return JSONResponse(content=body, status_code=200 if status["ready"] else 503)
+
+# metrics endpoint - speculative tool pre-execution + LLM response cache counters
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "tool_prefetch": prefetch_metrics(),
+        "llm_cache": {"hits": RESPONSE_CACHE.hits, "misses": RESPONSE_CACHE.misses},
+    }
+
+# per-intent LLM call telemetry: tokens, TTFT, latency, completions, tools (see llm_telemetry.py)
+
+@app.get("/metrics/llm")
+def llm_metrics(recent: int = 20):
+    return TELEMETRY.snapshot(recent=recent)
+
 # --------------------------------------------------------------------------------------------------------------------------------------------
 # CORS middleware - allows frontend (React app) to call backend API
 
@@ -51,9 +113,18 @@ class CaseRequest(BaseModel):
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
 # /explain-case endpoint - basic endpoint that returns LLM explanation for a case
+# (served from the explanation_batch.py store when the case was pre-generated)
 
 @app.post("/explain-case")
 def explain_case(req: CaseRequest):
+    stored = EXPLANATION_STORE.get(req.case_id)
+    if stored is not None:
+        return {
+            "case_id": req.case_id,
+            "explanation": stored["explanation"],
+            "stage": stored.get("stage"),
+        }
+
     case_data = fetch_case_by_id(req.case_id)
     if not case_data:
         return {"error": "Case not found"}
@@ -72,49 +143,30 @@ def explain_case(req: CaseRequest):
 
 store = InMemorySessionStore()
 
+# rolling summary of older turns, refreshed in the background
+summarizer = ConversationSummarizer()
+
 # --------------------------------------------------------------------------------------------------------------------------------------------
 # intent detection functions - detects special user intents (timeline or procedural simulator)
+# All trigger phrases live in intent_engine.py and are matched in a single pass; prepare_chat_turn
+# classifies once per message. These wrappers keep the old one-intent-at-a-time helpers working.
 
 def is_timeline_intent(text: str) -> bool:
-    t = (text or "").strip().lower()
-    if "timeline" in t:
-        return True
-    triggers = [
-        "show my timeline",
-        "show timeline",
-        "court dates",
-        "next court date",
-        "chronological",
-        "in order",
-        "sequence of events",
-        "what happened so far",
-        "what has happened so far",
-    ]
-    return any(p in t for p in triggers)
+    return classify_intents(text).has("timeline")
+
+
+def is_where_am_i_intent(text: str) -> bool:
+    return classify_intents(text).has("where_am_i")
 
 
 def is_simulator_intent(text: str) -> bool:
-    t = (text or "").strip().lower()
-    triggers = [
-        "procedural simulator",
-        "simulator",
-        "choose your own adventure",
-        "choose-your-own-adventure",
-        "what happens next",
-        "what usually happens next",
-        "what comes next",
-        "next steps",
-        "what usually comes next",
-        "plea discussion",
-        "plea discussions",
-        "motions",
-        "motion to suppress",
-        "motion to dismiss",
-        "discovery",
-        "trial-setting",
-        "trial setting",
-    ]
-    return any(p in t for p in triggers)
+    return classify_intents(text).has("simulator")
+
+
+# predicts whether the model will want search_case_record (and which slice) so it can be
+# pre-executed; highest-priority matching slice wins
+def predict_search_query_type(text: str) -> Optional[str]:
+    return classify_intents(text).first(SEARCH_PREFIX)
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
 # chat request/response schemas - powers the main chat endpoint
@@ -133,55 +185,159 @@ class ChatResponse(BaseModel):
     ui_cards: List[Dict[str, Any]] = []
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
-# MAIN CHAT ENDPOINT
+# per-stage timings (ms) for one request, reported in the Server-Timing header (see load_harness.py)
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - t0) * 1000.0
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+# chat turn preparation - everything before the LLM call, shared by /chat and /chat/stream
+
+@dataclass
+class ChatTurn:
+    session: Session
+    stage_label: str = ""
+    ui_cards: List[Dict[str, Any]] = field(default_factory=list)
+    # set when the reply is already known (no LLM call needed)
+    explanation: Optional[str] = None
+    context_pack: Optional[Dict[str, Any]] = None
+    history: List[Dict[str, str]] = field(default_factory=list)
+    memo: Optional[ToolMemo] = None
+    # tools already run and inlined into context_pack; not offered to the model again
+    prefetched_tools: List[str] = field(default_factory=list)
+    # intent branch for telemetry: timeline | simulator | stats | plain
+    intent: str = "plain"
+    # request budget shared by every downstream call of this turn
+    deadline: Optional[Deadline] = None
+
+
+TOOL_PREFETCH_ENABLED = os.getenv("TOOL_PREFETCH_ENABLED", "1") != "0"
+
+# How long a session reuses its fetched case + context pack before going back to Socrata
+CASE_CONTEXT_TTL_SEC = float(os.getenv("CASE_CONTEXT_TTL_SEC", "600"))
+
+# Intents that ask for something a canned common-question answer can't give (cards, case specifics)
+INDEX_BLOCKING_INTENTS = ("stats", "timeline", "where_am_i")
+# Simulator triggers that are also common-question topics ("What is discovery?")
+INDEX_OVERRIDABLE_SIMULATOR_TRIGGERS = ("discovery",)
+
+
+def session_case_context(
+    session: Session,
+    timings: Dict[str, float],
+    deadline: Optional[Deadline] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Context pack for session.case_id, fetched once and reused by later turns until it's older than
+    CASE_CONTEXT_TTL_SEC or the case_id changes. Returns a shallow copy: turns add their own
+    top-level keys (stats, timeline, latest message) and must not leak them into the next turn.
+    None when the case can't be found (not remembered, so the next turn tries again).
+    """
+    fresh = (
+        session.context_pack is not None
+        and session.case_context_id == session.case_id
+        and time.time() - session.case_fetched_ts < CASE_CONTEXT_TTL_SEC
+    )
+    if not fresh:
+        with timed(timings, "case_fetch"):
+            case_data = fetch_case_by_id(session.case_id, deadline=deadline)
+        if not case_data:
+            return None
+        with timed(timings, "context"):
+            context_pack = build_llm_context_pack(case_data)
+        session.case_context_id = session.case_id
+        session.case_data = case_data
+        session.context_pack = context_pack
+        session.case_fetched_ts = time.time()
+    return dict(session.context_pack)
+
+
+def _template_turn(
+    session: Session,
+    stage_label: str,
+    ui_cards: List[Dict[str, Any]],
+    intent: str,
+    render,
+) -> ChatTurn:
+    """Deterministic reply (template_answers.py): no LLM call, counted as a non-LLM turn."""
+    explanation = render()
+    TELEMETRY.record_non_llm(intent)
+    return ChatTurn(
+        session=session,
+        stage_label=stage_label,
+        ui_cards=ui_cards,
+        explanation=explanation,
+        intent=intent,
+    )
+
+
+def prepare_chat_turn(
+    req: ChatRequest,
+    timings: Optional[Dict[str, float]] = None,
+    deadline: Optional[Deadline] = None,
+) -> ChatTurn:
+    timings = timings if timings is not None else {}
     session = store.get_or_create(req.session_id)
 
     if req.case_id:
         session.case_id = req.case_id
 
     store.append(session, "user", req.user_message)
+    summarizer.maybe_schedule(session)
+
+    # one memo per request, backed by the session's memo so later turns reuse tool results
+    memo = ToolMemo(session.tool_memo)
 
     if not session.case_id:
         reply = "Please enter a case ID first so I can ground the conversation in your case."
-        store.append(session, "assistant", reply)
-        return ChatResponse(session_id=session.session_id, explanation=reply, ui_cards=[])
+        return ChatTurn(session=session, explanation=reply)
 
-    case_data = fetch_case_by_id(session.case_id)
-    if not case_data:
+    try:
+        context_pack = session_case_context(session, timings, deadline)
+    except DeadlineExceeded:
+        return ChatTurn(session=session, explanation=OUT_OF_TIME_REPLY)
+    if context_pack is None:
         reply = f"I can’t find case ID {session.case_id} in the public record sources I'm checking right now."
-        store.append(session, "assistant", reply)
-        return ChatResponse(session_id=session.session_id, explanation=reply, ui_cards=[])
-
-    context_pack = build_llm_context_pack(case_data)
+        return ChatTurn(session=session, explanation=reply)
 
    
 
     
     ui_cards_out: List[Dict[str, Any]] = []
 
-    msg = (req.user_message or "").lower()
+    # every intent this message triggers, from one scan (intent_engine.py)
+    intents = classify_intents(req.user_message)
+
+    # --------------------------------------------------------------------------------------------------------------------------------------------
+    # common questions - precomputed, vetted answers for the stage's common_questions (answer_index.py).
+    # Only when the message asks for nothing a canned answer can't give: no stats, timeline or where-am-I intent.
+    # The simulator yields only when its sole trigger is a common-question topic ("What is discovery?"); that
+    # trigger also yields to the explicit intents ("What is discovery? show my timeline" gets the timeline).
+    # Below the threshold (or on a much longer message) the message is routed as usual.
+
+    explicit_request = bool(req.wantsStats) or any(intents.has(i) for i in INDEX_BLOCKING_INTENTS)
+    # "discovery" alone names a topic, not a simulator request
+    topic_only_simulator = intents.triggered_only_by("simulator", INDEX_OVERRIDABLE_SIMULATOR_TRIGGERS)
+    wants_simulator = intents.has("simulator") and not (topic_only_simulator and explicit_request)
+
+    if not explicit_request and (not wants_simulator or topic_only_simulator):
+        hit = match_common_question((context_pack.get("stage") or {}).get("stage_id"), req.user_message)
+        if hit is not None:
+            stage_label = (context_pack.get("stage") or {}).get("stage_label") or ""
+            return _template_turn(session, stage_label, ui_cards_out, "common_question", lambda: hit.answer)
 
     # --------------------------------------------------------------------------------------------------------------------------------------------
     # stats logic - adds outcome stats when user asks about similar cases
-    wants_stats = bool(req.wantsStats) or any(
-        k in msg
-        for k in [
-            "similar cases",
-            "cases like mine",
-            "how do cases like",
-            "how do similar",
-            "outcome stats",
-            "statistics",
-            "stats",
-            "how often",
-            "rate of",
-            "usually turn out",
-            "what do outcomes look like",
-        ]
-    )
+    wants_stats = bool(req.wantsStats) or intents.has("stats")
 
     if wants_stats:
         try:
@@ -190,11 +346,15 @@ def chat(req: ChatRequest):
             user_offense_category = charge.get("offense_category") or charge.get("updated_offense_category")
             user_charge_class = charge.get("class") or charge.get("charge_class")
 
-            stats = compute_comparison_stats_for_user_context(
-                user_stage_id=user_stage_id,
-                user_offense_category=user_offense_category,
-                user_charge_class=user_charge_class,
-            )
+            warmer.record(user_stage_id, user_offense_category, user_charge_class)
+            stats_args = {
+                "stage_id": user_stage_id,
+                "offense_category": user_offense_category,
+                "charge_class": user_charge_class,
+            }
+            # same memo key as the LLM's get_outcome_stats tool call, so it isn't computed twice
+            with timed(timings, "stats"):
+                stats = memo.call("get_outcome_stats", stats_args, lambda: get_outcome_stats(**stats_args, deadline=deadline))
             context_pack["comparison_stats"] = stats
             context_pack["ui_stats"] = stats
 
@@ -237,26 +397,20 @@ def chat(req: ChatRequest):
     # -------------------------
     # History
     # -------------------------
-    history_lines = []
-    for m in session.messages[-12:]:
-        prefix = "User" if m.role == "user" else "Assistant"
-        history_lines.append(f"{prefix}: {m.content}")
-    context_pack["chat_history"] = "\n".join(history_lines)
-
     context_pack["active_case_id"] = session.case_id
     context_pack["latest_user_message"] = req.user_message
 
-    history = []
-    for m in session.messages[-13:-1]:
-        if m.role in ("user", "assistant"):
-            history.append({"role": m.role, "content": m.content})
+    # older turns are carried by the rolling digest; recent ones raw, within the token budget
+    summary, history = summarizer.prompt_history(session)
+    if summary:
+        context_pack["conversation_summary"] = summary
 
     stage_label = (context_pack.get("stage") or {}).get("stage_label") or ""
 
     # --------------------------------------------------------------------------------------------------------------------------------------------
     # simulator intent branch - returns interactive procedural simulator based on case stage
 
-    if is_simulator_intent(req.user_message):
+    if wants_simulator:
         tree = get_sim_tree_v1()
         root_id = pick_root_for_stage(tree, stage_label)
 
@@ -273,19 +427,25 @@ def chat(req: ChatRequest):
             "Here’s a procedural simulator rooted at your current stage. "
             "Tap any option to explore what’s common at that fork (educational, not a prediction)."
         )
-        store.append(session, "assistant", explanation)
 
-        return ChatResponse(
-            session_id=session.session_id,
+        # answered without the LLM; counted so the branch still shows up in /metrics/llm
+        TELEMETRY.record_non_llm("simulator")
+
+        return ChatTurn(
+            session=session,
             stage_label=stage_label,
-            explanation=explanation,
             ui_cards=ui_cards_out,
+            explanation=explanation,
+            intent="simulator",
         )
 
     # --------------------------------------------------------------------------------------------------------------------------------------------
     # timeline intent branch - builds timeline showing chronological case events when user intent detected
 
-    if is_timeline_intent(req.user_message):
+    intent = "stats" if wants_stats else "plain"
+
+    if intents.has("timeline"):
+        intent = "timeline"
         try:
             timeline_payload = build_timeline(context_pack)
             ui_cards_out.append({"type": "timeline_card", "payload": timeline_payload})
@@ -301,34 +461,181 @@ def chat(req: ChatRequest):
             ui_cards_out.append({"type": "timeline_card", "payload": fallback})
             context_pack["ui_timeline"] = fallback
 
-        context_pack["latest_user_message"] = (
-            "The user asked to see their timeline. "
-            "Briefly describe what the timeline shows (events + dates). "
-            "Then explain what the highlighted 'current' node means. "
-            "Keep it short (6-10 lines)."
-        )
+        mode = fast_path_mode("timeline")
+        if mode == "template" and not wants_stats:
+            return _template_turn(
+                session, stage_label, ui_cards_out, "timeline",
+                lambda: render_timeline_summary(context_pack["ui_timeline"], context_pack),
+            )
 
-        explanation = call_llm_with_context_pack(context_pack, history=history)
-        store.append(session, "assistant", explanation)
+        if mode == "template+llm":
+            context_pack["template_draft"] = render_timeline_summary(context_pack["ui_timeline"], context_pack)
+            context_pack["latest_user_message"] = (
+                "The user asked to see their timeline. "
+                "Lightly rewrite template_draft in your own voice. Keep every event and date exactly as given. "
+                "Keep it short (6-10 lines)."
+            )
+        else:
+            context_pack["latest_user_message"] = (
+                "The user asked to see their timeline. "
+                "Briefly describe what the timeline shows (events + dates). "
+                "Then explain what the highlighted 'current' node means. "
+                "Keep it short (6-10 lines)."
+            )
 
-        return ChatResponse(
-            session_id=session.session_id,
-            stage_label=stage_label,
-            explanation=explanation,
-            ui_cards=ui_cards_out,
-        )
+    # --------------------------------------------------------------------------------------------------------------------------------------------
+    # "where am I" intent branch - current stage straight from the stage card
+
+    elif intents.has("where_am_i") and not wants_stats:
+        mode = fast_path_mode("where_am_i")
+        if mode == "template":
+            return _template_turn(
+                session, stage_label, ui_cards_out, "where_am_i",
+                lambda: render_where_am_i(context_pack),
+            )
+        if mode == "template+llm":
+            intent = "where_am_i"
+            context_pack["template_draft"] = render_where_am_i(context_pack)
 
     # --------------------------------------------------------------------------------------------------------------------------------------------
-    # normal chat flow - default chat flow that generates llm response
-    
-    explanation = call_llm_with_context_pack(context_pack, history=history)
-    store.append(session, "assistant", explanation)
+    # speculative tool pre-execution - run the tools the model is predicted to ask for and inline the
+    # results, so the reply takes one completion instead of tool call + second completion
+
+    prefetched_tools: List[str] = []
+    if TOOL_PREFETCH_ENABLED:
+        if wants_stats:
+            # the stats hook above already inlined it as comparison_stats
+            prefetched_tools.append("get_outcome_stats")
+
+        query_type = intents.first(SEARCH_PREFIX)
+        if query_type:
+            try:
+                with timed(timings, "prefetch"):
+                    result = run_tool("search_case_record", {"query_type": query_type}, context_pack, memo, deadline=deadline)
+                context_pack["prefetched_tools"] = {"search_case_record": result}
+                prefetched_tools.append("search_case_record")
+            except Exception:
+                # model can still call the tool itself
+                pass
 
-    return ChatResponse(
-        session_id=session.session_id,
+    # --------------------------------------------------------------------------------------------------------------------------------------------
+    # normal chat flow (and timeline explanation) - the caller generates the llm response
+
+    return ChatTurn(
+        session=session,
         stage_label=stage_label,
-        explanation=explanation,
         ui_cards=ui_cards_out,
+        context_pack=context_pack,
+        history=history,
+        memo=memo,
+        prefetched_tools=prefetched_tools,
+        intent=intent,
+        deadline=deadline,
+    )
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+# MAIN CHAT ENDPOINT
+# Every request gets a CHAT_DEADLINE_SEC budget (deadline.py) that bounds the case fetch, stats and the LLM call.
+
+OUT_OF_TIME_REPLY = (
+    "Sorry — pulling your case together took longer than expected this time. "
+    "Please ask again in a moment."
+)
+
+@app.post("/chat", response_model=ChatResponse)
+def chat(req: ChatRequest, response: Response):
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    deadline = Deadline.after(CHAT_DEADLINE_SEC)
+    turn = prepare_chat_turn(req, timings, deadline)
+
+    explanation = turn.explanation
+    if explanation is None:
+        try:
+            with timed(timings, "llm"):
+                explanation = call_llm_with_context_pack(
+                    turn.context_pack,
+                    history=turn.history,
+                    memo=turn.memo,
+                    prefetched_tools=turn.prefetched_tools,
+                    intent=turn.intent,
+                    deadline=deadline,
+                )
+        except (DeadlineExceeded, openai.APITimeoutError):
+            explanation = OUT_OF_TIME_REPLY
+
+    store.append(turn.session, "assistant", explanation)
+
+    timings["total"] = (time.perf_counter() - started) * 1000.0
+    response.headers["Server-Timing"] = server_timing_header(timings)
+
+    return ChatResponse(
+        session_id=turn.session.session_id,
+        stage_label=turn.stage_label,
+        explanation=explanation,
+        ui_cards=turn.ui_cards,
+    )
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+# STREAMING CHAT ENDPOINT (server-sent events)
+# event: meta      -> {session_id, stage_label}
+# event: ui_cards  -> [cards]   (sent before any tokens so cards render immediately)
+# event: token     -> {"text": "..."} (repeated)
+# event: done      -> {"explanation": full reply}
+# event: error     -> {"reason": ...}
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest):
+    timings: Dict[str, float] = {}
+    deadline = Deadline.after(CHAT_DEADLINE_SEC)
+    turn = prepare_chat_turn(req, timings, deadline)
+
+    def events():
+        yield _sse("meta", {"session_id": turn.session.session_id, "stage_label": turn.stage_label})
+        yield _sse("ui_cards", turn.ui_cards)
+
+        if turn.explanation is not None:
+            store.append(turn.session, "assistant", turn.explanation)
+            yield _sse("token", {"text": turn.explanation})
+            yield _sse("done", {"explanation": turn.explanation})
+            return
+
+        parts: List[str] = []
+        try:
+            deltas = stream_llm_with_context_pack(
+                turn.context_pack,
+                history=turn.history,
+                memo=turn.memo,
+                prefetched_tools=turn.prefetched_tools,
+                intent=turn.intent,
+                deadline=deadline,
+            )
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse("token", {"text": delta})
+        except Exception as e:
+            yield _sse("error", {"reason": f"LLM stream failed: {type(e).__name__}"})
+        finally:
+            # runs on normal end, errors and client disconnects alike
+            explanation = "".join(parts).strip()
+            if explanation:
+                store.append(turn.session, "assistant", explanation)
+
+        yield _sse("done", {"explanation": explanation})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # only the pre-LLM stages are known when headers go out
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": server_timing_header(timings),
+        },
     )
 
 
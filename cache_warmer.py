@@ -0,0 +1,211 @@
+# cache_warmer.py
+# Precomputes cohort stats so the first user to ask about a cohort doesn't pay the full Socrata fetch.
+# - Records how often each cohort is requested from /chat
+# - At startup + on a schedule: warms the top-N requested cohorts and
+#   SUPPORTED_STAGE_IDS_FOR_STATS x common offense categories
+# - Runs on a daemon thread so request handling is never blocked
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+from stats_service import (
+    SUPPORTED_STAGE_IDS_FOR_STATS,
+    cohort_cache_key,
+    compute_comparison_stats_for_user_context,
+)
+from stats_cube import build_cube_from_portal, publish_cube
+
+
+# Most common offense categories in the Cook County dispositions data.
+# Override with a comma-separated STATS_WARM_OFFENSE_CATEGORIES.
+COMMON_OFFENSE_CATEGORIES = [
+    "Narcotics",
+    "Retail Theft",
+    "UUW - Unlawful Use of Weapon",
+    "Aggravated Battery",
+    "Burglary",
+    "Theft",
+    "Residential Burglary",
+    "Armed Robbery",
+    "Aggravated DUI",
+    "Possession of Stolen Motor Vehicle",
+]
+
+STATS_WARM_TOP_N = int(os.getenv("STATS_WARM_TOP_N", "20"))
+STATS_WARM_INTERVAL_SEC = float(os.getenv("STATS_WARM_INTERVAL_SEC", "3600"))
+# Build the whole stage x offense x class cube in one bulk pass (multi-process) instead of
+# fetching each target cohort separately
+STATS_WARM_USE_CUBE = os.getenv("STATS_WARM_USE_CUBE", "0") == "1"
+
+CohortKey = Tuple[str, str, str]
+
+
+def _env_list(name: str, default: List[str]) -> List[str]:
+    raw = os.getenv(name)
+    if not raw:
+        return list(default)
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+class CohortStatsWarmer:
+    def __init__(
+        self,
+        *,
+        top_n: int = STATS_WARM_TOP_N,
+        interval_sec: float = STATS_WARM_INTERVAL_SEC,
+        offense_categories: Optional[List[str]] = None,
+        use_cube: bool = STATS_WARM_USE_CUBE,
+    ):
+        self.top_n = top_n
+        self.interval_sec = interval_sec
+        self.use_cube = use_cube
+        self.offense_categories = (
+            offense_categories
+            if offense_categories is not None
+            else _env_list("STATS_WARM_OFFENSE_CATEGORIES", COMMON_OFFENSE_CATEGORIES)
+        )
+
+        self._lock = threading.Lock()
+        self._requests: Counter = Counter()
+        # first-seen spelling of each cohort, so we warm with the user's original casing
+        self._labels: Dict[CohortKey, Tuple[str, Optional[str], Optional[str]]] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._status: Dict[str, Any] = {
+            "enabled": True,
+            "ready": False,
+            "runs": 0,
+            "last_started_ts": None,
+            "last_finished_ts": None,
+            "last_warmed": 0,
+            "last_failed": 0,
+        }
+
+    # -------------------------
+    # Request frequency
+    # -------------------------
+
+    def record(
+        self,
+        stage_id: Optional[str],
+        offense_category: Optional[str],
+        charge_class: Optional[str],
+    ) -> None:
+        if not stage_id:
+            return
+        key = cohort_cache_key(stage_id, offense_category, charge_class)
+        with self._lock:
+            self._requests[key] += 1
+            self._labels.setdefault(key, (stage_id, offense_category, charge_class))
+
+    def targets(self) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """Top-N requested cohorts first, then the static stage x offense grid (deduped)."""
+        with self._lock:
+            top = [self._labels[k] for k, _ in self._requests.most_common(self.top_n)]
+
+        grid = [
+            (stage_id, oc, None)
+            for stage_id in sorted(SUPPORTED_STAGE_IDS_FOR_STATS)
+            for oc in self.offense_categories
+        ]
+
+        out = []
+        seen = set()
+        for stage_id, oc, cls in top + grid:
+            key = cohort_cache_key(stage_id, oc, cls)
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append((stage_id, oc, cls))
+        return out
+
+    # -------------------------
+    # Warming
+    # -------------------------
+
+    def warm_once(self, *, refresh: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            self._status["last_started_ts"] = time.time()
+
+        warmed = 0
+        failed = 0
+        targets = self.targets()
+
+        if self.use_cube:
+            # one bulk fetch + process-pool aggregation covers every target with data
+            cube = build_cube_from_portal()
+            published = set()
+            for t in targets:
+                key = cohort_cache_key(*t)
+                if publish_cube(cube, [key]):
+                    published.add(key)
+            warmed += len(published)
+            targets = [t for t in targets if cohort_cache_key(*t) not in published]
+
+        for stage_id, oc, cls in targets:
+            if self._stop.is_set():
+                break
+            stats = compute_comparison_stats_for_user_context(
+                user_stage_id=stage_id,
+                user_offense_category=oc,
+                user_charge_class=cls,
+                refresh=refresh,
+            )
+            if stats.get("skipped"):
+                failed += 1
+            else:
+                warmed += 1
+
+        with self._lock:
+            self._status.update({
+                "ready": True,
+                "runs": self._status["runs"] + 1,
+                "last_finished_ts": time.time(),
+                "last_warmed": warmed,
+                "last_failed": failed,
+            })
+            return dict(self._status)
+
+    def _run(self) -> None:
+        refresh = False
+        while not self._stop.is_set():
+            try:
+                self.warm_once(refresh=refresh)
+            except Exception as e:
+                # never let the warmer thread die; readiness still flips so the app isn't stuck
+                with self._lock:
+                    self._status["ready"] = True
+                    self._status["last_error"] = type(e).__name__
+            refresh = True
+            if self._stop.wait(self.interval_sec):
+                break
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cohort-stats-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def disable(self) -> None:
+        """Warming turned off: nothing to wait for, so report ready immediately."""
+        self.stop()
+        with self._lock:
+            self._status["enabled"] = False
+            self._status["ready"] = True
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._status)
+            out["tracked_cohorts"] = len(self._requests)
+        return out
@@ -33,6 +33,7 @@ def explain_case(case_id: str) -> Dict[str, Any]:
     # builds structured context pack including things like case summary, charge, timeline, stage inference, stage explanation card, etc
     # this is what gets sent to the model
     llm_pack = build_llm_context_pack(case_data)    
+    case_summary, stage = llm_pack["case_summary"], llm_pack["stage"]   # read before the (slow) LLM call so a bad pack fails fast
 
     llm_text = call_llm_with_context_pack(llm_pack)     # calls the LLM with context pack as input to generate plain-language case explanation 
     
@@ -40,12 +41,13 @@ def explain_case(case_id: str) -> Dict[str, Any]:
     # Return a clean object for UI rendering
     return {
         "input_id": case_id,
-        "case_summary": llm_pack["case_summary"],
-        "stage": llm_pack["stage"],
+        "case_summary": case_summary,
+        "stage": stage,
         "llm_response": llm_text,
         # Optional debug fields if you want them in UI:
         # "stage_card": llm_pack["stage_card"],
         # "raw_case_data": case_data,
     }
 
-explain_case("364915353569") # test call
\ No newline at end of file
+if __name__ == "__main__":
+    print(explain_case("364915353569")) # test call
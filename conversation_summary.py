@@ -0,0 +1,108 @@
+# conversation_summary.py
+# Rolling conversation summary so long sessions don't keep growing their prompts.
+# - Older turns are condensed into Session.summary by an LLM summarizer on a background
+#   executor (never on the request path); Session.summary_upto marks how far it covers
+# - The prompt carries the digest + the most recent raw turns, trimmed to a token budget
+# - If the summarizer lags (or fails), unsummarized turns are still sent raw, within the budget
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import threading
+
+from memory_store import Message, Session
+
+
+# Raw messages always kept out of the summary (the last few turns)
+SUMMARY_RECENT_MESSAGES = int(os.getenv("SUMMARY_RECENT_MESSAGES", "6"))
+# Don't call the summarizer for fewer than this many newly-old messages
+SUMMARY_MIN_BATCH = int(os.getenv("SUMMARY_MIN_BATCH", "4"))
+# Budget for digest + raw history in the prompt (approximate tokens)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+
+SummarizeFn = Callable[[str, List[Dict[str, str]]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting
+    return (len(text or "") + 3) // 4
+
+
+def _as_dicts(messages: List[Message]) -> List[Dict[str, str]]:
+    return [{"role": m.role, "content": m.content} for m in messages if m.role in ("user", "assistant")]
+
+
+class ConversationSummarizer:
+    def __init__(
+        self,
+        summarize_fn: Optional[SummarizeFn] = None,
+        *,
+        recent_messages: int = SUMMARY_RECENT_MESSAGES,
+        min_batch: int = SUMMARY_MIN_BATCH,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        if summarize_fn is None:
+            from llm_client_openai import summarize_conversation  # local import to avoid circulars
+            summarize_fn = summarize_conversation
+        self.summarize_fn = summarize_fn
+        self.recent_messages = recent_messages
+        self.min_batch = min_batch
+        self.token_budget = token_budget
+        self._executor = executor or ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Background refresh
+    # -------------------------
+
+    def maybe_schedule(self, session: Session) -> Optional[Future]:
+        """Queue a summary refresh if enough turns have aged out of the recent window."""
+        with self._lock:
+            end = len(session.messages) - self.recent_messages
+            if session.summary_pending or end - session.summary_upto < self.min_batch:
+                return None
+            session.summary_pending = True
+            previous = session.summary
+            start = session.summary_upto
+            older = _as_dicts(session.messages[start:end])
+
+        return self._executor.submit(self._refresh, session, previous, older, end)
+
+    def _refresh(self, session: Session, previous: str, older: List[Dict[str, str]], end: int) -> None:
+        try:
+            digest = (self.summarize_fn(previous, older) or "").strip()
+        except Exception:
+            digest = ""
+        with self._lock:
+            session.summary_pending = False
+            if digest:
+                session.summary = digest
+                session.summary_upto = end
+
+    # -------------------------
+    # Prompt history
+    # -------------------------
+
+    def prompt_history(self, session: Session) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        (digest, raw history) for the prompt. Excludes the latest user message, which is sent
+        separately as the question. Oldest raw turns are dropped first to stay within budget.
+        """
+        with self._lock:
+            digest = session.summary
+            raw = _as_dicts(session.messages[session.summary_upto:-1])
+
+        budget = self.token_budget - estimate_tokens(digest)
+        kept: List[Dict[str, str]] = []
+        for m in reversed(raw):
+            cost = estimate_tokens(m["content"])
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append(m)
+        kept.reverse()
+        return digest, kept
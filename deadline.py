@@ -0,0 +1,62 @@
+# deadline.py
+# Per-request deadline, set once at the API layer and passed down to every call that can block
+# (case fetch, Socrata stats pages, OpenAI completions, tool calls).
+# - Each call sizes its own timeout as min(its usual timeout, time left)
+# - Optional enrichments check has() first and are skipped when the budget is too low; they run
+#   on a reserve() sub-deadline so they can't eat the time the main call needs
+# - Once the budget is gone, timeout() raises DeadlineExceeded instead of starting new work
+# Together this bounds /chat latency by configuration (CHAT_DEADLINE_SEC) rather than by
+# whatever the slowest upstream happens to do.
+
+from __future__ import annotations
+
+from typing import Optional
+import os
+import time
+
+
+CHAT_DEADLINE_SEC = float(os.getenv("CHAT_DEADLINE_SEC", "45"))
+# Below this many seconds a call isn't worth starting
+MIN_CALL_BUDGET_SEC = float(os.getenv("MIN_CALL_BUDGET_SEC", "0.5"))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, expires_at: float):
+        # time.monotonic() based, so wall-clock changes don't matter
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def has(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def reserve(self, seconds: float) -> "Deadline":
+        """Sub-deadline ending `seconds` earlier, keeping that much back for the calls after it."""
+        return Deadline(self.expires_at - seconds)
+
+    def timeout(self, cap: float, *, min_sec: float = MIN_CALL_BUDGET_SEC) -> float:
+        """Timeout for one downstream call: min(cap, time left). Raises when too little is left."""
+        left = self.remaining()
+        if left < min_sec:
+            raise DeadlineExceeded(f"{left:.2f}s left, need at least {min_sec:g}s")
+        return min(cap, left)
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+def call_timeout(deadline: Optional[Deadline], cap: float) -> float:
+    """cap when there is no deadline (scripts, warmer), else the deadline-sized timeout."""
+    return cap if deadline is None else deadline.timeout(cap)
@@ -0,0 +1,276 @@
+# explanation_batch.py
+# Offline job: pre-generate /explain-case explanations for a list of case IDs (e.g. cases a
+# partner org is about to onboard) and append them to a JSONL store the API serves from.
+#
+#   python explanation_batch.py case_ids.txt                  # one case ID per line, '#' comments ok
+#   python explanation_batch.py case_ids.txt --regenerate     # ignore what's already in the store
+#
+# Entries older than EXPLANATIONS_MAX_AGE_SEC are regenerated on a normal run: the API no longer
+# serves them.
+#
+# - Case fetch + context pack build run on one pool, LLM calls on another, each bounded
+#   (Socrata and OpenAI have different rate limits); fetching stops running ahead while the LLM
+#   side has a full backlog
+# - Every step is retried with exponential backoff
+# - Each case is chained fetch -> explain -> append: its explanation is written and flushed as
+#   soon as it's done, so the store doubles as the checkpoint and an interrupted run loses only
+#   the cases still in flight
+# - The store is append-only; the last line for a case ID wins
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+import argparse
+import json
+import os
+import threading
+import time
+
+from main import build_llm_context_pack, fetch_case_by_id
+from llm_client_openai import OPENAI_MODEL, call_llm_with_context_pack
+
+
+EXPLANATIONS_STORE_PATH = os.getenv(
+    "EXPLANATIONS_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "explanations.jsonl"),
+)
+# Stored explanations older than this are ignored by the API (case records keep changing)
+EXPLANATIONS_MAX_AGE_SEC = float(os.getenv("EXPLANATIONS_MAX_AGE_SEC", str(7 * 24 * 3600)))
+
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", "4"))
+BATCH_LLM_WORKERS = int(os.getenv("BATCH_LLM_WORKERS", "4"))
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+BATCH_RETRY_BASE_SEC = float(os.getenv("BATCH_RETRY_BASE_SEC", "2"))
+
+T = TypeVar("T")
+
+
+class CaseNotFound(ValueError):
+    pass
+
+
+def with_retry(
+    fn: Callable[[], T],
+    *,
+    attempts: int = BATCH_MAX_ATTEMPTS,
+    base_delay: float = BATCH_RETRY_BASE_SEC,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """fn() with up to `attempts` tries, sleeping base_delay * 2^n between them."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            sleep(base_delay * (2 ** attempt))
+    raise AssertionError("unreachable")
+
+
+def read_case_ids(lines: Iterable[str]) -> List[str]:
+    """One ID per line; blanks and '#' comments skipped, duplicates dropped (first wins)."""
+    seen: Dict[str, None] = {}
+    for line in lines:
+        cid = line.split("#", 1)[0].strip()
+        if cid:
+            seen.setdefault(cid, None)
+    return list(seen)
+
+
+# -------------------------
+# Store (JSONL, append-only)
+# -------------------------
+
+def load_explanations(path: str = EXPLANATIONS_STORE_PATH) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # a run killed mid-write can leave a partial last line
+                    continue
+                if isinstance(rec, dict) and rec.get("case_id") and rec.get("explanation"):
+                    out[rec["case_id"]] = rec
+    except OSError:
+        pass
+    return out
+
+
+class ExplanationStore:
+    """Read side used by the API; reloaded when the file changes, like answer_index.py."""
+
+    def __init__(self, path: str = EXPLANATIONS_STORE_PATH, *, max_age_sec: float = EXPLANATIONS_MAX_AGE_SEC):
+        self.path = path
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+
+    def get(self, case_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._records = load_explanations(self.path)
+                self._mtime = mtime
+            rec = self._records.get((case_id or "").strip())
+        if rec is None or time.time() - rec.get("generated_ts", 0) > self.max_age_sec:
+            return None
+        return rec
+
+
+EXPLANATION_STORE = ExplanationStore()
+
+
+# -------------------------
+# Batch run
+# -------------------------
+
+def _fetch_pack(case_id: str, attempts: int, base_delay: float, sleep: Callable[[float], None]) -> Dict[str, Any]:
+    def fetch() -> Dict[str, Any]:
+        # fetch_case_by_id swallows network errors and returns None, so a miss is retried too
+        case_data = fetch_case_by_id(case_id)
+        if not case_data:
+            raise CaseNotFound(f"Case '{case_id}' not found in any dataset")
+        return case_data
+
+    case_data = with_retry(fetch, attempts=attempts, base_delay=base_delay, sleep=sleep)
+    return build_llm_context_pack(case_data)
+
+
+def _explain(case_id: str, pack: Dict[str, Any], attempts: int, base_delay: float, sleep: Callable[[float], None]) -> Dict[str, Any]:
+    text = with_retry(
+        lambda: call_llm_with_context_pack(pack, use_cache=False, intent="precompute"),
+        attempts=attempts,
+        base_delay=base_delay,
+        sleep=sleep,
+    )
+    now = time.time()
+    return {
+        "case_id": case_id,
+        "explanation": text,
+        "stage": pack.get("stage"),
+        "case_summary": pack.get("case_summary"),
+        "model": OPENAI_MODEL,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)),
+        "generated_ts": now,
+    }
+
+
+def run_batch(
+    case_ids: List[str],
+    *,
+    out_path: str = EXPLANATIONS_STORE_PATH,
+    regenerate: bool = False,
+    fetch_workers: int = BATCH_FETCH_WORKERS,
+    llm_workers: int = BATCH_LLM_WORKERS,
+    attempts: int = BATCH_MAX_ATTEMPTS,
+    base_delay: float = BATCH_RETRY_BASE_SEC,
+    sleep: Callable[[float], None] = time.sleep,
+    max_age_sec: float = EXPLANATIONS_MAX_AGE_SEC,
+) -> Dict[str, Any]:
+    # stale entries are ignored by the API (ExplanationStore), so they count as not done
+    now = time.time()
+    fresh = set() if regenerate else {
+        cid for cid, rec in load_explanations(out_path).items()
+        if now - rec.get("generated_ts", 0) <= max_age_sec
+    }
+    todo = [cid for cid in case_ids if cid not in fresh]
+    failed: Dict[str, str] = {}
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch") as fetch_pool, \
+            ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="batch-llm") as llm_pool, \
+            open(out_path, "a", encoding="utf-8") as out:
+
+        ids = iter(todo)
+        # future -> (step, case_id); step is "fetch" or "explain"
+        pending: Dict[Future, Tuple[str, str]] = {}
+        in_flight = {"fetch": 0, "explain": 0}
+
+        def top_up_fetches() -> None:
+            # new fetches only while the LLM backlog is short, so packs don't pile up in llm_pool
+            # when explains are the bottleneck: at most 2 * (llm_workers + fetch_workers) wait there
+            while in_flight["fetch"] < 2 * fetch_workers and in_flight["explain"] < 2 * llm_workers:
+                cid = next(ids, None)
+                if cid is None:
+                    return
+                pending[fetch_pool.submit(_fetch_pack, cid, attempts, base_delay, sleep)] = ("fetch", cid)
+                in_flight["fetch"] += 1
+
+        top_up_fetches()
+
+        try:
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    step, cid = pending.pop(fut)
+                    in_flight[step] -= 1
+                    if step == "fetch":
+                        try:
+                            pack = fut.result()
+                        except Exception as e:
+                            failed[cid] = f"fetch: {type(e).__name__}: {e}"
+                            continue
+                        pending[llm_pool.submit(_explain, cid, pack, attempts, base_delay, sleep)] = ("explain", cid)
+                        in_flight["explain"] += 1
+                        continue
+
+                    try:
+                        rec = fut.result()
+                    except Exception as e:
+                        failed[cid] = f"llm: {type(e).__name__}"
+                        continue
+                    # only this thread writes, so lines never interleave
+                    out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    out.flush()
+                    written += 1
+                top_up_fetches()
+        except BaseException:
+            # interrupted: don't start queued work; what's written so far is the checkpoint
+            for fut in pending:
+                fut.cancel()
+            raise
+
+    return {
+        "requested": len(case_ids),
+        "already_done": len(case_ids) - len(todo),
+        "written": written,
+        "failed": failed,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Pre-generate case explanations into a JSONL store.")
+    p.add_argument("case_ids_file", help="file with one case ID per line")
+    p.add_argument("--out", default=EXPLANATIONS_STORE_PATH)
+    p.add_argument("--regenerate", action="store_true", help="regenerate cases already in the store")
+    p.add_argument("--fetch-workers", type=int, default=BATCH_FETCH_WORKERS)
+    p.add_argument("--llm-workers", type=int, default=BATCH_LLM_WORKERS)
+    args = p.parse_args(argv)
+
+    with open(args.case_ids_file, "r", encoding="utf-8") as f:
+        case_ids = read_case_ids(f)
+
+    report = run_batch(
+        case_ids,
+        out_path=args.out,
+        regenerate=args.regenerate,
+        fetch_workers=args.fetch_workers,
+        llm_workers=args.llm_workers,
+    )
+    print(
+        f"{report['written']} written, {report['already_done']} already in {args.out}, "
+        f"{len(report['failed'])} failed (of {report['requested']})"
+    )
+    for cid, reason in report["failed"].items():
+        print(f"  {cid}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
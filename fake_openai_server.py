@@ -0,0 +1,189 @@
+# fake_openai_server.py
+# Local stand-in for the OpenAI chat-completions API, for load tests without real API calls.
+#
+#   uvicorn fake_openai_server:app --port 8100
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake uvicorn api:app
+#
+# Behavior (env, read per request so it can be changed between runs):
+# - FAKE_LLM_LATENCY_DIST      fixed | uniform | lognormal (default lognormal); applies to every delay below
+# - FAKE_LLM_LATENCY_MS        median completion latency (default 800)
+# - FAKE_LLM_LATENCY_SIGMA     lognormal sigma, or +/- fraction for uniform (default 0.5)
+# - FAKE_LLM_TTFT_MS           streaming: median delay before the first chunk (default 300)
+# - FAKE_LLM_TOKEN_MS          streaming: median delay between chunks (default 15)
+# - FAKE_LLM_TOOL_CALL_RATE    probability of answering with a tool call when tools are offered (default 0.3)
+# - FAKE_LLM_FAILURE_RATE      probability of an injected error response (default 0)
+# - FAKE_LLM_FAILURE_STATUS    status code for injected errors (default 500; 429 for rate limits)
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, List
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+app = FastAPI()
+
+FAKE_REPLY = (
+    "Here’s where your case is right now. The record shows your arraignment has happened, "
+    "and nothing after that has been filed yet. That’s everything the record shows at this point."
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def sample_latency_sec(median_ms: float | None = None) -> float:
+    """One delay drawn from FAKE_LLM_LATENCY_DIST around median_ms (default FAKE_LLM_LATENCY_MS)."""
+    dist = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")
+    median_ms = _env_float("FAKE_LLM_LATENCY_MS", 800) if median_ms is None else median_ms
+    sigma = _env_float("FAKE_LLM_LATENCY_SIGMA", 0.5)
+
+    if dist == "fixed":
+        ms = median_ms
+    elif dist == "uniform":
+        ms = random.uniform(median_ms * (1 - sigma), median_ms * (1 + sigma))
+    else:
+        ms = random.lognormvariate(math.log(max(median_ms, 1e-3)), sigma)
+    return max(0.0, ms) / 1000.0
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum((len(str(m.get("content") or "")) + 3) // 4 for m in messages)
+
+
+def _usage(messages: List[Dict[str, Any]], completion_text: str) -> Dict[str, Any]:
+    prompt_tokens = _estimate_tokens(messages)
+    # pretend the system prompt + case context prefix is always cached
+    cached = sum((len(str(m.get("content") or "")) + 3) // 4 for m in messages[:2]) if len(messages) > 2 else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": (len(completion_text) + 3) // 4,
+        "total_tokens": prompt_tokens + (len(completion_text) + 3) // 4,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def _pick_tool_call(body: Dict[str, Any]) -> Dict[str, Any] | None:
+    tools = body.get("tools") or []
+    messages = body.get("messages") or []
+    if not tools or any(m.get("role") == "tool" for m in messages):
+        return None
+    if random.random() >= _env_float("FAKE_LLM_TOOL_CALL_RATE", 0.3):
+        return None
+
+    names = [t["function"]["name"] for t in tools]
+    last = str(messages[-1].get("content") or "").lower() if messages else ""
+    if "get_outcome_stats" in names and ("similar" in last or "stats" in last):
+        name, args = "get_outcome_stats", {}
+    elif "search_case_record" in names:
+        name, args = "search_case_record", {"query_type": "dates"}
+    else:
+        name, args = names[0], {}
+    return {
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(args)},
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: str | None = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _stream(
+    body: Dict[str, Any],
+    completion_id: str,
+    model: str,
+    tool_call: Dict[str, Any] | None,
+) -> AsyncIterator[str]:
+    # async sleeps so one server can hold many slow "completions" open at once; first-token and
+    # per-chunk delays are sampled like non-streamed latency, so TTFT has a realistic spread
+    await asyncio.sleep(sample_latency_sec(_env_float("FAKE_LLM_TTFT_MS", 300)))
+    token_ms = _env_float("FAKE_LLM_TOKEN_MS", 15)
+
+    if tool_call:
+        yield _chunk(completion_id, model, {"role": "assistant", "tool_calls": [{
+            "index": 0,
+            "id": tool_call["id"],
+            "type": "function",
+            "function": {"name": tool_call["function"]["name"], "arguments": ""},
+        }]})
+        yield _chunk(completion_id, model, {"tool_calls": [{
+            "index": 0,
+            "function": {"arguments": tool_call["function"]["arguments"]},
+        }]})
+        yield _chunk(completion_id, model, {}, "tool_calls")
+        text = ""
+    else:
+        text = FAKE_REPLY
+        for i, word in enumerate(text.split(" ")):
+            if i:
+                await asyncio.sleep(sample_latency_sec(token_ms))
+            yield _chunk(completion_id, model, {"content": word if i == 0 else " " + word})
+        yield _chunk(completion_id, model, {}, "stop")
+
+    if (body.get("stream_options") or {}).get("include_usage"):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [],
+            "usage": _usage(body.get("messages") or [], text),
+        }
+        yield f"data: {json.dumps(payload)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model") or "fake-model"
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+
+    if random.random() < _env_float("FAKE_LLM_FAILURE_RATE", 0):
+        status = int(os.getenv("FAKE_LLM_FAILURE_STATUS", "500"))
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": "Injected failure", "type": "fake_error", "code": status}},
+        )
+
+    tool_call = _pick_tool_call(body)
+
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, completion_id, model, tool_call), media_type="text/event-stream")
+
+    await asyncio.sleep(sample_latency_sec())
+    text = "" if tool_call else FAKE_REPLY
+    message: Dict[str, Any] = {"role": "assistant", "content": text or None}
+    if tool_call:
+        message["tool_calls"] = [tool_call]
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if tool_call else "stop",
+        }],
+        "usage": _usage(body.get("messages") or [], text),
+    }
@@ -0,0 +1,217 @@
+# intent_engine.py
+# Single-pass intent classification for /chat routing.
+# - Every trigger phrase of every intent is compiled into one regex, built from a trie of the
+#   phrases so shared prefixes ("what ", "where ", "motion") are matched once
+# - One scan of the message returns all matched intents (substring semantics, overlapping
+#   phrases included), ordered by declared priority
+# - Rules are data: DEFAULT_RULES here, extended/overridden by the JSON file at INTENT_RULES_PATH
+#     {"timeline": {"phrases": ["docket"]}, "refund": {"priority": 5, "phrases": ["bond refund"]}}
+#   Adding triggers only grows the compiled pattern, not the number of scans per request.
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+
+
+INTENT_RULES_PATH = os.getenv("INTENT_RULES_PATH", "")
+
+# search_case_record slices are intents named "search:<query_type>"
+SEARCH_PREFIX = "search:"
+
+
+@dataclass
+class IntentRule:
+    name: str
+    # higher wins when a message matches several intents
+    priority: int
+    phrases: List[str] = field(default_factory=list)
+
+
+# priorities follow the routing order in api.prepare_chat_turn; among search slices the
+# more specific one wins (a bond question that mentions dates is still a bond question)
+DEFAULT_RULES: List[IntentRule] = [
+    IntentRule("simulator", 100, [
+        "procedural simulator",
+        "simulator",
+        "choose your own adventure",
+        "choose-your-own-adventure",
+        "what happens next",
+        "what usually happens next",
+        "what comes next",
+        "next steps",
+        "what usually comes next",
+        "plea discussion",
+        "plea discussions",
+        "motions",
+        "motion to suppress",
+        "motion to dismiss",
+        "discovery",
+        "trial-setting",
+        "trial setting",
+    ]),
+    IntentRule("timeline", 90, [
+        "timeline",
+        "show my timeline",
+        "show timeline",
+        "court dates",
+        "next court date",
+        "chronological",
+        "in order",
+        "sequence of events",
+        "what happened so far",
+        "what has happened so far",
+    ]),
+    IntentRule("where_am_i", 80, [
+        "where am i",
+        "where is my case",
+        "where's my case",
+        "where does my case stand",
+        "what stage",
+        "which stage",
+        "status of my case",
+        "my case status",
+        "what's going on with my case",
+        "what is going on with my case",
+    ]),
+    IntentRule("stats", 70, [
+        "similar cases",
+        "cases like mine",
+        "how do cases like",
+        "how do similar",
+        "outcome stats",
+        "statistics",
+        "stats",
+        "how often",
+        "rate of",
+        "usually turn out",
+        "what do outcomes look like",
+    ]),
+    IntentRule(SEARCH_PREFIX + "bond", 40, ["bond", "bail"]),
+    IntentRule(SEARCH_PREFIX + "disposition", 30, [
+        "disposition", "verdict", "sentence", "sentenced", "convicted", "found guilty",
+    ]),
+    IntentRule(SEARCH_PREFIX + "charges", 20, ["charged with", "my charge", "what charge", "which charge", "charges"]),
+    IntentRule(SEARCH_PREFIX + "dates", 10, ["when was", "when did", "what date", "which date", "what day", "dates"]),
+]
+
+
+def _normalize(text: str) -> str:
+    return (text or "").strip().lower()
+
+
+# -------------------------
+# Trie -> regex
+# -------------------------
+
+_END = ""
+
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    """Regex for a trie node; longer continuations are tried before stopping at a phrase end."""
+    ends_here = _END in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != _END]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if ends_here:
+        # greedy optional: take the longer phrase when it's there
+        return "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+    return body
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    # highest priority first
+    intents: List[str]
+    # intent -> the trigger phrases of it found in the message
+    phrases: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+
+    def has(self, name: str) -> bool:
+        return name in self.intents
+
+    def triggered_only_by(self, name: str, phrases: Iterable[str]) -> bool:
+        """True if intent `name` matched, and only through the given phrases."""
+        found = self.phrases.get(name)
+        return bool(found) and found <= {_normalize(p) for p in phrases}
+
+    @property
+    def primary(self) -> Optional[str]:
+        return self.intents[0] if self.intents else None
+
+    def first(self, prefix: str) -> Optional[str]:
+        """Highest-priority matched intent starting with prefix, minus the prefix."""
+        return next((i[len(prefix):] for i in self.intents if i.startswith(prefix)), None)
+
+
+class IntentEngine:
+    def __init__(self, rules: List[IntentRule]):
+        self.rules = {r.name: r for r in rules}
+        priority = {r.name: r.priority for r in rules}
+
+        phrase_intents: Dict[str, set] = {}
+        for r in rules:
+            for p in r.phrases:
+                p = _normalize(p)
+                if p:
+                    phrase_intents.setdefault(p, set()).add(r.name)
+
+        trie: Dict[str, Any] = {}
+        for p in phrase_intents:
+            node = trie
+            for ch in p:
+                node = node.setdefault(ch, {})
+            node[_END] = True
+
+        # the scan reports the longest phrase starting at each position; shorter phrases that are
+        # its prefixes matched there too, so their intents ride along
+        self._hits_for: Dict[str, List[Tuple[str, str]]] = {
+            p: [(name, q) for q, names in phrase_intents.items() if p.startswith(q) for name in names]
+            for p in phrase_intents
+        }
+        self._order = sorted(priority, key=lambda n: (-priority[n], n))
+        # zero-width lookahead so overlapping phrases are all seen, like `phrase in text`
+        self._pattern = re.compile("(?=(" + _trie_pattern(trie) + "))") if trie else None
+
+    def classify(self, text: str) -> IntentMatch:
+        found: Dict[str, set] = {}
+        if self._pattern is not None:
+            for m in self._pattern.finditer(_normalize(text)):
+                for name, phrase in self._hits_for[m.group(1)]:
+                    found.setdefault(name, set()).add(phrase)
+        return IntentMatch(
+            intents=[n for n in self._order if n in found],
+            phrases={n: frozenset(ps) for n, ps in found.items()},
+        )
+
+
+# -------------------------
+# Configuration
+# -------------------------
+
+def load_rules(path: str = INTENT_RULES_PATH) -> List[IntentRule]:
+    """DEFAULT_RULES extended by the JSON file at path: phrases are added, priority overrides."""
+    rules = {r.name: IntentRule(r.name, r.priority, list(r.phrases)) for r in DEFAULT_RULES}
+    if not path:
+        return list(rules.values())
+
+    with open(path, "r", encoding="utf-8") as f:
+        extra = json.load(f)
+    for name, spec in extra.items():
+        rule = rules.get(name)
+        if rule is None:
+            rule = rules[name] = IntentRule(name, int(spec.get("priority", 0)))
+        elif "priority" in spec:
+            rule.priority = int(spec["priority"])
+        rule.phrases.extend(spec.get("phrases") or [])
+    return list(rules.values())
+
+
+INTENT_ENGINE = IntentEngine(load_rules())
+
+
+def classify_intents(text: str) -> IntentMatch:
+    return INTENT_ENGINE.classify(text)
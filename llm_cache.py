@@ -0,0 +1,87 @@
+# llm_cache.py
+# Response cache in front of call_llm_with_context_pack.
+# - Key: sha256 over the canonical context pack + normalized latest message + recent history
+# - LRU with a TTL; thread-safe (uvicorn runs sync endpoints on a thread pool)
+# - Opt out per call (use_cache=False) or globally (LLM_CACHE_ENABLED=0)
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL_SEC = float(os.getenv("LLM_CACHE_TTL_SEC", "3600"))
+
+# Keyed separately (normalized)
+_VOLATILE_PACK_KEYS = {"latest_user_message"}
+
+
+def normalize_message(text: Optional[str]) -> str:
+    """'  What does this MEAN?? ' -> 'what does this mean'"""
+    t = " ".join((text or "").lower().split())
+    return re.sub(r"[\s?.!]+$", "", t)
+
+
+def canonical_pack(context_pack: Dict[str, Any]) -> str:
+    stable = {k: v for k, v in context_pack.items() if k not in _VOLATILE_PACK_KEYS}
+    return json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+def response_cache_key(context_pack: Dict[str, Any], history: Optional[List[Dict[str, Any]]]) -> str:
+    hist = [
+        [m.get("role"), normalize_message(m.get("content"))]
+        for m in (history or [])
+        if m.get("role") in ("user", "assistant")
+    ]
+    payload = json.dumps(
+        [canonical_pack(context_pack), normalize_message(context_pack.get("latest_user_message")), hist],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_sec: float = LLM_CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or (time.time() - item[0]) >= self.ttl_sec:
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, text: str) -> None:
+        if not text:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+RESPONSE_CACHE = LLMResponseCache()
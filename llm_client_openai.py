@@ -3,10 +3,22 @@
 
 import os
 import json
-from typing import Dict, Any, Optional, List
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Iterator, Optional, List
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from deadline import Deadline, call_timeout
+from llm_cache import LLM_CACHE_ENABLED, RESPONSE_CACHE, response_cache_key
+from llm_telemetry import TELEMETRY, LLMCallRecord
+from tool_memo import ToolMemo
+
+logger = logging.getLogger(__name__)
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -23,17 +35,85 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
 
-# Create OpenAI client at runtime to avoid env-loading issues
+# Process-wide OpenAI clients (sync + async) with pooled connections.
+# Created lazily on first use (not import-time, so env vars loaded later by uvicorn reload
+# subprocesses are still picked up) and rebuilt only when the API key or base URL changes.
 
-def get_client() -> OpenAI:
-    """
-    Create the OpenAI client at call-time (not import-time) to avoid issues where
-    environment variables are not loaded yet in uvicorn reload subprocesses.
-    """
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_TIMEOUT_SEC = float(os.getenv("OPENAI_TIMEOUT_SEC", "60"))
+OPENAI_CONNECT_TIMEOUT_SEC = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SEC", "10"))
+
+_client_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_client_key: Optional[tuple] = None
+_async_client: Optional[AsyncOpenAI] = None
+_async_client_key: Optional[tuple] = None
+
+
+def _client_config() -> tuple:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise LLMError("OPENAI_API_KEY is not set. Check your .env and load_dotenv() usage.")
-    return OpenAI(api_key=api_key)
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    return api_key, base_url
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT_SEC, connect=OPENAI_CONNECT_TIMEOUT_SEC)
+
+
+def get_client() -> OpenAI:
+    """Shared sync client; every chat turn reuses its HTTPS connection pool."""
+    global _client, _client_key
+
+    key = _client_config()
+    with _client_lock:
+        if _client is None or _client_key != key:
+            # the old client may still be serving another thread's request; let GC close it
+            api_key, base_url = key
+            _client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=_timeout(),
+                http_client=httpx.Client(limits=_pool_limits(), timeout=_timeout()),
+            )
+            _client_key = key
+        return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Async counterpart of get_client() for async endpoints."""
+    global _async_client, _async_client_key
+
+    key = _client_config()
+    with _client_lock:
+        if _async_client is None or _async_client_key != key:
+            api_key, base_url = key
+            _async_client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=_timeout(),
+                http_client=httpx.AsyncClient(limits=_pool_limits(), timeout=_timeout()),
+            )
+            _async_client_key = key
+        return _async_client
+
+
+def _client_for(deadline: Optional[Deadline]) -> OpenAI:
+    """
+    Shared client for one call. Under a deadline the SDK's own retries are off: each retry gets a
+    fresh deadline-sized timeout, so a timed-out completion would run on past the request budget.
+    """
+    client = get_client()
+    return client if deadline is None else client.with_options(max_retries=0)
 
 # --------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -150,7 +230,9 @@ Examples:
 - “This is as far as the public record goes right now.”
 
 If comparison_stats is present, summarize it plainly and explain what “similar cases” means.
-If the user asks how similar cases usually turn out, you must call get_outcome_stats.
+If prefetched_tools is present, those tool results were already looked up for this question; answer from them directly, and only call a tool again if you need a narrower lookup (e.g. contains_text) than the one provided.
+If template_draft is present, it is a factually checked draft answer; refine its wording but keep its facts and dates.
+If the user asks how similar cases usually turn out, you must call get_outcome_stats unless comparison_stats is already present.
 Do not predict outcomes.
 
 
@@ -158,146 +240,554 @@ Do not predict outcomes.
 """.strip()
 
 
-def call_llm_with_context_pack(context_pack: dict, history: Optional[List[dict]] = None) -> str:
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Executes one tool call, memoized per request/session (see tool_memo.py)
+
+def run_tool(
+    name: str,
+    parsed: Dict[str, Any],
+    context_pack: Dict[str, Any],
+    memo: ToolMemo,
+    deadline: Optional[Deadline] = None,
+) -> Any:
+    from tools import search_case_record, get_outcome_stats  # local import to avoid circulars
+
+    if name == "search_case_record":
+        args = {
+            "query_type": parsed.get("query_type", "all"),
+            "after_date": parsed.get("after_date"),
+            "before_date": parsed.get("before_date"),
+            "contains_text": parsed.get("contains_text"),
+        }
+        case_id = context_pack.get("active_case_id") or (context_pack.get("case_summary") or {}).get("case_id")
+        return memo.call(
+            name,
+            args,
+            lambda: search_case_record(context_pack=context_pack, **args),
+            scope=str(case_id or ""),
+        )
+
+    if name == "get_outcome_stats":
+        # fallback to pulling values from context_pack if model omits them
+        cs = context_pack.get("case_summary", {}) or {}
+        charge = cs.get("charge", {}) or {}
+        stage = context_pack.get("stage", {}) or {}
+
+        args = {
+            "stage_id": parsed.get("stage_id") or stage.get("stage_id"),
+            "offense_category": parsed.get("offense_category") or charge.get("offense_category") or charge.get("updated_offense_category"),
+            "charge_class": parsed.get("charge_class") or charge.get("class") or charge.get("charge_class"),
+        }
+        # the request deadline bounds the Socrata fetch (and skips it when too little time is left)
+        return memo.call(name, args, lambda: get_outcome_stats(**args, deadline=deadline))
+
+    return {"error": f"Unknown tool: {name}"}
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Tool definitions (reliable, in-process tools) offered to the model
+
+TOOL_DEFINITIONS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_case_record",
+            "description": (
+                "Search the already-loaded case context for dates/charges/disposition/bond/stage or text matches. "
+                "Use this when the user asks to find a date, list events, or search fields."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query_type": {
+                        "type": "string",
+                        "enum": ["all", "dates", "charges", "disposition", "bond", "stage"],
+                        "description": "Which slice of the record to search."
+                    },
+                    "after_date": {"type": "string", "description": "Optional ISO date like 2016-01-01 to only return dates after this."},
+                    "before_date": {"type": "string", "description": "Optional ISO date like 2016-12-31 to only return dates before this."},
+                    "contains_text": {"type": "string", "description": "Optional text to match against keys/values."},
+                },
+                "required": ["query_type"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_outcome_stats",
+            "description": (
+                "Compute outcome statistics for 'similar closed cases' based on the user's current case context. "
+                "Use when the user asks how similar cases usually turn out, outcomes, percentages, or statistics."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "stage_id": {
+                        "type": "string",
+                        "description": "User's current stage_id from context_pack['stage']['stage_id']."
+                    },
+                    "offense_category": {
+                        "type": "string",
+                        "description": "Offense category from the user's charge (offense_category or updated_offense_category)."
+                    },
+                    "charge_class": {
+                        "type": "string",
+                        "description": "Charge class from the user's charge (e.g., '4', 'X')."
+                    },
+                },
+                "required": ["stage_id"],
+            },
+        },
+    },
+]
+
+def _offered_tools(offer_tools: bool = True) -> Dict[str, Any]:
+    """
+    create() kwargs for the tool definitions. Pre-executed tools stay offered: their results are in
+    the context, but the model can still refine a lookup the prediction got wrong.
+    """
+    if not offer_tools:
+        return {}
+    return {"tools": TOOL_DEFINITIONS, "tool_choice": "auto"}
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Speculative pre-execution metrics now live in llm_telemetry (same counters, per call record)
+
+def prefetch_metrics() -> Dict[str, Any]:
+    return TELEMETRY.prefetch_metrics()
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Prompt layout is prefix-stable so the provider can reuse its cached prompt prefix across turns:
+#   system prompt -> stable case context -> growing history -> this turn's extras + latest question
+# Everything that changes per turn stays after the history; the case context is serialized
+# canonically (sorted keys) so it is byte-identical from one turn to the next.
+
+# context_pack keys that vary per turn (kept out of the stable case context)
+TURN_CONTEXT_KEYS = ("comparison_stats", "ui_stats", "ui_timeline", "prefetched_tools", "template_draft")
+# rendered as their own messages
+_PROMPT_ONLY_KEYS = ("latest_user_message", "conversation_summary")
+
+DEFAULT_QUESTION = "Explain where my case is right now."
+
+
+def _canonical_json(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _build_messages(context_pack: dict, history: Optional[List[dict]]) -> List[dict]:
     history = history or []
+    volatile = set(TURN_CONTEXT_KEYS) | set(_PROMPT_ONLY_KEYS)
 
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    stable = {k: v for k, v in context_pack.items() if k not in volatile}
+    turn_extras = {k: context_pack[k] for k in TURN_CONTEXT_KEYS if context_pack.get(k) is not None}
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        # the current case context as a user blob (so the model treats it as provided input)
+        {"role": "user", "content": f"CONTEXT_PACK_JSON:\n{_canonical_json(stable)}"},
+    ]
+
+    # digest of older turns (changes only when the rolling summary is refreshed)
+    if context_pack.get("conversation_summary"):
+        messages.append({
+            "role": "user",
+            "content": f"EARLIER_CONVERSATION_SUMMARY:\n{context_pack['conversation_summary']}",
+        })
 
     # include prior turns
     for m in history:
         if m.get("role") in ("user", "assistant"):
             messages.append({"role": m["role"], "content": m.get("content", "")})
 
-    # add the current case context as a user blob (so the model treats it as provided input)
+    latest = context_pack.get("latest_user_message") or DEFAULT_QUESTION
+    turn_blob = f"TURN_CONTEXT_JSON:\n{_canonical_json(turn_extras)}\n\n" if turn_extras else ""
     messages.append({
         "role": "user",
-        "content": f"CONTEXT_PACK_JSON:\n{context_pack}\n\n"
+        "content": f"{turn_blob}LATEST_QUESTION:\n{latest}\n\n"
                    f"Now respond to my latest question using this context."
     })
+    return messages
+
+
+def _log_usage(usage: Any, call: str, rec: Optional[LLMCallRecord] = None) -> None:
+    """Log prompt-cache effectiveness (cached_tokens > 0 means the prefix was reused)."""
+    if usage is None:
+        return
+    if rec is not None:
+        rec.add_usage(usage)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    logger.info(
+        "llm usage call=%s prompt_tokens=%s cached_tokens=%s completion_tokens=%s cached_pct=%.0f",
+        call,
+        prompt_tokens,
+        cached,
+        getattr(usage, "completion_tokens", None),
+        100.0 * cached / prompt_tokens if prompt_tokens else 0.0,
+    )
 
-    # --- TOOL DEFINITIONS (reliable, in-process tools) ---
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "search_case_record",
-                "description": (
-                    "Search the already-loaded case context for dates/charges/disposition/bond/stage or text matches. "
-                    "Use this when the user asks to find a date, list events, or search fields."
-                ),
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query_type": {
-                            "type": "string",
-                            "enum": ["all", "dates", "charges", "disposition", "bond", "stage"],
-                            "description": "Which slice of the record to search."
-                        },
-                        "after_date": {"type": "string", "description": "Optional ISO date like 2016-01-01 to only return dates after this."},
-                        "before_date": {"type": "string", "description": "Optional ISO date like 2016-12-31 to only return dates before this."},
-                        "contains_text": {"type": "string", "description": "Optional text to match against keys/values."},
-                    },
-                    "required": ["query_type"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_outcome_stats",
-                "description": (
-                    "Compute outcome statistics for 'similar closed cases' based on the user's current case context. "
-                    "Use when the user asks how similar cases usually turn out, outcomes, percentages, or statistics."
-                ),
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "stage_id": {
-                            "type": "string",
-                            "description": "User's current stage_id from context_pack['stage']['stage_id']."
-                        },
-                        "offense_category": {
-                            "type": "string",
-                            "description": "Offense category from the user's charge (offense_category or updated_offense_category)."
-                        },
-                        "charge_class": {
-                            "type": "string",
-                            "description": "Charge class from the user's charge (e.g., '4', 'X')."
-                        },
-                    },
-                    "required": ["stage_id"],
-                },
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Rolling conversation summary (see conversation_summary.py): condenses older turns into a digest
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an assistant about the user's court case.
+Merge the previous summary with the new messages into one updated summary.
+Keep: what the user asked about, facts from their record that were discussed, and anything the user said about their situation.
+Drop: pleasantries and wording. Do not add facts. Plain text, at most 120 words.
+""".strip()
+
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))
+
+
+def summarize_conversation(previous_summary: str, messages: List[dict]) -> str:
+    transcript = "\n".join(
+        f"{'User' if m.get('role') == 'user' else 'Assistant'}: {m.get('content', '')}" for m in messages
+    )
+    resp = get_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}",
             },
-        },
+        ],
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    _log_usage(getattr(resp, "usage", None), "summary")
+    return (resp.choices[0].message.content or "").strip()
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Tool calls from one model turn run concurrently on shared pools, each with its own timeout.
+# (Shared rather than per-turn so a timed-out tool never blocks the request on pool shutdown.)
+# - Cohort stats can hold a worker for a whole cold fetch, so they get their own pool and can't
+#   starve quick lookups
+# - A tool's timeout counts from when it starts running; time spent queued for a worker is bounded
+#   separately, and a call that never got a worker is cancelled instead of running later for nobody
+
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+TOOL_STATS_WORKERS = int(os.getenv("TOOL_STATS_WORKERS", "4"))
+TOOL_TIMEOUTS_SEC = {
+    "search_case_record": float(os.getenv("TOOL_TIMEOUT_SEARCH_SEC", "5")),
+    "get_outcome_stats": float(os.getenv("TOOL_TIMEOUT_STATS_SEC", "60")),
+}
+DEFAULT_TOOL_TIMEOUT_SEC = float(os.getenv("TOOL_TIMEOUT_DEFAULT_SEC", "30"))
+
+_tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="llm-tool")
+_stats_tool_pool = ThreadPoolExecutor(max_workers=TOOL_STATS_WORKERS, thread_name_prefix="llm-tool-stats")
+
+
+def _pool_for(name: str) -> ThreadPoolExecutor:
+    return _stats_tool_pool if name == "get_outcome_stats" else _tool_pool
+
+
+class _ToolStart:
+    """Set by the worker when a submitted tool call actually starts running."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = 0.0
+
+    def mark(self) -> None:
+        self.at = time.monotonic()
+        self.event.set()
+
+
+def _run_one_tool(
+    name: str,
+    args: Any,
+    context_pack: dict,
+    memo: ToolMemo,
+    deadline: Optional[Deadline],
+    start: Optional[_ToolStart] = None,
+) -> Any:
+    if start is not None:
+        start.mark()
+    parsed = json.loads(args) if isinstance(args, str) and args else (args or {})
+    return run_tool(name, parsed, context_pack, memo, deadline=deadline)
+
+
+class _ToolNotStarted(Exception):
+    pass
+
+
+def _await_tool(fut, start: _ToolStart, queued_until: float, timeout: float, deadline: Optional[Deadline]) -> Any:
+    if not start.event.wait(timeout=max(0.0, queued_until - time.monotonic())):
+        if fut.cancel():
+            raise _ToolNotStarted()
+        # picked up just as we gave up waiting
+        start.event.wait()
+    finish_by = start.at + timeout
+    if deadline is not None:
+        finish_by = min(finish_by, deadline.expires_at)
+    return fut.result(timeout=max(0.0, finish_by - time.monotonic()))
+
+
+def _run_tool_calls(
+    calls: List[tuple],
+    context_pack: dict,
+    memo: Optional[ToolMemo],
+    deadline: Optional[Deadline] = None,
+) -> List[dict]:
+    """(tool_call_id, name, raw arguments) triples -> role=tool messages, in call order.
+    With a deadline, each tool's timeout is capped by the time left (DeadlineExceeded if none is)
+    and the deadline is passed into the tool itself, so nothing runs on after the request gives up."""
+    memo = memo if memo is not None else ToolMemo()
+
+    limits = [TOOL_TIMEOUTS_SEC.get(name, DEFAULT_TOOL_TIMEOUT_SEC) for _, name, _ in calls]
+    timeouts = [call_timeout(deadline, limit) for limit in limits]
+
+    dispatched = time.monotonic()
+    starts = [_ToolStart() for _ in calls]
+    futures = [
+        _pool_for(name).submit(_run_one_tool, name, args, context_pack, memo, deadline, start)
+        for (_, name, args), start in zip(calls, starts)
     ]
 
-    client = get_client()
+    tool_messages = []
+    for (tool_call_id, name, _), fut, start, limit, timeout in zip(calls, futures, starts, limits, timeouts):
+        # waiting for a worker is bounded by the same timeout, counted from dispatch
+        queued_until = dispatched + timeout
+        try:
+            result = _await_tool(fut, start, queued_until, timeout, deadline)
+        except _ToolNotStarted:
+            result = {"skipped": True, "reason": f"{name} did not start: tool workers are busy"}
+        except FutureTimeoutError:
+            reason = "not enough time left in this request" if timeout < limit else f"timed out after {timeout:g}s"
+            result = {"skipped": True, "reason": f"{name} {reason}"}
+        except Exception as e:
+            result = {"error": f"{name} failed: {type(e).__name__}"}
+        tool_messages.append({
+            "role": "tool",
+            "tool_call_id": tool_call_id,
+            "content": json.dumps(result, ensure_ascii=False),
+        })
+    return tool_messages
+
+
+def call_llm_with_context_pack(
+    context_pack: dict,
+    history: Optional[List[dict]] = None,
+    memo: Optional[ToolMemo] = None,
+    use_cache: bool = True,
+    prefetched_tools: Optional[List[str]] = None,
+    intent: str = "plain",
+    deadline: Optional[Deadline] = None,
+    offer_tools: bool = True,
+) -> str:
+    rec = LLMCallRecord(intent=intent, prefetched_tools=list(prefetched_tools or []))
+    started = time.perf_counter()
+    try:
+        cache_key = None
+        if use_cache and LLM_CACHE_ENABLED:
+            cache_key = response_cache_key(context_pack, history)
+            cached = RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                rec.cache_hit = True
+                return cached
+
+        text = _complete(context_pack, history, memo, prefetched_tools, rec, deadline, offer_tools=offer_tools)
+        if cache_key:
+            RESPONSE_CACHE.put(cache_key, text)
+        return text
+    except Exception as e:
+        rec.error = type(e).__name__
+        raise
+    finally:
+        rec.latency_ms = (time.perf_counter() - started) * 1000.0
+        TELEMETRY.record(rec)
+
+
+def _complete(
+    context_pack: dict,
+    history: Optional[List[dict]],
+    memo: Optional[ToolMemo],
+    prefetched_tools: Optional[List[str]] = None,
+    rec: Optional[LLMCallRecord] = None,
+    deadline: Optional[Deadline] = None,
+    offer_tools: bool = True,
+) -> str:
+    rec = rec if rec is not None else LLMCallRecord()
+    messages = _build_messages(context_pack, history)
+
+    client = _client_for(deadline)
 
     # First call: allow the model to decide if it needs a tool
     resp = client.chat.completions.create(
         model=OPENAI_MODEL,
         messages=messages,
-        tools=tools,
-        tool_choice="auto",
         temperature=0.2,
+        timeout=call_timeout(deadline, OPENAI_TIMEOUT_SEC),
+        **_offered_tools(offer_tools),
     )
+    rec.completions += 1
 
+    _log_usage(getattr(resp, "usage", None), "first", rec)
     msg = resp.choices[0].message
 
     # If the model called tools, run them and do a second call with results
     if getattr(msg, "tool_calls", None):
-        from tools import search_case_record, get_outcome_stats  # local import to avoid circulars
-
-        tool_results = []
-
-        for tc in msg.tool_calls:
-            name = tc.function.name
-            args = tc.function.arguments
-
-            parsed = json.loads(args) if isinstance(args, str) else (args or {})
-
-            if name == "search_case_record":
-                result = search_case_record(
-                    context_pack=context_pack,
-                    query_type=parsed.get("query_type", "all"),
-                    after_date=parsed.get("after_date"),
-                    before_date=parsed.get("before_date"),
-                    contains_text=parsed.get("contains_text"),
-                )
-
-            elif name == "get_outcome_stats":
-                # fallback to pulling values from context_pack if model omits them
-                cs = context_pack.get("case_summary", {}) or {}
-                charge = cs.get("charge", {}) or {}
-                stage = context_pack.get("stage", {}) or {}
-
-                result = get_outcome_stats(
-                    stage_id=parsed.get("stage_id") or stage.get("stage_id"),
-                    offense_category=parsed.get("offense_category") or charge.get("offense_category") or charge.get("updated_offense_category"),
-                    charge_class=parsed.get("charge_class") or charge.get("class") or charge.get("charge_class"),
-                )
-
-            else:
-                result = {"error": f"Unknown tool: {name}"}
-
-            tool_results.append((tc.id, result))
+        calls = [(tc.id, tc.function.name, tc.function.arguments) for tc in msg.tool_calls]
+        rec.tools = [name for _, name, _ in calls]
 
         # Append the assistant tool-call message + tool outputs
         messages.append(msg)
-        for tool_call_id, result in tool_results:
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "content": json.dumps(result, ensure_ascii=False),
-            })
+        messages.extend(_run_tool_calls(calls, context_pack, memo, deadline))
 
         # Second call: model writes final answer using tool output
         resp2 = client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=messages,
             temperature=0.2,
+            timeout=call_timeout(deadline, OPENAI_TIMEOUT_SEC),
         )
+        rec.completions += 1
+        _log_usage(getattr(resp2, "usage", None), "after_tools", rec)
         return (resp2.choices[0].message.content or "").strip()
 
     # No tools needed; return directly
     return (msg.content or "").strip()
+
+
+# --------------------------------------------------------------------------------------------------------------------------------------------
+
+# Streaming variant: yields text deltas as they arrive (used by /chat/stream).
+# Cache hits are yielded as a single delta.
+# Tool calls are assembled from the streamed deltas, executed, and the post-tool
+# completion is streamed too.
+
+def stream_llm_with_context_pack(
+    context_pack: dict,
+    history: Optional[List[dict]] = None,
+    memo: Optional[ToolMemo] = None,
+    use_cache: bool = True,
+    prefetched_tools: Optional[List[str]] = None,
+    intent: str = "plain",
+    deadline: Optional[Deadline] = None,
+    offer_tools: bool = True,
+) -> Iterator[str]:
+    rec = LLMCallRecord(intent=intent, streamed=True, prefetched_tools=list(prefetched_tools or []))
+    started = time.perf_counter()
+
+    def first_delta() -> None:
+        if rec.ttft_ms is None:
+            rec.ttft_ms = (time.perf_counter() - started) * 1000.0
+
+    try:
+        cache_key = None
+        if use_cache and LLM_CACHE_ENABLED:
+            cache_key = response_cache_key(context_pack, history)
+            cached = RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                rec.cache_hit = True
+                first_delta()
+                yield cached
+                return
+
+        parts: List[str] = []
+        for delta in _stream_completion(context_pack, history, memo, prefetched_tools, rec, deadline, offer_tools=offer_tools):
+            first_delta()
+            parts.append(delta)
+            yield delta
+        # only reached when the stream completed (not on errors / disconnects)
+        if cache_key:
+            RESPONSE_CACHE.put(cache_key, "".join(parts).strip())
+    except GeneratorExit:
+        rec.error = "ClientDisconnected"
+        raise
+    except Exception as e:
+        rec.error = type(e).__name__
+        raise
+    finally:
+        rec.latency_ms = (time.perf_counter() - started) * 1000.0
+        TELEMETRY.record(rec)
+
+
+def _stream_completion(
+    context_pack: dict,
+    history: Optional[List[dict]],
+    memo: Optional[ToolMemo],
+    prefetched_tools: Optional[List[str]] = None,
+    rec: Optional[LLMCallRecord] = None,
+    deadline: Optional[Deadline] = None,
+    offer_tools: bool = True,
+) -> Iterator[str]:
+    rec = rec if rec is not None else LLMCallRecord(streamed=True)
+    messages = _build_messages(context_pack, history)
+
+    client = _client_for(deadline)
+
+    stream = client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=0.2,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=call_timeout(deadline, OPENAI_TIMEOUT_SEC),
+        **_offered_tools(offer_tools),
+    )
+    rec.completions += 1
+
+    content_parts: List[str] = []
+    # index -> {"id", "name", "arguments"} built up from partial deltas
+    pending_calls: Dict[int, Dict[str, str]] = {}
+
+    for chunk in stream:
+        # with include_usage the last chunk carries usage and no choices
+        _log_usage(getattr(chunk, "usage", None), "first", rec)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            content_parts.append(delta.content)
+            yield delta.content
+
+        for tc in (delta.tool_calls or []):
+            call = pending_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function and tc.function.name:
+                call["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                call["arguments"] += tc.function.arguments
+
+    if not pending_calls:
+        return
+
+    ordered = [pending_calls[i] for i in sorted(pending_calls)]
+    rec.tools = [c["name"] for c in ordered]
+    messages.append({
+        "role": "assistant",
+        "content": "".join(content_parts) or None,
+        "tool_calls": [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+            for c in ordered
+        ],
+    })
+    messages.extend(_run_tool_calls([(c["id"], c["name"], c["arguments"]) for c in ordered], context_pack, memo, deadline))
+
+    # Second call: stream the final answer that uses the tool output
+    stream2 = client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=0.2,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=call_timeout(deadline, OPENAI_TIMEOUT_SEC),
+    )
+    rec.completions += 1
+    for chunk in stream2:
+        _log_usage(getattr(chunk, "usage", None), "after_tools", rec)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
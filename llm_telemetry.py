@@ -0,0 +1,186 @@
+# llm_telemetry.py
+# Per-call LLM telemetry: what each call_llm_with_context_pack / stream_llm_with_context_pack cost.
+# - One LLMCallRecord per call: tokens (prompt / completion / cached), time-to-first-token,
+#   total latency, number of completions (0 on a cache hit, 1, or 2 with a tool round trip),
+#   tools invoked, tagged by intent branch (timeline, where_am_i, common_question, simulator, stats, plain)
+# - Aggregated per intent into fixed-bucket histograms + p50/p95/p99 (QuantileSketch),
+#   exposed by api.py at GET /metrics/llm
+# - Also tracks speculative tool pre-execution (second completion avoided vs. still needed)
+# - Turns answered without the LLM (simulator, templates, common questions) are only counted,
+#   per intent: their near-zero timings would drag the per-intent latency percentiles down
+
+from __future__ import annotations
+
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+import bisect
+import os
+import threading
+import time
+
+from quantile_sketch import QuantileSketch
+
+
+LLM_TELEMETRY_RECENT = int(os.getenv("LLM_TELEMETRY_RECENT", "200"))
+
+INTENTS = ("timeline", "where_am_i", "common_question", "simulator", "stats", "plain")
+
+# Upper bucket edges; the last bucket is open-ended
+LATENCY_MS_EDGES = [100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+TOKEN_EDGES = [250, 500, 1000, 2000, 4000, 8000, 16000]
+
+METRIC_EDGES = {
+    "latency_ms": LATENCY_MS_EDGES,
+    "ttft_ms": LATENCY_MS_EDGES,
+    "prompt_tokens": TOKEN_EDGES,
+    "completion_tokens": TOKEN_EDGES,
+    "cached_tokens": TOKEN_EDGES,
+}
+
+
+@dataclass
+class LLMCallRecord:
+    intent: str = "plain"
+    ts: float = field(default_factory=lambda: time.time())
+    streamed: bool = False
+    cache_hit: bool = False
+    completions: int = 0
+    tools: List[str] = field(default_factory=list)
+    prefetched_tools: List[str] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    # streaming only: time until the first text delta reached the caller
+    ttft_ms: Optional[float] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def add_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.prompt_tokens += getattr(usage, "prompt_tokens", None) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", None) or 0
+        self.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+
+class Histogram:
+    def __init__(self, edges: List[float]):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.sketch = QuantileSketch()
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.sketch.add(max(0.0, value))
+        self.total += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = []
+        lo: Optional[float] = 0
+        for i, n in enumerate(self.counts):
+            hi = self.edges[i] if i < len(self.edges) else None
+            buckets.append({"from": lo, "to": hi, "count": n})
+            lo = hi
+        p50, p95, p99 = self.sketch.quantiles([0.5, 0.95, 0.99])
+        return {
+            "n": self.sketch.count,
+            "sum": round(self.total, 1),
+            "p50": round(p50, 1) if p50 is not None else None,
+            "p95": round(p95, 1) if p95 is not None else None,
+            "p99": round(p99, 1) if p99 is not None else None,
+            "buckets": buckets,
+        }
+
+
+class _IntentStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.completions: Counter = Counter()
+        self.tools: Counter = Counter()
+        self.histograms = {name: Histogram(edges) for name, edges in METRIC_EDGES.items()}
+
+    def add(self, rec: LLMCallRecord) -> None:
+        self.calls += 1
+        self.errors += 1 if rec.error else 0
+        self.cache_hits += 1 if rec.cache_hit else 0
+        self.completions[str(rec.completions)] += 1
+        self.tools.update(rec.tools)
+        for name, hist in self.histograms.items():
+            value = getattr(rec, name)
+            # token counts only mean something when a completion actually ran
+            if value is None or (rec.completions == 0 and name != "latency_ms"):
+                continue
+            hist.add(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "completions": dict(self.completions),
+            "tools": dict(self.tools),
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+        }
+
+
+class LLMTelemetry:
+    def __init__(self, recent: int = LLM_TELEMETRY_RECENT):
+        self._lock = threading.Lock()
+        self._by_intent: Dict[str, _IntentStats] = {}
+        self._recent: Deque[LLMCallRecord] = deque(maxlen=recent)
+        self._prefetch = {"prefetched_turns": 0, "second_call_avoided": 0, "second_call_needed": 0}
+        self._non_llm: Counter = Counter()
+
+    def record(self, rec: LLMCallRecord) -> None:
+        with self._lock:
+            stats = self._by_intent.get(rec.intent)
+            if stats is None:
+                stats = self._by_intent[rec.intent] = _IntentStats()
+            stats.add(rec)
+            self._recent.append(rec)
+
+            if rec.prefetched_tools and rec.completions and not rec.error:
+                self._prefetch["prefetched_turns"] += 1
+                # tools stay offered, so this is whether the model still asked for one
+                key = "second_call_needed" if rec.tools else "second_call_avoided"
+                self._prefetch[key] += 1
+
+    def record_non_llm(self, intent: str) -> None:
+        """A turn answered without an LLM call; counted, kept out of the latency histograms."""
+        with self._lock:
+            self._non_llm[intent] += 1
+
+    def prefetch_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._prefetch)
+        turns = out["prefetched_turns"]
+        out["avoided_rate"] = round(out["second_call_avoided"] / turns, 3) if turns else None
+        return out
+
+    def snapshot(self, recent: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            by_intent = {intent: s.to_dict() for intent, s in sorted(self._by_intent.items())}
+            last = [asdict(r) for r in list(self._recent)[-recent:]] if recent > 0 else []
+            non_llm = dict(sorted(self._non_llm.items()))
+        return {
+            "by_intent": by_intent,
+            "non_llm_turns": non_llm,
+            "tool_prefetch": self.prefetch_metrics(),
+            "recent": last,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_intent.clear()
+            self._recent.clear()
+            self._non_llm.clear()
+            for k in self._prefetch:
+                self._prefetch[k] = 0
+
+
+TELEMETRY = LLMTelemetry()
@@ -0,0 +1,156 @@
+# load_harness.py
+# Drives /chat at a target concurrency and reports p50/p95/p99 per pipeline stage.
+# Stage timings come from the Server-Timing header api.py sets (case_fetch, context, stats,
+# prefetch, llm, total); "client" is the wall time seen by the harness (includes HTTP overhead).
+#
+# Typical run against the fake LLM (see fake_openai_server.py):
+#   uvicorn fake_openai_server:app --port 8100
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake STATS_WARMER_ENABLED=0 uvicorn api:app --port 8000
+#   python load_harness.py --case-id 364915353569 --concurrency 16 --requests 400
+
+from __future__ import annotations
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import argparse
+import itertools
+import json
+import threading
+import time
+import uuid
+
+import requests
+
+
+DEFAULT_MESSAGES = [
+    "Where is my case right now?",
+    "When was my arraignment?",
+    "How do similar cases usually turn out?",
+    "What does pretrial mean for me?",
+    "Show my timeline",
+]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """'case_fetch;dur=12.3, llm;dur=801.0' -> {"case_fetch": 12.3, "llm": 801.0}"""
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    out[name] = float(value)
+                except ValueError:
+                    pass
+    return out
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-q * len(ordered) // 100)))  # ceil(q/100 * n)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LoadRun:
+    def __init__(self, base_url: str, case_id: str, messages: List[str], timeout_sec: float = 120):
+        self.base_url = base_url.rstrip("/")
+        self.case_id = case_id
+        self.timeout_sec = timeout_sec
+        self._messages = itertools.cycle(messages)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.completed = 0
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            self._local.session = s
+        return s
+
+    def one_request(self, _: int) -> None:
+        with self._lock:
+            message = next(self._messages)
+        body = {"session_id": str(uuid.uuid4()), "case_id": self.case_id, "user_message": message}
+
+        t0 = time.perf_counter()
+        try:
+            resp = self._session().post(f"{self.base_url}/chat", json=body, timeout=self.timeout_sec)
+        except requests.RequestException as e:
+            with self._lock:
+                self.errors[type(e).__name__] += 1
+            return
+        client_ms = (time.perf_counter() - t0) * 1000.0
+
+        with self._lock:
+            if resp.status_code != 200:
+                self.errors[f"HTTP {resp.status_code}"] += 1
+                return
+            self.completed += 1
+            self.samples["client"].append(client_ms)
+            for stage, ms in parse_server_timing(resp.headers.get("Server-Timing")).items():
+                self.samples[stage].append(ms)
+
+    def run(self, total: int, concurrency: int) -> float:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(self.one_request, range(total)))
+        return time.perf_counter() - t0
+
+    def report(self, elapsed_sec: float) -> Dict[str, object]:
+        stages = {}
+        for stage, values in self.samples.items():
+            stages[stage] = {
+                "n": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+        return {
+            "completed": self.completed,
+            "errors": dict(self.errors),
+            "elapsed_sec": round(elapsed_sec, 2),
+            "throughput_rps": round(self.completed / elapsed_sec, 2) if elapsed_sec else None,
+            "stages_ms": stages,
+        }
+
+
+def format_report(report: Dict[str, object]) -> str:
+    lines = [
+        f"completed={report['completed']} errors={report['errors']} "
+        f"elapsed={report['elapsed_sec']}s throughput={report['throughput_rps']} req/s",
+        f"{'stage':<12}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)",
+    ]
+    for stage, s in sorted(report["stages_ms"].items()):
+        lines.append(f"{stage:<12}{s['n']:>7}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Load test /chat and report per-stage latency percentiles.")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--case-id", required=True)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--message", action="append", help="user message (repeatable); defaults to a built-in mix")
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = p.parse_args(argv)
+
+    run = LoadRun(args.url, args.case_id, args.message or DEFAULT_MESSAGES)
+    elapsed = run.run(args.requests, args.concurrency)
+    report = run.report(elapsed)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
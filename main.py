@@ -8,6 +8,8 @@ import requests
 import random
 from datetime import datetime
 
+from deadline import DeadlineExceeded, call_timeout
+
 print("LOADED main.py")
 
 
@@ -19,6 +21,9 @@ INITIATION_URL = "https://datacatalog.cookcountyil.gov/resource/7mck-ehwz.json"
 DISPOSITION_URL = "https://datacatalog.cookcountyil.gov/resource/apwk-dzx8.json"
 SENTENCING_URL = "https://datacatalog.cookcountyil.gov/resource/tg8v-tm6u.json"
 
+# Per-request read timeout for case lookups (capped further by a request deadline, if any)
+CASE_FETCH_TIMEOUT_SEC = 30
+
 # --------------------------------------------------------------------------------------------------------------------------------------------
 
 # DATA EXPLORATION UTILITIES - e.g. counting initiated cases, disposed cases, estimating open cases
@@ -176,8 +181,12 @@ def print_case(case):
     
     print(f"\n{'='*70}\n")
 # --------------------------------------------------------------------------------------------------------------------------------------------
-def fetch_case_by_id(search_id): # core function
-    """Fetch a case by ID, trying both case_id and case_participant_id."""
+def fetch_case_by_id(search_id, deadline=None): # core function
+    """
+    Fetch a case by ID, trying both case_id and case_participant_id.
+    With a deadline (deadline.py), each request's timeout shrinks to the time left, and
+    DeadlineExceeded is raised (not swallowed) once the budget runs out.
+    """
     print(f"\n{'='*70}")
     print(f"FETCHING CASE: {search_id}")
     print(f"{'='*70}\n")
@@ -188,12 +197,12 @@ def fetch_case_by_id(search_id): # core function
     print("Step 1: Checking Intake dataset...")
     try:
         params = {"case_participant_id": search_id}
-        response = requests.get(INTAKE_URL, params=params, timeout=30)
+        response = requests.get(INTAKE_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
         intake = response.json()
         
         if not intake:
             params = {"case_id": search_id}
-            response = requests.get(INTAKE_URL, params=params, timeout=30)
+            response = requests.get(INTAKE_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
             intake = response.json()
         
         if intake:
@@ -201,6 +210,8 @@ def fetch_case_by_id(search_id): # core function
             print(f"  ✓ Found in Intake")
         else:
             print(f"  ✗ Not found in Intake")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"  ❌ Error: {e}")
     
@@ -208,12 +219,12 @@ def fetch_case_by_id(search_id): # core function
     print("Step 2: Checking Initiation dataset...")
     try:
         params = {"case_participant_id": search_id}
-        response = requests.get(INITIATION_URL, params=params, timeout=30)
+        response = requests.get(INITIATION_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
         initiation = response.json()
         
         if not initiation:
             params = {"case_id": search_id}
-            response = requests.get(INITIATION_URL, params=params, timeout=30)
+            response = requests.get(INITIATION_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
             initiation = response.json()
         
         if initiation:
@@ -221,6 +232,8 @@ def fetch_case_by_id(search_id): # core function
             print(f"  ✓ Found in Initiation")
         else:
             print(f"  ✗ Not found in Initiation")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"  ❌ Error: {e}")
     
@@ -228,12 +241,12 @@ def fetch_case_by_id(search_id): # core function
     print("Step 3: Checking Disposition dataset...")
     try:
         params = {"case_participant_id": search_id}
-        response = requests.get(DISPOSITION_URL, params=params, timeout=30)
+        response = requests.get(DISPOSITION_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
         disposition = response.json()
         
         if not disposition:
             params = {"case_id": search_id}
-            response = requests.get(DISPOSITION_URL, params=params, timeout=30)
+            response = requests.get(DISPOSITION_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
             disposition = response.json()
         
         if disposition:
@@ -241,6 +254,8 @@ def fetch_case_by_id(search_id): # core function
             print(f"  ✓ Found in Disposition (CLOSED)")
         else:
             print(f"  ✗ Not found in Disposition (OPEN)")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"  ❌ Error: {e}")
     
@@ -248,12 +263,12 @@ def fetch_case_by_id(search_id): # core function
     print("Step 4: Checking Sentencing dataset...")
     try:
         params = {"case_participant_id": search_id}
-        response = requests.get(SENTENCING_URL, params=params, timeout=30)
+        response = requests.get(SENTENCING_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
         sentencing = response.json()
         
         if not sentencing:
             params = {"case_id": search_id}
-            response = requests.get(SENTENCING_URL, params=params, timeout=30)
+            response = requests.get(SENTENCING_URL, params=params, timeout=call_timeout(deadline, CASE_FETCH_TIMEOUT_SEC))
             sentencing = response.json()
         
         if sentencing:
@@ -261,12 +276,17 @@ def fetch_case_by_id(search_id): # core function
             print(f"  ✓ Found in Sentencing")
         else:
             print(f"  ✗ Not found in Sentencing")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"  ❌ Error: {e}")
     
     print()
     
     if not case_data:
+        if deadline is not None and deadline.expired():
+            # lookups timed out on the request budget; "not found" would be wrong
+            raise DeadlineExceeded(f"case fetch for {search_id} ran out of time")
         print(f"❌ Case {search_id} not found in any dataset.\n")
         return None
     
@@ -1,7 +1,7 @@
 # memory_store.py
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 import time
 import uuid
 
@@ -18,6 +18,17 @@ class Session:
     session_id: str
     case_id: Optional[str] = None
     messages: List[Message] = field(default_factory=list)
+    # session-scoped tool results: memo key -> (ts, result); see tool_memo.ToolMemo
+    tool_memo: Dict[str, Tuple[float, Any]] = field(default_factory=dict)
+    # rolling digest of messages[:summary_upto]; see conversation_summary.ConversationSummarizer
+    summary: str = ""
+    summary_upto: int = 0
+    summary_pending: bool = False
+    # resolved case for case_context_id, reused across turns until stale (see api.session_case_context)
+    case_context_id: Optional[str] = None
+    case_data: Optional[Dict[str, Any]] = None
+    context_pack: Optional[Dict[str, Any]] = None
+    case_fetched_ts: float = 0.0
     created_ts: float = field(default_factory=lambda: time.time())
     updated_ts: float = field(default_factory=lambda: time.time())
 
@@ -0,0 +1,134 @@
+# precompute_answers.py
+# Offline job: generate answers for every stage's STAGE_CARDS common_questions and write the
+# JSON store that answer_index.py serves at runtime.
+#
+#   python precompute_answers.py                 # generate missing answers (vetted=false)
+#   python precompute_answers.py --regenerate    # regenerate everything
+#   python precompute_answers.py --mark-vetted   # also mark answers that pass the checks as vetted
+#
+# Answers are general to the stage (no case facts), so one answer serves everyone at that stage.
+# Only vetted answers are served; review the file (or use --mark-vetted) before deploying it.
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import re
+import time
+
+from answer_index import PRECOMPUTED_ANSWERS_PATH, load_answers, normalize_question
+from llm_client_openai import OPENAI_MODEL, call_llm_with_context_pack
+from main import STAGE_CARDS
+
+
+ANSWER_INSTRUCTION = (
+    "Answer this general question about the {title} stage: \"{question}\"\n"
+    "This answer is shown to anyone at this stage, so do not refer to any specific case, dates, or charges. "
+    "Explain how the process generally works. 1-2 short paragraphs."
+)
+
+# Phrasing that must not appear in a served answer (advice, predictions, support-agent tone)
+BANNED_PATTERNS = [
+    r"\byou should\b",
+    r"\bi recommend\b",
+    r"\bmy advice\b",
+    r"\byou will (?:likely|probably)\b",
+    r"\bit'?s understandable\b",
+    r"\byou'?re not alone\b",
+    r"\bbased on the information provided\b",
+]
+MAX_ANSWER_CHARS = 1500
+
+
+def check_answer(answer: str) -> List[str]:
+    """Automated vetting checks; returns the list of problems (empty = passes)."""
+    problems = []
+    text = (answer or "").strip()
+    if not text:
+        problems.append("empty")
+    if len(text) > MAX_ANSWER_CHARS:
+        problems.append("too_long")
+    lowered = text.lower().replace("’", "'")
+    for pat in BANNED_PATTERNS:
+        if re.search(pat, lowered):
+            problems.append(f"banned:{pat}")
+    return problems
+
+
+def generate_answer(stage_id: str, card: Dict[str, Any], question: str) -> str:
+    pack = {
+        "stage": {"stage_id": stage_id, "stage_label": card.get("title", stage_id)},
+        "stage_card": card,
+        "latest_user_message": ANSWER_INSTRUCTION.format(title=card.get("title", stage_id), question=question),
+    }
+    # no case data, so no tools to offer
+    return call_llm_with_context_pack(
+        pack,
+        use_cache=False,
+        offer_tools=False,
+        intent="precompute",
+    )
+
+
+def build_store(
+    existing: Dict[str, List[Dict[str, Any]]],
+    *,
+    regenerate: bool = False,
+    mark_vetted: bool = False,
+    stage_cards: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    stage_cards = stage_cards if stage_cards is not None else STAGE_CARDS
+    out: Dict[str, List[Dict[str, Any]]] = {}
+
+    for stage_id, card in stage_cards.items():
+        questions = card.get("common_questions") or []
+        if not questions:
+            continue
+        previous = {normalize_question(e.get("question", "")): e for e in existing.get(stage_id, [])}
+
+        entries = []
+        for q in questions:
+            entry = previous.get(normalize_question(q))
+            if entry is None or regenerate:
+                answer = generate_answer(stage_id, card, q)
+                entry = {
+                    "question": q,
+                    "answer": answer,
+                    "model": OPENAI_MODEL,
+                    "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "vetted": False,
+                }
+            problems = check_answer(entry.get("answer", ""))
+            entry["checks"] = problems
+            if problems:
+                entry["vetted"] = False
+            elif mark_vetted:
+                entry["vetted"] = True
+            entries.append(entry)
+        out[stage_id] = entries
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Generate answers for STAGE_CARDS common_questions.")
+    p.add_argument("--out", default=PRECOMPUTED_ANSWERS_PATH)
+    p.add_argument("--regenerate", action="store_true", help="regenerate answers that already exist")
+    p.add_argument("--mark-vetted", action="store_true", help="mark answers that pass the checks as vetted")
+    args = p.parse_args(argv)
+
+    store = build_store(load_answers(args.out), regenerate=args.regenerate, mark_vetted=args.mark_vetted)
+
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, args.out)
+
+    total = sum(len(v) for v in store.values())
+    vetted = sum(1 for v in store.values() for e in v if e.get("vetted"))
+    print(f"Wrote {total} answers ({vetted} vetted) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
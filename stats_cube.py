@@ -0,0 +1,235 @@
+# stats_cube.py
+# Bulk cohort stats: one pass over (a large slice of) the disposition history builds
+# a cube of CohortStatsAccumulators, one per (stage_id, offense_category, charge_class) cell.
+#
+# - Rows are partitioned (by disposition year or offense category) while they stream in; each
+#   partition chunk is aggregated in its own process (ProcessPoolExecutor) as soon as it fills,
+#   so the CPU-bound Python work isn't serialized by the GIL and the full result set is never
+#   held in memory
+# - Partial cubes are merged cell by cell (counts add, sketches/histograms merge exactly)
+# - Cells include the "any offense" / "any class" roll-ups, so every cohort the /chat path
+#   can ask for is answered straight from the cube
+
+from __future__ import annotations
+
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+
+from stats_service import (
+    DISPOSITION_SNAPSHOT,
+    EPOCH_DAYS_KEY,
+    NO_DATE,
+    SUPPORTED_STAGE_IDS_FOR_STATS,
+    TRANSITION_DATE_KEYS,
+    CohortStatsAccumulator,
+    DispositionQuery,
+    _norm,
+    build_disposition_where_clause,
+    cohort_cache_key,
+    iter_dispositions,
+    row_epoch_days,
+)
+
+
+CellKey = Tuple[str, str, str]
+Cube = Dict[CellKey, CohortStatsAccumulator]
+
+# Worker processes for cube builds (default: all cores)
+STATS_CUBE_WORKERS = int(os.getenv("STATS_CUBE_WORKERS", str(os.cpu_count() or 1)))
+# Rows per partition chunk handed to a worker (bounds memory while rows stream in)
+STATS_CUBE_CHUNK_ROWS = int(os.getenv("STATS_CUBE_CHUNK_ROWS", "20000"))
+
+# Only the columns the aggregates read are shipped to worker processes
+_CUBE_FIELDS = [
+    "offense_category",
+    "updated_offense_category",
+    "disposition_charged_class",
+    "charge_disposition",
+    "arraignment_date",
+    "disposition_date",
+]
+
+_DISPOSITION_IDX = TRANSITION_DATE_KEYS.index("disposition_date")
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _project(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: row.get(k) for k in _CUBE_FIELDS}
+    out[EPOCH_DAYS_KEY] = row_epoch_days(row)
+    return out
+
+
+# -------------------------
+# Partitioning
+# -------------------------
+
+def disposition_year(row: Dict[str, Any]) -> str:
+    d = row_epoch_days(row)[_DISPOSITION_IDX]
+    if d == NO_DATE:
+        return "unknown"
+    return str(date.fromordinal(d + _EPOCH_ORDINAL).year)
+
+
+def offense_category(row: Dict[str, Any]) -> str:
+    return _norm(row.get("offense_category")) or "unknown"
+
+
+PARTITIONERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "disposition_year": disposition_year,
+    "offense_category": offense_category,
+}
+
+
+def partition_rows(
+    rows: Iterable[Dict[str, Any]],
+    by: str = "disposition_year",
+    chunk_rows: int = STATS_CUBE_CHUNK_ROWS,
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Stream rows into per-partition buffers and yield (partition, rows) whenever a buffer
+    reaches chunk_rows, then the remainders. A partition may come out as several chunks.
+    """
+    key_fn = PARTITIONERS[by]
+    parts: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in rows:
+        key = key_fn(r)
+        buf = parts[key]
+        buf.append(_project(r))
+        if len(buf) >= chunk_rows:
+            yield key, buf
+            parts[key] = []
+    for key, buf in parts.items():
+        if buf:
+            yield key, buf
+
+
+# -------------------------
+# Aggregation
+# -------------------------
+
+def _cells_for_row(row: Dict[str, Any], stage_ids: Iterable[str]) -> List[Tuple[CellKey, Optional[str]]]:
+    """(cell key, offense category as the portal spells it) for every cell the row may count toward."""
+    # keys are normalized like cohort_cache_key; the portal spelling goes into cohort_definition,
+    # so cube results match what a live compute for that category returns
+    ocs: Dict[str, Optional[str]] = {"": None}
+    for field in ("offense_category", "updated_offense_category"):
+        raw = (row.get(field) or "").strip()
+        if raw:
+            ocs.setdefault(_norm(raw), raw)
+    cls = (row.get("disposition_charged_class") or "").strip()
+    classes = {"", cls}
+    return [((stage_id, oc, c), raw) for stage_id in stage_ids for oc, raw in ocs.items() for c in classes]
+
+
+def aggregate_partition(
+    rows: List[Dict[str, Any]],
+    stage_ids: Tuple[str, ...] = tuple(sorted(SUPPORTED_STAGE_IDS_FOR_STATS)),
+) -> Cube:
+    """Build the cube for one partition. Runs inside a worker process."""
+    cube: Cube = {}
+    for row in rows:
+        for key, raw_oc in _cells_for_row(row, stage_ids):
+            acc = cube.get(key)
+            if acc is None:
+                stage_id, _, cls = key
+                acc = CohortStatsAccumulator(
+                    user_stage_id=stage_id,
+                    offense_category=raw_oc,
+                    charge_class=cls or None,
+                )
+                cube[key] = acc
+            acc.add(row)
+
+    # drop cells the row didn't actually qualify for (stage not reached, etc.)
+    cube = {k: acc for k, acc in cube.items() if acc.sample_size > 0}
+    for acc in cube.values():
+        acc.transitions.flush()
+    return cube
+
+
+def merge_cubes(cubes: Iterable[Cube]) -> Cube:
+    merged: Cube = {}
+    for cube in cubes:
+        for key, acc in cube.items():
+            if key in merged:
+                merged[key].merge(acc)
+            else:
+                merged[key] = acc
+    return merged
+
+
+def build_cohort_cube(
+    rows: Iterable[Dict[str, Any]],
+    *,
+    partition_by: str = "disposition_year",
+    max_workers: Optional[int] = None,
+    chunk_rows: int = STATS_CUBE_CHUNK_ROWS,
+) -> Cube:
+    """
+    Partition rows as they stream in, aggregate each chunk on a process pool, merge the partial cubes.
+    max_workers=1 runs in-process (handy for tests / tiny inputs).
+    """
+    workers = max_workers or STATS_CUBE_WORKERS
+    chunks = partition_rows(rows, by=partition_by, chunk_rows=chunk_rows)
+
+    if workers <= 1:
+        return merge_cubes(aggregate_partition(chunk) for _, chunk in chunks)
+
+    cube: Cube = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for _, chunk in chunks:
+            pending.add(pool.submit(aggregate_partition, chunk))
+            # at most two chunks per worker in flight, so memory stays bounded
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                cube = merge_cubes([cube, *(f.result() for f in done)])
+        return merge_cubes([cube, *(f.result() for f in pending)])
+
+
+# -------------------------
+# Bulk build from the portal -> shared snapshot
+# -------------------------
+
+def build_cube_from_portal(
+    *,
+    partition_by: str = "disposition_year",
+    max_workers: Optional[int] = None,
+    fetch_workers: int = 4,
+) -> Cube:
+    """Fetch every closed, arraigned case once and build the whole cube from it."""
+    where = build_disposition_where_clause(
+        offense_category=None,
+        charge_class=None,
+        require_arraignment_date=True,
+    )
+    rows = iter_dispositions(
+        DispositionQuery(where=where, limit=10000, timeout_sec=60, max_workers=fetch_workers)
+    )
+    return build_cohort_cube(rows, partition_by=partition_by, max_workers=max_workers)
+
+
+def publish_cube(cube: Cube, cells: Optional[Iterable[CellKey]] = None) -> int:
+    """
+    Write cube cells into the shared DISPOSITION_SNAPSHOT. Returns cells written.
+    Each write takes the cohort's key lock, like compute_comparison_stats_for_user_context,
+    so it never interleaves with a concurrent refresh of the same cohort.
+    A cohort's existing CohortState is kept, so its next expiry is still a delta refresh (the cube
+    carries no per-row contributions to build one from); cohorts that had none get their state
+    from the first refresh after the published result expires.
+    """
+    keys = list(cells) if cells is not None else list(cube)
+    n = 0
+    for key in keys:
+        key = cohort_cache_key(*key)
+        acc = cube.get(key)
+        if acc is None:
+            continue
+        with DISPOSITION_SNAPSHOT.key_lock(key):
+            prev = DISPOSITION_SNAPSHOT.get(key)
+            DISPOSITION_SNAPSHOT.put(key, acc.result(), prev.state if prev is not None else None)
+        n += 1
+    return n
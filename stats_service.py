@@ -5,40 +5,61 @@
 #
 # Major upgrades:
 # (2) server-side filtering using Socrata $where (smaller + faster)
-# (3) in-process caching per cohort key
+# (3) in-process caching per cohort key (shared TTL snapshot, see DISPOSITION_SNAPSHOT)
 # (4) graceful fallback on timeouts / API hiccups (no crashing chat)
 # (5) Socrata app token supported via SOCRATA_APP_TOKEN (already in your code)
+# (6) streaming fetch (iter_dispositions) + on-the-fly aggregation (CohortStatsAccumulator)
+# (7) parallel page fetching: count(*) then bounded concurrent pages (STATS_FETCH_WORKERS)
+# (8) time-to-disposition via a mergeable quantile sketch (no raw duration samples kept)
+# (9) stage-transition matrix: duration percentiles + histogram for every milestone pair
+# (10) incremental refresh: per-cohort aggregates + :updated_at watermark, deltas only
+# (11) parse-once ingest: date columns -> epoch days when rows arrive (ingest_row)
+# (12) request deadlines: page timeouts shrink to the caller's remaining budget; cold cohorts are
+#      skipped (or served stale) when too little time is left (deadline.py)
 
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime
-from collections import Counter
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime
+from bisect import bisect_right
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import codecs
+import json
 import os
+import sys
+import threading
+import time
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from deadline import Deadline, DeadlineExceeded, call_timeout
+from quantile_sketch import QuantileSketch
+
 
 DISPOSITIONS_ENDPOINT = "https://datacatalog.cookcountyil.gov/resource/apwk-dzx8.json"
 
-# -------------------------
-# (3) Simple in-process cache
-# -------------------------
-# Keyed by: (stage_id, offense_category_lower, charge_class)
-_COMPARISON_STATS_CACHE: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+# (3) In-process cache: see DispositionSnapshot / DISPOSITION_SNAPSHOT below.
+# Shared by the /chat stats hook and the get_outcome_stats LLM tool.
+# How long a cohort's stats are served before a (delta) refresh
+STATS_SNAPSHOT_TTL_SEC = float(os.getenv("STATS_SNAPSHOT_TTL_SEC", str(6 * 3600)))
+# Failures are cached briefly so a stalled portal isn't hammered on every message
+STATS_ERROR_TTL_SEC = float(os.getenv("STATS_ERROR_TTL_SEC", "60"))
+# Delta refreshes can't see rows that left a cohort (see CohortState); rebuild from scratch this often
+STATS_FULL_REBUILD_SEC = float(os.getenv("STATS_FULL_REBUILD_SEC", str(24 * 3600)))
 
 
 # -------------------------
 # Requests session w/ retries
 # -------------------------
 
-def _requests_session_with_retries() -> requests.Session:
+def _requests_session_with_retries(total: int = 4) -> requests.Session:
     s = requests.Session()
     retry = Retry(
-        total=4,
+        total=total,
         backoff_factor=0.6,
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["GET"],
@@ -115,58 +136,302 @@ def reached_stage(row: Dict[str, Any], user_stage_id: str) -> bool:
     return False
 
 
+# -------------------------
+# Parse-once ingest: typed epoch-day date columns
+# -------------------------
+
+# Milestone columns in procedural order. Same order as tools.DATE_KEYS
+# (tools imports this module, so the list can't be imported from there).
+TRANSITION_DATE_KEYS = [
+    "incident_begin_date",
+    "incident_date",
+    "arrest_date",
+    "received_date",
+    "felony_review_date",
+    "arraignment_date",
+    "disposition_date",
+    "sentence_date",
+]
+
+# Row key holding the ingested tuple of epoch days, aligned with TRANSITION_DATE_KEYS
+EPOCH_DAYS_KEY = "_epoch_days"
+
+# Sentinel for a missing / unparseable date (epoch days can legitimately be 0 or negative)
+NO_DATE = -(2 ** 31)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_DATE_IDX = {k: i for i, k in enumerate(TRANSITION_DATE_KEYS)}
+_DISPOSITION_IDX = _DATE_IDX["disposition_date"]
+# fallback chain for the start of a case, in priority order
+_TTD_START_IDX = [
+    _DATE_IDX["received_date"],
+    _DATE_IDX["arrest_date"],
+    _DATE_IDX["incident_begin_date"],
+    _DATE_IDX["arraignment_date"],
+]
+
+
+def _epoch_day(s: Optional[str]) -> int:
+    """'2014-12-17T00:00:00.000' -> days since 1970-01-01, or NO_DATE."""
+    if not s:
+        return NO_DATE
+    # fast path: Socrata floating timestamps always start with YYYY-MM-DD
+    try:
+        return date(int(s[0:4]), int(s[5:7]), int(s[8:10])).toordinal() - _EPOCH_ORDINAL
+    except (ValueError, TypeError):
+        pass
+    dt = _parse_iso_date(s)
+    return dt.toordinal() - _EPOCH_ORDINAL if dt else NO_DATE
+
+
+def ingest_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert every milestone date column to epoch days exactly once, when the row arrives.
+    Downstream stats code reads row[EPOCH_DAYS_KEY] and never parses date strings again.
+    """
+    if EPOCH_DAYS_KEY not in row:
+        row[EPOCH_DAYS_KEY] = tuple(_epoch_day(row.get(k)) for k in TRANSITION_DATE_KEYS)
+    return row
+
+
+def row_epoch_days(row: Dict[str, Any]) -> Tuple[int, ...]:
+    """Ingested epoch days for a row (ingesting on the spot for rows that skipped ingest)."""
+    days = row.get(EPOCH_DAYS_KEY)
+    if days is None:
+        days = ingest_row(row)[EPOCH_DAYS_KEY]
+    return days
+
+
 # -------------------------
 # Fetch dispositions (Socrata)
 # -------------------------
 
+# Parallel page fetching: how many pages may be in flight at once (1 = sequential)
+STATS_FETCH_WORKERS = int(os.getenv("STATS_FETCH_WORKERS", "4"))
+# Page size used in parallel mode; smaller pages = more pages to spread across workers
+STATS_PARALLEL_PAGE_SIZE = int(os.getenv("STATS_PARALLEL_PAGE_SIZE", "10000"))
+
+
 @dataclass
 class DispositionQuery:
     where: Optional[str] = None
     limit: int = 50000
     timeout_sec: int = 60
+    # Socrata only guarantees stable paging with an explicit $order;
+    # parallel mode falls back to the row id (":id") when this is unset.
+    order: Optional[str] = None
+    max_workers: int = 1
+    select: Optional[str] = None
+    # request deadline (None = no overall budget, e.g. the warmer)
+    deadline: Optional[Deadline] = None
 
+    def http_timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeout for the next request, sized to the deadline if there is one."""
+        read = call_timeout(self.deadline, self.timeout_sec)
+        return min(10, read), read
 
-def fetch_dispositions(query: DispositionQuery) -> List[Dict[str, Any]]:
-    """
-    Fetch rows from the dispositions endpoint with Socrata pagination.
-    Uses retries and a (connect, read) timeout.
-    """
+    def http_retries(self) -> int:
+        # each retry would get a fresh deadline-sized timeout plus backoff, running past the budget
+        return 4 if self.deadline is None else 0
+
+
+def _socrata_headers() -> Dict[str, str]:
     headers = {}
     token = os.getenv("SOCRATA_APP_TOKEN")
     if token:
         headers["X-App-Token"] = token
+    return headers
 
-    session = _requests_session_with_retries()
 
-    all_rows: List[Dict[str, Any]] = []
-    offset = 0
+_thread_local = threading.local()
 
-    while True:
-        params = {"$limit": query.limit, "$offset": offset}
-        if query.where:
-            params["$where"] = query.where
-
-        resp = session.get(
-            DISPOSITIONS_ENDPOINT,
-            params=params,
-            headers=headers,
-            timeout=(10, query.timeout_sec),
-        )
 
+def _thread_session(retries: int = 4) -> requests.Session:
+    # requests.Session is not documented as thread-safe; give each worker its own (per retry policy)
+    sessions = getattr(_thread_local, "sessions", None)
+    if sessions is None:
+        sessions = _thread_local.sessions = {}
+    session = sessions.get(retries)
+    if session is None:
+        session = sessions[retries] = _requests_session_with_retries(retries)
+    return session
+
+
+def _iter_json_array(resp: requests.Response, chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally decode a top-level JSON array from a streamed response.
+    Only the undecoded tail of the body is buffered, so a 50k-row page never
+    has to exist as one giant string + one giant list at the same time.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    buf = ""
+    started = False
+
+    for raw in resp.iter_content(chunk_size=chunk_size):
+        if not raw:
+            continue
+        buf += text_decoder.decode(raw)
+
+        pos = 0
+        while True:
+            # skip whitespace + separators between elements
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array from the dispositions endpoint")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # element is split across chunks; wait for more data
+                break
+
+            yield obj
+            pos = end
+
+        buf = buf[pos:]
+
+    if not started:
+        raise ValueError("Empty response from the dispositions endpoint")
+    # EOF before the closing bracket: the connection dropped mid-page, so the rows
+    # seen so far are not the whole page and must not be treated as complete
+    raise ValueError("Truncated JSON array from the dispositions endpoint")
+
+
+def _iter_page(
+    session: requests.Session,
+    query: DispositionQuery,
+    offset: int,
+    *,
+    order: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    params = {"$limit": query.limit, "$offset": offset}
+    if query.where:
+        params["$where"] = query.where
+    if query.select:
+        params["$select"] = query.select
+    if order:
+        params["$order"] = order
+
+    resp = session.get(
+        DISPOSITIONS_ENDPOINT,
+        params=params,
+        headers=_socrata_headers(),
+        timeout=query.http_timeout(),
+        stream=True,
+    )
+
+    try:
         # If the API returns a non-200 with retries exhausted, raise here
         resp.raise_for_status()
+        for row in _iter_json_array(resp):
+            yield ingest_row(row)
+    finally:
+        resp.close()
+
+
+def count_dispositions(query: DispositionQuery) -> int:
+    """Row count for query.where via a single count(*) request."""
+    params = {"$select": "count(*) AS n"}
+    if query.where:
+        params["$where"] = query.where
+
+    resp = _thread_session(query.http_retries()).get(
+        DISPOSITIONS_ENDPOINT,
+        params=params,
+        headers=_socrata_headers(),
+        timeout=query.http_timeout(),
+    )
+    resp.raise_for_status()
 
-        chunk = resp.json()
-        if not chunk:
-            break
+    data = resp.json()
+    if not data:
+        return 0
+    return int(list(data[0].values())[0])
+
+
+def _fetch_page(query: DispositionQuery, offset: int, order: str) -> List[Dict[str, Any]]:
+    return list(_iter_page(_thread_session(query.http_retries()), query, offset, order=order))
+
+
+def _iter_dispositions_parallel(query: DispositionQuery) -> Iterator[Dict[str, Any]]:
+    """
+    count(*) first, then fetch every page concurrently with a bounded worker pool.
+    Pages are yielded in offset order; at most max_workers pages are in flight
+    (and buffered) at any time, so memory stays bounded by workers x page size.
+    """
+    total = count_dispositions(query)
+    if total <= 0:
+        return
+
+    order = query.order or ":id"
+    offsets = iter(range(0, total, query.limit))
+    in_flight: Deque[Future] = deque()
 
-        all_rows.extend(chunk)
-        if len(chunk) < query.limit:
+    with ThreadPoolExecutor(max_workers=query.max_workers) as pool:
+        try:
+            for off in offsets:
+                in_flight.append(pool.submit(_fetch_page, query, off, order))
+                if len(in_flight) >= query.max_workers:
+                    break
+
+            while in_flight:
+                page = in_flight.popleft().result()
+                nxt = next(offsets, None)
+                if nxt is not None:
+                    in_flight.append(pool.submit(_fetch_page, query, nxt, order))
+                yield from page
+        finally:
+            for f in in_flight:
+                f.cancel()
+
+
+def iter_dispositions(query: DispositionQuery) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of fetch_dispositions: yields rows as they are decoded.
+    Neither a full page nor the full cohort is ever held in memory, so callers
+    that aggregate on the fly (see CohortStatsAccumulator) run in constant memory.
+    With query.max_workers > 1 pages are downloaded concurrently instead.
+    """
+    if query.max_workers > 1:
+        yield from _iter_dispositions_parallel(query)
+        return
+
+    session = _requests_session_with_retries(query.http_retries())
+
+    offset = 0
+
+    while True:
+        page_len = 0
+        for row in _iter_page(session, query, offset, order=query.order):
+            page_len += 1
+            yield row
+
+        if page_len < query.limit:
             break
 
         offset += query.limit
 
-    return all_rows
+
+def fetch_dispositions(query: DispositionQuery) -> List[Dict[str, Any]]:
+    """
+    Fetch rows from the dispositions endpoint with Socrata pagination.
+    Uses retries and a (connect, read) timeout.
+    Materializes every page; prefer iter_dispositions for large cohorts.
+    """
+    return list(iter_dispositions(query))
 
 
 # -------------------------
@@ -174,21 +439,19 @@ def fetch_dispositions(query: DispositionQuery) -> List[Dict[str, Any]]:
 # -------------------------
 
 def _time_to_disposition_days(row: Dict[str, Any]) -> Optional[int]:
-    disp = _parse_iso_date(row.get("disposition_date"))
-    if not disp:
-        return None
+    days = row_epoch_days(row)
 
-    start = (
-        _parse_iso_date(row.get("received_date"))
-        or _parse_iso_date(row.get("arrest_date"))
-        or _parse_iso_date(row.get("incident_begin_date"))
-        or _parse_iso_date(row.get("arraignment_date"))
-    )
-    if not start:
+    disp = days[_DISPOSITION_IDX]
+    if disp == NO_DATE:
         return None
 
-    days = int((disp - start).days)
-    return days if days >= 0 else None
+    for i in _TTD_START_IDX:
+        start = days[i]
+        if start != NO_DATE:
+            delta = disp - start
+            return delta if delta >= 0 else None
+
+    return None
 
 
 def _percent_dict(counts: Counter) -> Dict[str, float]:
@@ -198,15 +461,142 @@ def _percent_dict(counts: Counter) -> Dict[str, float]:
     return {k: round((v / total) * 100.0, 1) for k, v in counts.items()}
 
 
-def _quantiles(sorted_vals: List[int]) -> Dict[str, Optional[float]]:
-    if not sorted_vals:
-        return {"p25": None, "median": None, "p75": None}
+# Percentiles reported for duration stats; the sketch can answer any others on demand
+DURATION_PERCENTILES = {"p25": 0.25, "median": 0.50, "p75": 0.75, "p90": 0.90}
+
+
+def _quantiles(sketch: QuantileSketch) -> Dict[str, Optional[float]]:
+    """Percentiles from a mergeable sketch (within sketch.relative_accuracy of exact)."""
+    out: Dict[str, Optional[float]] = {}
+    for name, q in DURATION_PERCENTILES.items():
+        v = sketch.quantile(q)
+        out[name] = round(v, 1) if v is not None else None
+    return out
+
+
+# -------------------------
+# Stage-transition duration matrix
+# -------------------------
+
+# Every ordered milestone pair (earlier -> later)
+TRANSITION_PAIRS: List[Tuple[str, str]] = [
+    (a, b)
+    for i, a in enumerate(TRANSITION_DATE_KEYS)
+    for b in TRANSITION_DATE_KEYS[i + 1:]
+]
+# same pairs as (earlier index, later index) into an epoch-days row
+_PAIR_AT = {(_DATE_IDX[a], _DATE_IDX[b]): (a, b) for a, b in TRANSITION_PAIRS}
+
+# Histogram bin lower edges in days: [0,7), [7,30), ... [730, inf)
+DURATION_HISTOGRAM_EDGES = [0, 7, 30, 60, 90, 180, 365, 730]
 
-    def pick(p: float) -> float:
-        idx = int(round(p * (len(sorted_vals) - 1)))
-        return float(sorted_vals[idx])
 
-    return {"p25": pick(0.25), "median": pick(0.50), "p75": pick(0.75)}
+def _transition_label(a: str, b: str) -> str:
+    return f"{a[:-len('_date')]} -> {b[:-len('_date')]}".replace("_", " ")
+
+
+class StageTransitionMatrix:
+    """
+    Duration distributions between every ordered pair of milestone dates.
+    Rows are buffered as epoch-day columns (NO_DATE = missing) and folded in batches: each flush is
+    a single pass over the batch's rows that updates every pair with both dates present, and memory
+    stays bounded by batch_size (sketch + histogram per pair, no raw durations).
+    """
+
+    def __init__(self, batch_size: int = 1024):
+        self.batch_size = batch_size
+        self._columns: Dict[str, List[int]] = {k: [] for k in TRANSITION_DATE_KEYS}
+        self._buffered = 0
+
+        self.sketches: Dict[Tuple[str, str], QuantileSketch] = {p: QuantileSketch() for p in TRANSITION_PAIRS}
+        self.histograms: Dict[Tuple[str, str], List[int]] = {
+            p: [0] * len(DURATION_HISTOGRAM_EDGES) for p in TRANSITION_PAIRS
+        }
+        # out-of-order milestones (data entry errors) are counted, not folded in
+        self.negative: Counter = Counter()
+
+    @staticmethod
+    def row_ordinals(row: Dict[str, Any]) -> Tuple[int, ...]:
+        return row_epoch_days(row)
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        self.add_ordinals(self.row_ordinals(row))
+
+    def add_ordinals(self, ordinals: Tuple[int, ...], sign: int = 1) -> None:
+        """Buffer one row's milestone epoch days; sign=-1 retracts a previously added row."""
+        if sign < 0:
+            # retractions are rare (changed rows); apply them immediately
+            self.flush()
+            self.add_columns({k: [v] for k, v in zip(TRANSITION_DATE_KEYS, ordinals)}, sign=sign)
+            return
+
+        for k, v in zip(TRANSITION_DATE_KEYS, ordinals):
+            self._columns[k].append(v)
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def add_columns(self, columns: Dict[str, List[int]], sign: int = 1) -> None:
+        """Fold one batch of epoch-day columns (NO_DATE = missing) into every pair, in one pass over the rows."""
+        edges = DURATION_HISTOGRAM_EDGES
+        n = max((len(v) for v in columns.values()), default=0)
+        cols = [columns.get(k) or [NO_DATE] * n for k in TRANSITION_DATE_KEYS]
+
+        for row in zip(*cols):
+            # only the milestones this row actually has (usually a handful of the 8)
+            dated = [(i, v) for i, v in enumerate(row) if v != NO_DATE]
+            for j, (ia, x) in enumerate(dated):
+                for ib, y in dated[j + 1:]:
+                    pair = _PAIR_AT[(ia, ib)]
+                    d = y - x
+                    if d < 0:
+                        self.negative[pair] += sign
+                        continue
+                    self.sketches[pair].add(d, sign)
+                    self.histograms[pair][bisect_right(edges, d) - 1] += sign
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        self.add_columns(self._columns)
+        self._columns = {k: [] for k in TRANSITION_DATE_KEYS}
+        self._buffered = 0
+
+    def merge(self, other: "StageTransitionMatrix") -> "StageTransitionMatrix":
+        self.flush()
+        other.flush()
+        for p in TRANSITION_PAIRS:
+            self.sketches[p].merge(other.sketches[p])
+            self.histograms[p] = [x + y for x, y in zip(self.histograms[p], other.histograms[p])]
+        self.negative.update(other.negative)
+        return self
+
+    def result(self) -> List[Dict[str, Any]]:
+        """One entry per milestone pair that has data, in procedural order."""
+        self.flush()
+
+        out = []
+        for a, b in TRANSITION_PAIRS:
+            sketch = self.sketches[(a, b)]
+            if sketch.count <= 0:
+                continue
+
+            hist = self.histograms[(a, b)]
+            bins = []
+            for i, lo in enumerate(DURATION_HISTOGRAM_EDGES):
+                hi = DURATION_HISTOGRAM_EDGES[i + 1] if i + 1 < len(DURATION_HISTOGRAM_EDGES) else None
+                bins.append({"from_days": lo, "to_days": hi, "count": hist[i]})
+
+            out.append({
+                "from": a,
+                "to": b,
+                "label": _transition_label(a, b),
+                "n": sketch.count,
+                **_quantiles(sketch),
+                "histogram": bins,
+                "out_of_order_skipped": self.negative.get((a, b), 0),
+            })
+        return out
 
 
 def build_cohort_definition(
@@ -224,6 +614,27 @@ def build_cohort_definition(
     }
 
 
+def _matches_cohort(
+    row: Dict[str, Any],
+    *,
+    user_stage_id: str,
+    oc_norm: str,
+    cls_norm: str,
+) -> bool:
+    if not row.get("disposition_date"):
+        return False
+
+    if oc_norm:
+        if _norm(row.get("offense_category")) != oc_norm and _norm(row.get("updated_offense_category")) != oc_norm:
+            return False
+
+    if cls_norm:
+        if (row.get("disposition_charged_class") or "").strip() != cls_norm:
+            return False
+
+    return reached_stage(row, user_stage_id)
+
+
 def filter_similar_closed_rows(
     rows: Iterable[Dict[str, Any]],
     *,
@@ -241,64 +652,149 @@ def filter_similar_closed_rows(
 
     cohort: List[Dict[str, Any]] = []
     for r in rows:
-        if not r.get("disposition_date"):
-            continue
+        if _matches_cohort(r, user_stage_id=user_stage_id, oc_norm=oc_norm, cls_norm=cls_norm):
+            cohort.append(r)
 
-        if oc_norm:
-            if _norm(r.get("offense_category")) != oc_norm and _norm(r.get("updated_offense_category")) != oc_norm:
-                continue
+    return cohort
 
-        if cls_norm:
-            if (r.get("disposition_charged_class") or "").strip() != cls_norm:
-                continue
 
-        if not reached_stage(r, user_stage_id):
-            continue
+@dataclass(frozen=True)
+class RowContribution:
+    outcome: str
+    raw_label: str
+    ttd_days: Optional[int]
+    milestones: Tuple[int, ...]
 
-        cohort.append(r)
 
-    return cohort
+def _counter_add(counts: Counter, key: str, n: int) -> None:
+    v = counts[key] + n
+    if v > 0:
+        counts[key] = v
+    else:
+        del counts[key]
+
+
+class CohortStatsAccumulator:
+    """
+    Consumes disposition rows one at a time and keeps only running aggregates:
+    outcome counts, raw disposition counts and a time-to-disposition sketch.
+    Feed it from iter_dispositions to compute stats without materializing the cohort.
+    Accumulators for the same cohort built over different pages / partitions /
+    processes can be combined with merge().
+    """
+
+    def __init__(
+        self,
+        *,
+        user_stage_id: str,
+        offense_category: Optional[str],
+        charge_class: Optional[str],
+    ):
+        self.user_stage_id = user_stage_id
+        self.offense_category = offense_category
+        self.charge_class = charge_class
+
+        self._oc_norm = _norm(offense_category) if offense_category else ""
+        self._cls_norm = (charge_class or "").strip()
+
+        self.sample_size = 0
+        self.outcome_counts: Counter = Counter()
+        self.raw_disp_counts: Counter = Counter()
+        self.ttd_sketch = QuantileSketch()
+        self.transitions = StageTransitionMatrix()
+
+    def contribution(self, row: Dict[str, Any]) -> Optional[RowContribution]:
+        """
+        Compact summary of what a row adds to the aggregates (None = not in cohort).
+        Kept by CohortState so a changed row can be retracted before its new version is folded in.
+        """
+        if not _matches_cohort(
+            row,
+            user_stage_id=self.user_stage_id,
+            oc_norm=self._oc_norm,
+            cls_norm=self._cls_norm,
+        ):
+            return None
+
+        return RowContribution(
+            outcome=map_outcome_bucket(row.get("charge_disposition")),
+            raw_label=sys.intern(_norm(row.get("charge_disposition")) or "unknown"),
+            ttd_days=_time_to_disposition_days(row),
+            milestones=StageTransitionMatrix.row_ordinals(row),
+        )
+
+    def apply(self, c: RowContribution, sign: int = 1) -> None:
+        """Fold (sign=1) or retract (sign=-1) one row's contribution."""
+        self.sample_size += sign
+        _counter_add(self.outcome_counts, c.outcome, sign)
+        _counter_add(self.raw_disp_counts, c.raw_label, sign)
+
+        if isinstance(c.ttd_days, int):
+            self.ttd_sketch.add(c.ttd_days, sign)
+
+        self.transitions.add_ordinals(c.milestones, sign)
+
+    def add(self, row: Dict[str, Any]) -> bool:
+        """Fold one row into the aggregates. Returns True if it was in the cohort."""
+        c = self.contribution(row)
+        if c is None:
+            return False
+        self.apply(c)
+        return True
+
+    def add_all(self, rows: Iterable[Dict[str, Any]]) -> "CohortStatsAccumulator":
+        for r in rows:
+            self.add(r)
+        return self
+
+    def merge(self, other: "CohortStatsAccumulator") -> "CohortStatsAccumulator":
+        """Fold another partial aggregate (same cohort) into this one."""
+        self.sample_size += other.sample_size
+        self.outcome_counts.update(other.outcome_counts)
+        self.raw_disp_counts.update(other.raw_disp_counts)
+        self.ttd_sketch.merge(other.ttd_sketch)
+        self.transitions.merge(other.transitions)
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        # ties broken by label so merged partials give the same answer as a single pass
+        top = sorted(self.raw_disp_counts.items(), key=lambda kv: (-kv[1], kv[0]))[:8]
+        top_raw_dispositions = [{"label": label, "count": count} for label, count in top]
+
+        q = _quantiles(self.ttd_sketch)
+
+        return {
+            "cohort_definition": build_cohort_definition(
+                user_stage_id=self.user_stage_id,
+                offense_category=self.offense_category,
+                charge_class=self.charge_class,
+            ),
+            "sample_size": self.sample_size,
+            "outcomes_pct": _percent_dict(self.outcome_counts),
+            "outcomes_counts": dict(self.outcome_counts),
+            "top_raw_dispositions": top_raw_dispositions,
+            "time_to_disposition_days": {
+                "n": self.ttd_sketch.count,
+                **q,
+                "relative_error": self.ttd_sketch.relative_accuracy,
+            },
+            "stage_transitions": self.transitions.result(),
+        }
 
 
 def compute_comparison_stats(
-    rows: List[Dict[str, Any]],
+    rows: Iterable[Dict[str, Any]],
     *,
     user_stage_id: str,
     offense_category: Optional[str],
     charge_class: Optional[str],
 ) -> Dict[str, Any]:
-    cohort = filter_similar_closed_rows(
-        rows,
+    acc = CohortStatsAccumulator(
         user_stage_id=user_stage_id,
         offense_category=offense_category,
         charge_class=charge_class,
     )
-
-    outcome_counts = Counter(map_outcome_bucket(r.get("charge_disposition")) for r in cohort)
-
-    raw_disp_counts = Counter((_norm(r.get("charge_disposition")) or "unknown") for r in cohort)
-    top_raw_dispositions = [{"label": label, "count": count} for label, count in raw_disp_counts.most_common(8)]
-
-    ttd = [_time_to_disposition_days(r) for r in cohort]
-    ttd = [x for x in ttd if isinstance(x, int)]
-    ttd.sort()
-    q = _quantiles(ttd)
-
-    return {
-        "cohort_definition": build_cohort_definition(
-            user_stage_id=user_stage_id,
-            offense_category=offense_category,
-            charge_class=charge_class,
-        ),
-        "sample_size": len(cohort),
-        "outcomes_pct": _percent_dict(outcome_counts),
-        "outcomes_counts": dict(outcome_counts),
-        "top_raw_dispositions": top_raw_dispositions,
-        "time_to_disposition_days": {
-            "n": len(ttd),
-            **q,
-        },
-    }
+    return acc.add_all(rows).result()
 
 
 # -------------------------
@@ -340,62 +836,320 @@ def build_disposition_where_clause(
 # (2)(3)(4) One call for /chat: cached + filtered + safe
 # -------------------------
 
+def cohort_cache_key(
+    user_stage_id: Optional[str],
+    user_offense_category: Optional[str],
+    user_charge_class: Optional[str],
+) -> Tuple[str, str, str]:
+    """Normalized (stage_id, offense_category_lower, charge_class) cohort key."""
+    return (
+        user_stage_id or "",
+        (user_offense_category or "").strip().lower(),
+        (user_charge_class or "").strip(),
+    )
+
+
+# -------------------------
+# Incremental maintenance: keep aggregates, fold in only changed rows
+# -------------------------
+
+# Socrata system fields: :id is stable per row, :updated_at moves on every change
+_SYSTEM_SELECT = ":id, :updated_at, *"
+
+
+def _socrata_ts_literal(ts: str) -> str:
+    # floating timestamp literal for $where (no trailing Z)
+    return _escape_socrata_string(ts.rstrip("Z"))
+
+
+class CohortState:
+    """
+    Live aggregates for one cohort plus what is needed to apply deltas:
+    - watermark: max :updated_at folded in so far
+    - contributions: per-row summaries keyed by :id, so a changed row is retracted
+      before its new version is added (counts, sketches and histograms all support -1)
+    Refresh cost is proportional to rows changed since the watermark, not cohort size.
+
+    Limitation: the delta query carries the cohort $where, so it only returns changed rows that
+    still belong to the cohort. A row edited out of it (charge class, offense category or
+    disposition date changed) or deleted upstream is never re-fetched, and its old
+    contribution stays counted. To bound that drift, refresh() rebuilds the cohort from scratch
+    once the last full build is older than full_rebuild_sec (STATS_FULL_REBUILD_SEC).
+    """
+
+    def __init__(
+        self,
+        *,
+        user_stage_id: str,
+        offense_category: Optional[str],
+        charge_class: Optional[str],
+        full_rebuild_sec: float = STATS_FULL_REBUILD_SEC,
+    ):
+        self.params = {
+            "user_stage_id": user_stage_id,
+            "offense_category": offense_category,
+            "charge_class": charge_class,
+        }
+        self.full_rebuild_sec = full_rebuild_sec
+        self.acc = CohortStatsAccumulator(
+            user_stage_id=user_stage_id,
+            offense_category=offense_category,
+            charge_class=charge_class,
+        )
+        self.where = build_disposition_where_clause(
+            offense_category=offense_category,
+            charge_class=charge_class,
+            require_arraignment_date=True,
+        )
+        self.watermark: Optional[str] = None
+        self.contributions: Dict[str, RowContribution] = {}
+        self.last_delta_rows = 0
+        # time.time() of the last full build
+        self.built_at: Optional[float] = None
+
+    def fold(self, rows: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        for row in rows:
+            n += 1
+            row_id = row.get(":id")
+            updated = row.get(":updated_at")
+            if updated and (self.watermark is None or updated > self.watermark):
+                self.watermark = updated
+
+            old = self.contributions.pop(row_id, None) if row_id else None
+            if old is not None:
+                self.acc.apply(old, -1)
+
+            new = self.acc.contribution(row)
+            if new is not None:
+                self.acc.apply(new)
+                if row_id:
+                    self.contributions[row_id] = new
+        return n
+
+    def build(self, deadline: Optional[Deadline] = None) -> None:
+        """Initial full load of the cohort."""
+        self.fold(
+            iter_dispositions(
+                DispositionQuery(
+                    where=self.where,
+                    limit=STATS_PARALLEL_PAGE_SIZE if STATS_FETCH_WORKERS > 1 else 50000,
+                    timeout_sec=60,
+                    max_workers=STATS_FETCH_WORKERS,
+                    select=_SYSTEM_SELECT,
+                    deadline=deadline,
+                )
+            )
+        )
+        self.built_at = time.time()
+
+    def refresh(self, deadline: Optional[Deadline] = None) -> int:
+        """Fetch + fold only rows added/changed since the watermark (or rebuild, see class doc). Returns rows fetched."""
+        if self.watermark is None:
+            self.build(deadline)
+            self.last_delta_rows = len(self.contributions)
+            return self.last_delta_rows
+
+        if self.built_at is not None and time.time() - self.built_at >= self.full_rebuild_sec:
+            fresh = CohortState(**self.params, full_rebuild_sec=self.full_rebuild_sec)
+            fresh.build(deadline)
+            # swapped in only after the rebuild finished, so a failed one leaves this state intact
+            self.acc, self.watermark, self.contributions, self.built_at = (
+                fresh.acc, fresh.watermark, fresh.contributions, fresh.built_at,
+            )
+            self.last_delta_rows = len(self.contributions)
+            return self.last_delta_rows
+
+        # >= so rows sharing the watermark timestamp aren't missed; re-folding is idempotent
+        where = f"({self.where}) AND :updated_at >= '{_socrata_ts_literal(self.watermark)}'"
+        self.last_delta_rows = self.fold(
+            # ordered by :updated_at so a partial failure never moves the watermark past unseen rows
+            iter_dispositions(
+                DispositionQuery(
+                    where=where,
+                    limit=50000,
+                    timeout_sec=60,
+                    order=":updated_at",
+                    select=_SYSTEM_SELECT,
+                    deadline=deadline,
+                )
+            )
+        )
+        return self.last_delta_rows
+
+    def result(self) -> Dict[str, Any]:
+        out = self.acc.result()
+        out["data_as_of"] = self.watermark
+        return out
+
+
+@dataclass
+class SnapshotEntry:
+    result: Dict[str, Any]
+    state: Optional[CohortState]
+    fetched_at: float
+    ttl_sec: float
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return ((now or time.time()) - self.fetched_at) < self.ttl_sec
+
+
+class DispositionSnapshot:
+    """
+    Shared, TTL'd snapshot of disposition-derived cohort stats.
+    Keyed by cohort_cache_key. Each entry keeps the last result plus the live
+    CohortState, so an expired entry is brought up to date with a delta refresh.
+    A per-key lock makes concurrent readers of a cold/stale cohort
+    (e.g. the /chat hook and the LLM tool) share one fetch instead of racing.
+    """
+
+    def __init__(self, ttl_sec: float = STATS_SNAPSHOT_TTL_SEC, error_ttl_sec: float = STATS_ERROR_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self.error_ttl_sec = error_ttl_sec
+        self._entries: Dict[Tuple[str, str, str], SnapshotEntry] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[SnapshotEntry]:
+        return self._entries.get(key)
+
+    def key_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def put(
+        self,
+        key: Tuple[str, str, str],
+        result: Dict[str, Any],
+        state: Optional[CohortState] = None,
+    ) -> SnapshotEntry:
+        entry = SnapshotEntry(
+            result=result,
+            state=state,
+            fetched_at=time.time(),
+            ttl_sec=self.error_ttl_sec if result.get("skipped") and state is None else self.ttl_sec,
+        )
+        self._entries[key] = entry
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+
+DISPOSITION_SNAPSHOT = DispositionSnapshot()
+
+
+# A cold cohort fetch isn't started with less than this much of the request budget left
+STATS_MIN_BUDGET_SEC = float(os.getenv("STATS_MIN_BUDGET_SEC", "15"))
+# Budget kept back for the LLM call that follows the (optional) stats lookup
+STATS_LLM_RESERVE_SEC = float(os.getenv("STATS_LLM_RESERVE_SEC", "15"))
+
+
+def _budget_skipped(entry: Optional[SnapshotEntry]) -> Dict[str, Any]:
+    # a stale-but-good result beats no stats at all
+    if entry is not None and not entry.result.get("skipped"):
+        return entry.result
+    return {
+        "skipped": True,
+        "reason": "Not enough time left in this request to compute stats.",
+    }
+
+
 def compute_comparison_stats_for_user_context(
     *,
     user_stage_id: str,
     user_offense_category: Optional[str],
     user_charge_class: Optional[str],
+    refresh: bool = False,
+    deadline: Optional[Deadline] = None,
 ) -> Dict[str, Any]:
     """
     Friendly wrapper so your /chat code is tiny.
     - Uses server-side filtering
-    - Caches by cohort key
+    - Caches by cohort key in the shared DISPOSITION_SNAPSHOT; expired entries get a delta refresh
     - Gracefully returns {"skipped": True, ...} on timeout/API issues
+    - refresh=True updates even if fresh (used by the cache warmer): only rows
+      changed since the cohort's watermark are fetched; a failed refresh keeps the
+      previous good result
+    - deadline: stats run on a sub-deadline that keeps STATS_LLM_RESERVE_SEC back for the LLM call.
+      With less than STATS_MIN_BUDGET_SEC of it left nothing is fetched (stale or skipped result
+      instead); lock waits and page timeouts are capped by it. Budget skips are never cached.
     """
-    stage_id = user_stage_id or ""
-    oc_key = (user_offense_category or "").strip().lower()
-    cls_key = (user_charge_class or "").strip()
-    cache_key = (stage_id, oc_key, cls_key)
-
-    if cache_key in _COMPARISON_STATS_CACHE:
-        return _COMPARISON_STATS_CACHE[cache_key]
-
-    # Only compute stats for supported stages
-    if user_stage_id not in SUPPORTED_STAGE_IDS_FOR_STATS:
-        result = {
-            "skipped": True,
-            "reason": "Stats are currently supported only for post-arraignment stages.",
-            "user_stage_id": user_stage_id,
-        }
-        _COMPARISON_STATS_CACHE[cache_key] = result
-        return result
+    cache_key = cohort_cache_key(user_stage_id, user_offense_category, user_charge_class)
+    snapshot = DISPOSITION_SNAPSHOT
 
-    where = build_disposition_where_clause(
-        offense_category=user_offense_category,
-        charge_class=user_charge_class,
-        require_arraignment_date=True,
-    )
+    entry = snapshot.get(cache_key)
+    if entry is not None and entry.is_fresh() and not refresh:
+        return entry.result
+
+    if deadline is not None:
+        # stats are optional; the answer itself must still fit in the request budget
+        deadline = deadline.reserve(STATS_LLM_RESERVE_SEC)
+        if not deadline.has(STATS_MIN_BUDGET_SEC):
+            return _budget_skipped(entry)
+
+    lock = snapshot.key_lock(cache_key)
+    # don't wait on another caller's fetch past our own deadline
+    if not lock.acquire(timeout=deadline.remaining() if deadline is not None else -1):
+        return _budget_skipped(snapshot.get(cache_key))
 
     try:
-        rows = fetch_dispositions(DispositionQuery(where=where, limit=50000, timeout_sec=60))
-        result = compute_comparison_stats(
-            rows,
-            user_stage_id=user_stage_id,
-            offense_category=user_offense_category,
-            charge_class=user_charge_class,
-        )
-    except requests.exceptions.RequestException as e:
-        # (4) graceful fallback – do not crash chat
-        result = {
-            "skipped": True,
-            "reason": f"Dispositions endpoint error: {type(e).__name__}",
-            "hint": "Public data portals sometimes rate-limit or stall. Try again in a moment.",
-        }
-    except Exception as e:
-        result = {
-            "skipped": True,
-            "reason": f"Stats computation failed: {type(e).__name__}",
-        }
+        # another caller may have refreshed this cohort while we waited
+        entry = snapshot.get(cache_key)
+        if entry is not None and entry.is_fresh() and not refresh:
+            return entry.result
+
+        # Only compute stats for supported stages
+        if user_stage_id not in SUPPORTED_STAGE_IDS_FOR_STATS:
+            result = {
+                "skipped": True,
+                "reason": "Stats are currently supported only for post-arraignment stages.",
+                "user_stage_id": user_stage_id,
+            }
+            snapshot.put(cache_key, result)
+            return result
+
+        state = entry.state if entry is not None else None
 
-    _COMPARISON_STATS_CACHE[cache_key] = result
-    return result
+        try:
+            if state is None:
+                # stream rows straight into the aggregates (no all_rows list)
+                new_state = CohortState(
+                    user_stage_id=user_stage_id,
+                    offense_category=user_offense_category,
+                    charge_class=user_charge_class,
+                )
+                new_state.build(deadline)
+                state = new_state
+            else:
+                state.refresh(deadline)
+            result = state.result()
+        except DeadlineExceeded:
+            # this request ran out of time; not the portal's fault, so nothing is cached
+            return _budget_skipped(entry)
+        except requests.exceptions.RequestException as e:
+            # (4) graceful fallback – do not crash chat
+            result = {
+                "skipped": True,
+                "reason": f"Dispositions endpoint error: {type(e).__name__}",
+                "hint": "Public data portals sometimes rate-limit or stall. Try again in a moment.",
+            }
+        except Exception as e:
+            result = {
+                "skipped": True,
+                "reason": f"Stats computation failed: {type(e).__name__}",
+            }
+
+        if result.get("skipped"):
+            if entry is not None and not entry.result.get("skipped"):
+                # keep serving the last good stats; try again after another TTL
+                return snapshot.put(cache_key, entry.result, entry.state).result
+            snapshot.put(cache_key, result)
+            return result
+
+        snapshot.put(cache_key, result, state)
+        return result
+    finally:
+        lock.release()
@@ -0,0 +1,126 @@
+# template_answers.py
+# Deterministic replies for templated intents (no LLM call, no tokens).
+# - timeline:    rendered from the build_timeline payload + the stage card
+# - where_am_i:  rendered from the stage + STAGE_CARDS entry in the context pack
+# Each intent is selectable via env (see fast_path_mode): "template" answers directly,
+# "template+llm" sends the draft to the LLM to refine, "llm" keeps the old behavior.
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+import os
+
+
+FAST_PATH_MODES = ("template", "template+llm", "llm")
+FAST_PATH_DEFAULTS = {
+    "timeline": "template",
+    "where_am_i": "template",
+}
+
+CLOSING_LINE = "That’s everything the record shows at this point."
+
+
+def fast_path_mode(intent: str) -> str:
+    """FAST_PATH_TIMELINE / FAST_PATH_WHERE_AM_I = template | template+llm | llm"""
+    mode = (os.getenv(f"FAST_PATH_{intent.upper()}") or FAST_PATH_DEFAULTS.get(intent, "llm")).strip().lower()
+    return mode if mode in FAST_PATH_MODES else "llm"
+
+
+def _format_day(iso: Optional[str]) -> str:
+    try:
+        d = date.fromisoformat(str(iso)[:10])
+    except (TypeError, ValueError):
+        return str(iso or "")
+    return f"{d.strftime('%b')} {d.day}, {d.year}"
+
+
+def _sentence(text: str) -> str:
+    t = (text or "").strip()
+    if not t:
+        return ""
+    t = t[0].upper() + t[1:]
+    return t if t[-1] in ".!?" else t + "."
+
+
+def _first(items: Any, n: int) -> List[str]:
+    return [str(x) for x in (items or [])[:n]] if isinstance(items, list) else []
+
+
+# -------------------------
+# Timeline
+# -------------------------
+
+def render_timeline_summary(timeline: Dict[str, Any], context_pack: Dict[str, Any]) -> str:
+    nodes = timeline.get("nodes") or []
+    card = context_pack.get("stage_card") or {}
+    stage_label = timeline.get("stage") or (context_pack.get("stage") or {}).get("stage_label") or ""
+
+    if not nodes:
+        return (
+            "Your timeline is empty right now. The public record doesn’t show any dated events for this case yet, "
+            "which usually means those fields weren’t published, not that nothing happened.\n\n"
+            + CLOSING_LINE
+        )
+
+    lines = ["Here’s what your timeline shows, in order:", ""]
+    for n in nodes:
+        lines.append(f"- {_format_day(n.get('date'))}: {n.get('title') or n.get('id')}")
+
+    current = next((n for n in nodes if n.get("id") == timeline.get("now_node_id")), nodes[-1])
+    paragraph = (
+        f"The highlighted step, {current.get('title') or current.get('id')} on {_format_day(current.get('date'))}, "
+        f"is the most recent event in your record"
+    )
+    paragraph += f", which puts you in the {stage_label} stage." if stage_label else "."
+    if card.get("where_you_are"):
+        paragraph += " " + _sentence(card["where_you_are"])
+    lines += ["", paragraph]
+
+    next_steps = _first(card.get("what_usually_happens_next"), 2)
+    if next_steps:
+        lines += [
+            "",
+            "What usually comes after this (general information, not a prediction): "
+            + " ".join(_sentence(s) for s in next_steps),
+        ]
+
+    lines += ["", CLOSING_LINE]
+    return "\n".join(lines)
+
+
+# -------------------------
+# "Where am I"
+# -------------------------
+
+def render_where_am_i(context_pack: Dict[str, Any]) -> str:
+    stage = context_pack.get("stage") or {}
+    card = context_pack.get("stage_card") or {}
+    label = stage.get("stage_label") or card.get("title") or "an unclear stage"
+
+    first = f"Right now, your record shows you’re in the {label} stage."
+    if card.get("where_you_are"):
+        first += " " + _sentence(card["where_you_are"])
+
+    paragraphs = [first]
+
+    means = _first(card.get("what_this_means"), 3)
+    if means:
+        paragraphs.append("In plain terms: " + " ".join(_sentence(s) for s in means))
+
+    next_steps = _first(card.get("what_usually_happens_next"), 3)
+    not_yet = _first(card.get("what_not_yet"), 2)
+    if next_steps or not_yet:
+        p = ""
+        if next_steps:
+            p += "What usually happens next: " + " ".join(_sentence(s) for s in next_steps)
+        if not_yet:
+            p += (" " if p else "") + "What hasn’t happened yet: " + " ".join(_sentence(s) for s in not_yet)
+        paragraphs.append(p)
+
+    if card.get("data_limits"):
+        paragraphs.append(_sentence(card["data_limits"]) + " " + CLOSING_LINE)
+    else:
+        paragraphs.append(CLOSING_LINE)
+
+    return "\n\n".join(paragraphs)
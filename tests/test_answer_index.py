@@ -0,0 +1,84 @@
+import json
+
+import answer_index
+from answer_index import AnswerIndex, get_answer_index
+from precompute_answers import build_store, check_answer
+
+ENTRIES = {
+    "POST_ARRAIGNMENT_PRETRIAL": [
+        {"question": "What is the pretrial phase?", "answer": "A1", "vetted": True},
+        {"question": "What are pretrial conferences?", "answer": "A2", "vetted": True},
+        {"question": "What is discovery?", "answer": "A3", "vetted": True},
+        {"question": "How long does pretrial typically last?", "answer": "A4", "vetted": True},
+        {"question": "What happens during this phase in general?", "answer": "A5", "vetted": False},
+    ]
+}
+
+
+def test_matches_paraphrases_above_threshold_within_stage():
+    index = AnswerIndex(ENTRIES, threshold=0.6)
+    stage = "POST_ARRAIGNMENT_PRETRIAL"
+
+    assert index.match(stage, "what is discovery").answer == "A3"
+    assert index.match(stage, "How long does the pretrial typically last??").answer == "A4"
+    assert index.match(stage, "what are the pretrial conferences").answer == "A2"
+
+    # unrelated / case-specific questions fall back to the LLM
+    assert index.match(stage, "When was my arraignment?") is None
+    assert index.match("PRE_ARRAIGNMENT", "What is discovery?") is None
+    # unvetted answers are never served
+    assert index.match(stage, "What happens during this phase in general?") is None
+    assert len(index) == 4
+
+
+def test_question_must_cover_most_of_the_message():
+    index = AnswerIndex(ENTRIES, threshold=0.6)
+    stage = "POST_ARRAIGNMENT_PRETRIAL"
+
+    # a known question with a case-specific follow-up still scores high, but asks for more
+    assert index.best(stage, "what are pretrial conferences and when is my next one?").score >= 0.6
+    assert index.match(stage, "what are pretrial conferences and when is my next one?") is None
+    assert index.match(stage, "What are pretrial conferences?").answer == "A2"
+
+
+def test_index_reloads_when_store_changes(tmp_path):
+    path = tmp_path / "answers.json"
+    path.write_text(json.dumps({}))
+    assert len(get_answer_index(str(path))) == 0
+
+    path.write_text(json.dumps(ENTRIES))
+    import os
+    os.utime(path, (1, 1))
+    assert len(get_answer_index(str(path))) == 4
+
+
+def test_index_cache_is_keyed_on_path_and_mtime(tmp_path):
+    import os
+
+    empty, full = tmp_path / "empty.json", tmp_path / "full.json"
+    empty.write_text(json.dumps({}))
+    full.write_text(json.dumps(ENTRIES))
+    for p in (empty, full):
+        os.utime(p, (5, 5))
+
+    assert len(get_answer_index(str(empty))) == 0
+    assert len(get_answer_index(str(full))) == 4
+
+
+def test_job_keeps_existing_answers_and_vets_by_checks(monkeypatch):
+    generated = []
+
+    def fake_generate(stage_id, card, question):
+        generated.append(question)
+        return "You should plead guilty." if "long" in question else "Discovery is evidence sharing."
+
+    monkeypatch.setattr("precompute_answers.generate_answer", fake_generate)
+    cards = {"X": {"common_questions": ["What is discovery?", "How long does it last?"]}, "Y": {}}
+    existing = {"X": [{"question": "what is discovery", "answer": "Kept.", "vetted": False}]}
+
+    store = build_store(existing, mark_vetted=True, stage_cards=cards)
+
+    assert generated == ["How long does it last?"]
+    assert [(e["answer"], e["vetted"]) for e in store["X"]] == [("Kept.", True), ("You should plead guilty.", False)]
+    assert "Y" not in store
+    assert check_answer("") == ["empty"]
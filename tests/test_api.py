@@ -0,0 +1,199 @@
+from fastapi.testclient import TestClient
+
+import api
+
+
+def _fake_turn(session_id="s1"):
+    session = api.store.get_or_create(session_id)
+    return api.ChatTurn(
+        session=session,
+        stage_label="Pretrial",
+        ui_cards=[{"type": "stats_card", "payload": {}}],
+        context_pack={"case_summary": {}},
+    )
+
+
+def test_chat_stream_sends_cards_before_tokens_and_stores_reply(monkeypatch):
+    monkeypatch.setattr(api, "prepare_chat_turn", lambda req, timings, deadline: _fake_turn())
+    monkeypatch.setattr(api, "stream_llm_with_context_pack", lambda pack, history, memo, prefetched_tools, intent, deadline: iter(["Hello ", "there."]))
+
+    resp = TestClient(api.app).post("/chat/stream", json={"session_id": "s1", "user_message": "hi"})
+    events = [line.split(": ", 1)[1] for line in resp.text.splitlines() if line.startswith("event: ")]
+
+    assert events == ["meta", "ui_cards", "token", "token", "done"]
+    assert api.store.get_or_create("s1").messages[-1].content == "Hello there."
+
+
+def test_predict_search_query_type():
+    assert api.predict_search_query_type("When was my arraignment?") == "dates"
+    assert api.predict_search_query_type("How much was my bond on those charges") == "bond"
+    assert api.predict_search_query_type("What does pretrial mean?") is None
+
+
+def test_chat_reports_stage_timings_in_server_timing_header(monkeypatch):
+    def fake_prepare(req, timings, deadline):
+        timings["case_fetch"] = 12.0
+        return _fake_turn("s2")
+
+    monkeypatch.setattr(api, "prepare_chat_turn", fake_prepare)
+    monkeypatch.setattr(api, "call_llm_with_context_pack", lambda pack, **kw: "Hi.")
+
+    resp = TestClient(api.app).post("/chat", json={"session_id": "s2", "user_message": "hi"})
+
+    header = resp.headers["Server-Timing"]
+    assert header.startswith("case_fetch;dur=12.0, llm;dur=")
+    assert "total;dur=" in header
+
+
+def test_where_am_i_is_answered_from_template_without_llm(monkeypatch):
+    monkeypatch.setattr(api, "fetch_case_by_id", lambda case_id, deadline=None: {"initiation": {}})
+    monkeypatch.setattr(api, "build_llm_context_pack", lambda case_data: {
+        "stage": {"stage_id": "PRE_ARRAIGNMENT", "stage_label": "Pre-Arraignment"},
+        "stage_card": {"where_you_are": "Arraignment is scheduled."},
+    })
+
+    def no_llm(*a, **kw):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(api, "call_llm_with_context_pack", no_llm)
+
+    resp = TestClient(api.app).post("/chat", json={"case_id": "1", "user_message": "Where is my case right now?"})
+
+    assert resp.status_code == 200
+    assert resp.json()["explanation"].startswith("Right now, your record shows you’re in the Pre-Arraignment stage.")
+
+
+def test_chat_replies_politely_when_llm_runs_out_of_time(monkeypatch):
+    from deadline import DeadlineExceeded
+
+    def out_of_time(pack, **kw):
+        assert kw["deadline"].remaining() > 0
+        raise DeadlineExceeded("0.10s left")
+
+    monkeypatch.setattr(api, "prepare_chat_turn", lambda req, timings, deadline: _fake_turn("s3"))
+    monkeypatch.setattr(api, "call_llm_with_context_pack", out_of_time)
+
+    resp = TestClient(api.app).post("/chat", json={"session_id": "s3", "user_message": "hi"})
+
+    assert resp.status_code == 200
+    assert resp.json()["explanation"] == api.OUT_OF_TIME_REPLY
+
+
+def test_explain_case_serves_pregenerated_explanation(monkeypatch):
+    stored = {"case_id": "42", "explanation": "Stored.", "stage": {"stage_id": "S"}}
+    monkeypatch.setattr(api.EXPLANATION_STORE, "get", lambda case_id: stored if case_id == "42" else None)
+
+    def no_fetch(*a, **kw):
+        raise AssertionError("stored explanations skip the case fetch")
+
+    monkeypatch.setattr(api, "fetch_case_by_id", no_fetch)
+
+    resp = TestClient(api.app).post("/explain-case", json={"case_id": "42"})
+
+    assert resp.json() == {"case_id": "42", "explanation": "Stored.", "stage": {"stage_id": "S"}}
+
+
+def test_follow_up_turns_reuse_the_sessions_case_context(monkeypatch):
+    fetches = []
+
+    def fake_fetch(case_id, deadline=None):
+        fetches.append(case_id)
+        return {"id": case_id}
+
+    monkeypatch.setattr(api, "fetch_case_by_id", fake_fetch)
+    monkeypatch.setattr(api, "build_llm_context_pack", lambda case_data: {"stage": {"stage_id": "S"}})
+    session = api.store.get_or_create("reuse")
+    session.case_id = "1"
+
+    first = api.session_case_context(session, {})
+    first["latest_user_message"] = "turn one"
+    second = api.session_case_context(session, {})
+
+    assert fetches == ["1"]
+    assert "latest_user_message" not in second
+
+    session.case_id = "2"
+    api.session_case_context(session, {})
+    monkeypatch.setattr(api, "CASE_CONTEXT_TTL_SEC", 0)
+    api.session_case_context(session, {})
+
+    assert fetches == ["1", "2", "2"]
+
+
+def test_common_question_is_served_from_answer_index_before_keyword_branches(monkeypatch):
+    from answer_index import AnswerIndex
+
+    index = AnswerIndex({"POST_ARRAIGNMENT_PRETRIAL": [
+        {"question": "What is discovery?", "answer": "Discovery is when both sides exchange evidence.", "vetted": True},
+    ]})
+    monkeypatch.setattr(api, "match_common_question", index.match)
+    monkeypatch.setattr(api, "fetch_case_by_id", lambda case_id, deadline=None: {"initiation": {}})
+    monkeypatch.setattr(api, "build_llm_context_pack", lambda case_data: {
+        "stage": {"stage_id": "POST_ARRAIGNMENT_PRETRIAL", "stage_label": "Pretrial"},
+    })
+
+    def no_llm(*a, **kw):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(api, "call_llm_with_context_pack", no_llm)
+
+    # "discovery" is also a simulator trigger
+    resp = TestClient(api.app).post("/chat", json={"case_id": "1", "user_message": "What is discovery?"})
+
+    assert resp.json()["explanation"] == "Discovery is when both sides exchange evidence."
+    assert resp.json()["ui_cards"] == []
+
+
+def test_mixed_messages_keep_their_cards_instead_of_a_common_answer(monkeypatch):
+    from answer_index import AnswerIndex
+    from main import STAGE_CARDS
+
+    stage_id = "POST_ARRAIGNMENT_PRETRIAL"
+    questions = STAGE_CARDS[stage_id]["common_questions"]
+    index = AnswerIndex({stage_id: [{"question": q, "answer": "CANNED", "vetted": True} for q in questions]})
+    monkeypatch.setattr(api, "match_common_question", index.match)
+    monkeypatch.setattr(api, "fetch_case_by_id", lambda case_id, deadline=None: {"initiation": {}})
+    monkeypatch.setattr(api, "build_llm_context_pack", lambda case_data: {
+        "stage": {"stage_id": stage_id, "stage_label": "Pretrial"},
+        "stage_card": {"where_you_are": "Your case is in pretrial."},
+        "case_summary": {"charge": {"offense_category": "THEFT", "class": "4"}},
+    })
+    stats_calls = []
+
+    def fake_stats(**kw):
+        stats_calls.append(kw)
+        return {"sample_size": 10, "outcomes_pct": {}}
+
+    monkeypatch.setattr(api, "get_outcome_stats", fake_stats)
+    monkeypatch.setattr(api, "call_llm_with_context_pack", lambda pack, **kw: "LLM")
+    client = TestClient(api.app)
+
+    def chat(message):
+        return client.post("/chat", json={"case_id": "1", "user_message": message}).json()
+
+    stats_turn = chat("How long does pretrial typically last in similar cases?")
+    assert stats_turn["explanation"] == "LLM"
+    assert [c["type"] for c in stats_turn["ui_cards"]] == ["stats_card"]
+    assert len(stats_calls) == 1
+
+    timeline_turn = chat("What is discovery? show my timeline")
+    assert [c["type"] for c in timeline_turn["ui_cards"]] == ["timeline_card"]
+
+    assert chat("What are pretrial conferences? what stage am I")["explanation"] != "CANNED"
+    assert chat("what are pretrial conferences and when is my next one?")["explanation"] == "LLM"
+
+    # a plain common question is still served from the index
+    assert chat("How long does pretrial typically last?")["explanation"] == "CANNED"
+
+
+def test_case_fetch_timeout_gets_the_out_of_time_reply(monkeypatch):
+    from deadline import DeadlineExceeded
+
+    def fetch(case_id, deadline=None):
+        raise DeadlineExceeded("0.00s left")
+
+    monkeypatch.setattr(api, "fetch_case_by_id", fetch)
+
+    resp = TestClient(api.app).post("/chat", json={"case_id": "1", "user_message": "hi"})
+
+    assert resp.json()["explanation"] == api.OUT_OF_TIME_REPLY
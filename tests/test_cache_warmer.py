@@ -0,0 +1,64 @@
+import cache_warmer
+from cache_warmer import CohortStatsWarmer
+
+
+def test_targets_put_most_requested_cohorts_first():
+    warmer = CohortStatsWarmer(top_n=2, offense_categories=["Narcotics"])
+
+    warmer.record("POST_ARRAIGNMENT_PRETRIAL", "Burglary", "2")
+    warmer.record("POST_ARRAIGNMENT_PRETRIAL", "Theft", None)
+    warmer.record("POST_ARRAIGNMENT_PRETRIAL", "theft ", None)  # same cohort, different spelling
+
+    targets = warmer.targets()
+
+    assert targets[0] == ("POST_ARRAIGNMENT_PRETRIAL", "Theft", None)
+    assert targets[1] == ("POST_ARRAIGNMENT_PRETRIAL", "Burglary", "2")
+    # static grid: every supported stage x offense category
+    assert ("POST_ARRAIGNMENT_EARLY_PRETRIAL", "Narcotics", None) in targets
+    assert ("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", None) in targets
+    assert len(targets) == 4
+
+
+def test_warm_once_computes_every_target_and_flips_ready(monkeypatch):
+    calls = []
+
+    def fake_compute(**kwargs):
+        calls.append(kwargs)
+        return {"skipped": kwargs["user_offense_category"] == "Theft"}
+
+    monkeypatch.setattr(cache_warmer, "compute_comparison_stats_for_user_context", fake_compute)
+
+    warmer = CohortStatsWarmer(offense_categories=["Narcotics", "Theft"])
+    assert warmer.status()["ready"] is False
+
+    status = warmer.warm_once(refresh=True)
+
+    assert len(calls) == 4
+    assert all(c["refresh"] for c in calls)
+    assert status["ready"] is True
+    assert status["last_warmed"] == 2
+    assert status["last_failed"] == 2
+
+
+def test_cube_mode_only_fetches_cohorts_missing_from_the_cube(monkeypatch):
+    calls = []
+    published = []
+
+    def fake_publish(cube, cells):
+        published.extend(cells)
+        return 1 if cells[0][1] == "narcotics" else 0
+
+    monkeypatch.setattr(cache_warmer, "build_cube_from_portal", lambda: {})
+    monkeypatch.setattr(cache_warmer, "publish_cube", fake_publish)
+    monkeypatch.setattr(
+        cache_warmer,
+        "compute_comparison_stats_for_user_context",
+        lambda **kw: calls.append(kw) or {"sample_size": 1},
+    )
+
+    warmer = CohortStatsWarmer(offense_categories=["Narcotics", "Theft"], use_cube=True)
+    status = warmer.warm_once()
+
+    assert len(published) == 4
+    assert {c["user_offense_category"] for c in calls} == {"Theft"}
+    assert status["last_warmed"] == 4
@@ -0,0 +1,47 @@
+from conversation_summary import ConversationSummarizer
+from memory_store import InMemorySessionStore
+
+
+def _session_with(n):
+    store = InMemorySessionStore()
+    session = store.get_or_create("s1")
+    for i in range(n):
+        store.append(session, "user" if i % 2 == 0 else "assistant", f"message {i}")
+    return session
+
+
+def test_older_turns_are_folded_into_the_digest():
+    seen = []
+
+    def fake_summarize(previous, messages):
+        seen.append((previous, [m["content"] for m in messages]))
+        return "digest of 0-4"
+
+    summarizer = ConversationSummarizer(fake_summarize, recent_messages=4, min_batch=3)
+    session = _session_with(9)  # last one is the current question
+
+    fut = summarizer.maybe_schedule(session)
+    assert summarizer.maybe_schedule(session) is None  # already pending
+    fut.result(timeout=2)
+
+    assert seen == [("", ["message 0", "message 1", "message 2", "message 3", "message 4"])]
+    assert (session.summary, session.summary_upto, session.summary_pending) == ("digest of 0-4", 5, False)
+
+    digest, history = summarizer.prompt_history(session)
+    assert digest == "digest of 0-4"
+    assert [m["content"] for m in history] == ["message 5", "message 6", "message 7"]
+
+
+def test_prompt_history_respects_token_budget_and_failed_refresh_keeps_raw_turns():
+    def failing(previous, messages):
+        raise RuntimeError("llm down")
+
+    summarizer = ConversationSummarizer(failing, recent_messages=2, min_batch=1, token_budget=8)
+    session = _session_with(6)
+    summarizer.maybe_schedule(session).result(timeout=2)
+
+    assert session.summary == "" and session.summary_upto == 0 and not session.summary_pending
+    digest, history = summarizer.prompt_history(session)
+    # "message N" is ~3 tokens, so only the last two fit in 8
+    assert digest == ""
+    assert [m["content"] for m in history] == ["message 3", "message 4"]
@@ -0,0 +1,42 @@
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, call_timeout
+
+
+def test_timeout_is_capped_by_time_left():
+    d = Deadline.after(2.0)
+    assert 1.5 < d.timeout(30) <= 2.0
+    assert d.timeout(0.75) == 0.75
+    assert call_timeout(None, 30) == 30
+
+
+def test_expired_deadline_refuses_new_calls():
+    d = Deadline.after(0.1)
+    assert not d.has(1.0)
+    with pytest.raises(DeadlineExceeded):
+        d.timeout(30)
+    with pytest.raises(DeadlineExceeded):
+        call_timeout(Deadline.after(-1), 30)
+
+
+def test_case_fetch_raises_instead_of_reporting_not_found(monkeypatch):
+    import main
+    import requests
+
+    def timed_out(url, params=None, timeout=None):
+        raise requests.exceptions.ReadTimeout()
+
+    monkeypatch.setattr(main.requests, "get", timed_out)
+
+    # budget already gone: no request is even attempted
+    with pytest.raises(DeadlineExceeded):
+        main.fetch_case_by_id("1", deadline=Deadline.after(0))
+
+    # requests timed out and used up the budget
+    d = Deadline.after(5)
+    monkeypatch.setattr(d, "expired", lambda: True)
+    with pytest.raises(DeadlineExceeded):
+        main.fetch_case_by_id("1", deadline=d)
+
+    # no deadline: still the old "not found"
+    assert main.fetch_case_by_id("1") is None
@@ -0,0 +1,145 @@
+import json
+
+import explanation_batch
+from explanation_batch import ExplanationStore, load_explanations, read_case_ids, run_batch, with_retry
+
+
+def _fake_pipeline(monkeypatch, llm_calls, fail_first_llm=()):
+    monkeypatch.setattr(explanation_batch, "fetch_case_by_id", lambda cid: None if cid == "missing" else {"id": cid})
+    monkeypatch.setattr(explanation_batch, "build_llm_context_pack", lambda data: {"stage": {"stage_id": "S"}, "case_summary": data})
+
+    def fake_llm(pack, **kw):
+        cid = pack["case_summary"]["id"]
+        llm_calls.append(cid)
+        if cid in fail_first_llm and llm_calls.count(cid) == 1:
+            raise RuntimeError("rate limited")
+        return f"explanation for {cid}"
+
+    monkeypatch.setattr(explanation_batch, "call_llm_with_context_pack", fake_llm)
+
+
+def test_read_case_ids_skips_comments_and_duplicates():
+    assert read_case_ids(["123\n", "# partner batch\n", "\n", "456  # new\n", "123\n"]) == ["123", "456"]
+
+
+def test_with_retry_backs_off_then_gives_up():
+    sleeps = []
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError()
+        return "ok"
+
+    assert with_retry(flaky, attempts=3, base_delay=1, sleep=sleeps.append) == "ok"
+    assert sleeps == [1, 2]
+
+
+def test_batch_retries_and_resumes_from_store(monkeypatch, tmp_path):
+    out = str(tmp_path / "explanations.jsonl")
+    calls = []
+    _fake_pipeline(monkeypatch, calls, fail_first_llm={"b"})
+
+    report = run_batch(["a", "b", "missing"], out_path=out, attempts=2, base_delay=0, sleep=lambda s: None)
+
+    assert report["written"] == 2
+    assert list(report["failed"]) == ["missing"]
+    assert sorted(calls) == ["a", "b", "b"]
+    assert load_explanations(out)["b"]["explanation"] == "explanation for b"
+
+    # second run only does what's left
+    calls.clear()
+    report = run_batch(["a", "b", "c"], out_path=out, attempts=2, base_delay=0, sleep=lambda s: None)
+    assert calls == ["c"]
+    assert report["already_done"] == 2
+
+
+def test_interrupted_run_keeps_finished_cases_and_resumes(monkeypatch, tmp_path):
+    import time
+    import pytest
+
+    out = tmp_path / "explanations.jsonl"
+    calls = []
+    _fake_pipeline(monkeypatch, calls)
+
+    def fetch(cid):
+        if cid == "d":
+            # the run dies while later cases are still being fetched, after a and b were explained
+            stop = time.time() + 2
+            while time.time() < stop and len(load_explanations(str(out))) < 2:
+                time.sleep(0.01)
+            raise KeyboardInterrupt()
+        return {"id": cid}
+
+    monkeypatch.setattr(explanation_batch, "fetch_case_by_id", fetch)
+
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(["a", "b", "c", "d", "e"], out_path=str(out), fetch_workers=1, llm_workers=1,
+                  attempts=1, base_delay=0, sleep=lambda s: None)
+
+    finished = set(load_explanations(str(out)))
+    assert {"a", "b"} <= finished
+
+    monkeypatch.setattr(explanation_batch, "fetch_case_by_id", lambda cid: {"id": cid})
+    calls.clear()
+    report = run_batch(["a", "b", "c", "d", "e"], out_path=str(out), attempts=1, base_delay=0, sleep=lambda s: None)
+
+    assert sorted(calls) == sorted({"a", "b", "c", "d", "e"} - finished)
+    assert report["already_done"] == len(finished)
+    assert set(load_explanations(str(out))) == {"a", "b", "c", "d", "e"}
+
+
+def test_store_ignores_partial_lines_and_stale_entries(tmp_path):
+    path = tmp_path / "explanations.jsonl"
+    old = {"case_id": "old", "explanation": "x", "generated_ts": 0}
+    new = {"case_id": "new", "explanation": "y", "generated_ts": 9e12}
+    path.write_text(json.dumps(old) + "\n" + json.dumps(new) + "\n" + '{"case_id": "cut', encoding="utf-8")
+
+    store = ExplanationStore(str(path), max_age_sec=3600)
+
+    assert store.get("new")["explanation"] == "y"
+    assert store.get("old") is None
+    assert store.get("cut") is None
+
+
+def test_fetches_stop_running_ahead_of_a_slow_llm(monkeypatch, tmp_path):
+    import threading
+    import time
+
+    calls = []
+    _fake_pipeline(monkeypatch, calls)
+    fetched = []
+    monkeypatch.setattr(explanation_batch, "fetch_case_by_id", lambda cid: fetched.append(cid) or {"id": cid})
+    release = threading.Event()
+    monkeypatch.setattr(explanation_batch, "call_llm_with_context_pack", lambda pack, **kw: release.wait(5) and "x")
+
+    ids = [str(i) for i in range(30)]
+    runner = threading.Thread(target=run_batch, args=(ids,), kwargs=dict(
+        out_path=str(tmp_path / "explanations.jsonl"), fetch_workers=1, llm_workers=1,
+        attempts=1, base_delay=0, sleep=lambda s: None,
+    ))
+    runner.start()
+    time.sleep(0.3)
+    # LLM stuck: packs in flight stay bounded by 2 * (llm_workers + fetch_workers)
+    assert len(fetched) <= 4
+    release.set()
+    runner.join(5)
+    assert len(load_explanations(str(tmp_path / "explanations.jsonl"))) == 30
+
+
+def test_stale_entries_are_regenerated(monkeypatch, tmp_path):
+    import time
+
+    path = tmp_path / "explanations.jsonl"
+    stale = {"case_id": "a", "explanation": "old", "generated_ts": 0}
+    fresh = {"case_id": "b", "explanation": "new", "generated_ts": time.time()}
+    path.write_text(json.dumps(stale) + "\n" + json.dumps(fresh) + "\n", encoding="utf-8")
+    calls = []
+    _fake_pipeline(monkeypatch, calls)
+
+    report = run_batch(["a", "b"], out_path=str(path), max_age_sec=3600, attempts=1, base_delay=0, sleep=lambda s: None)
+
+    assert calls == ["a"]
+    assert report["already_done"] == 1
+    assert load_explanations(str(path))["a"]["explanation"] == "explanation for a"
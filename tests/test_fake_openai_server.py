@@ -0,0 +1,83 @@
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+import fake_openai_server
+from load_harness import parse_server_timing, percentile
+
+
+def _client():
+    return OpenAI(api_key="fake", base_url="http://testserver/v1", http_client=TestClient(fake_openai_server.app))
+
+
+def _no_latency(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY_DIST", "fixed")
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_TTFT_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_TOKEN_MS", "0")
+
+
+def test_fake_server_tool_call_then_answer(monkeypatch):
+    _no_latency(monkeypatch)
+    monkeypatch.setenv("FAKE_LLM_TOOL_CALL_RATE", "1")
+    client = _client()
+    tools = [{"type": "function", "function": {"name": "search_case_record", "parameters": {"type": "object"}}}]
+
+    first = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "when?"}], tools=tools)
+    call = first.choices[0].message.tool_calls[0]
+    assert call.function.name == "search_case_record"
+    assert first.usage.prompt_tokens > 0
+
+    second = client.chat.completions.create(
+        model="m",
+        messages=[
+            {"role": "user", "content": "when?"},
+            {"role": "assistant", "content": None, "tool_calls": [call.model_dump()]},
+            {"role": "tool", "tool_call_id": call.id, "content": "{}"},
+        ],
+        tools=tools,
+    )
+    assert second.choices[0].message.content == fake_openai_server.FAKE_REPLY
+
+
+def test_fake_server_streams_with_usage_and_injects_failures(monkeypatch):
+    _no_latency(monkeypatch)
+    client = _client()
+
+    chunks = list(client.chat.completions.create(
+        model="m",
+        messages=[{"role": "user", "content": "hi"}],
+        stream=True,
+        stream_options={"include_usage": True},
+    ))
+    text = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert text == fake_openai_server.FAKE_REPLY
+    assert chunks[-1].usage.completion_tokens > 0
+
+    monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "1")
+    monkeypatch.setenv("FAKE_LLM_FAILURE_STATUS", "429")
+    resp = TestClient(fake_openai_server.app).post("/v1/chat/completions", json={"messages": []})
+    assert resp.status_code == 429
+
+
+def test_fake_server_streaming_delays_follow_the_latency_distribution(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_TTFT_MS", "300")
+    monkeypatch.setenv("FAKE_LLM_TOKEN_MS", "15")
+    medians = []
+
+    def fake_sample(median_ms=None):
+        medians.append(median_ms)
+        return 0.0
+
+    monkeypatch.setattr(fake_openai_server, "sample_latency_sec", fake_sample)
+
+    list(_client().chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}], stream=True))
+
+    words = len(fake_openai_server.FAKE_REPLY.split(" "))
+    assert medians == [300.0] + [15.0] * (words - 1)
+
+
+def test_harness_parses_server_timing_and_percentiles():
+    assert parse_server_timing("case_fetch;dur=12.5, llm;dur=800.0, bogus") == {"case_fetch": 12.5, "llm": 800.0}
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([], 50) is None
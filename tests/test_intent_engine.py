@@ -0,0 +1,50 @@
+import json
+
+from intent_engine import DEFAULT_RULES, SEARCH_PREFIX, IntentEngine, IntentRule, load_rules
+
+
+def test_one_scan_returns_all_intents_by_priority():
+    engine = IntentEngine(DEFAULT_RULES)
+
+    match = engine.classify("Show my court dates and stats for cases like mine")
+
+    # "court dates" also contains the search slice phrase "dates"
+    assert match.intents == ["timeline", "stats", SEARCH_PREFIX + "dates"]
+    assert match.primary == "timeline"
+    assert engine.classify("What was my bond and when was it set?").first(SEARCH_PREFIX) == "bond"
+    assert engine.classify("hello").intents == []
+
+
+def test_overlapping_and_prefix_phrases_match_like_substrings():
+    engine = IntentEngine([
+        IntentRule("a", 2, ["motion"]),
+        IntentRule("b", 1, ["motion to dismiss", "to dis"]),
+    ])
+
+    assert engine.classify("MOTION TO DISMISS?").intents == ["a", "b"]
+    assert engine.classify("motionless").intents == ["a"]
+
+
+def test_matched_phrases_are_reported_per_intent():
+    engine = IntentEngine(DEFAULT_RULES)
+
+    match = engine.classify("What is discovery?")
+    assert match.phrases["simulator"] == {"discovery"}
+    assert match.triggered_only_by("simulator", ["Discovery"])
+
+    both = engine.classify("What is discovery and what comes next?")
+    assert not both.triggered_only_by("simulator", ["discovery"])
+    assert not engine.classify("hello").triggered_only_by("simulator", ["discovery"])
+
+
+def test_rules_file_extends_defaults(tmp_path):
+    path = tmp_path / "intents.json"
+    path.write_text(json.dumps({
+        "timeline": {"phrases": ["docket"]},
+        "refund": {"priority": 200, "phrases": ["bond refund"]},
+    }), encoding="utf-8")
+
+    engine = IntentEngine(load_rules(str(path)))
+
+    assert engine.classify("show my docket").has("timeline")
+    assert engine.classify("how do I get a bond refund").intents[:2] == ["refund", SEARCH_PREFIX + "bond"]
@@ -0,0 +1,47 @@
+import time
+
+import llm_client_openai
+from llm_cache import LLMResponseCache, response_cache_key
+
+
+def test_cache_key_ignores_key_order_and_message_noise():
+    pack = {"case_summary": {"case_id": "1"}, "latest_user_message": "What does this MEAN?"}
+    same = {"latest_user_message": "  what does this mean ", "case_summary": {"case_id": "1"}}
+    assert response_cache_key(pack, []) == response_cache_key(same, [])
+
+    assert response_cache_key(pack, []) != response_cache_key({**pack, "case_summary": {"case_id": "2"}}, [])
+    assert response_cache_key(pack, []) != response_cache_key(pack, [{"role": "user", "content": "hi"}])
+
+
+def test_cache_evicts_lru_and_expired_entries(monkeypatch):
+    cache = LLMResponseCache(max_entries=2, ttl_sec=10)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+
+    now = time.time()
+    monkeypatch.setattr("llm_cache.time.time", lambda: now + 11)
+    assert cache.get("a") is None
+
+
+def test_call_and_stream_share_the_cache(monkeypatch):
+    monkeypatch.setattr(llm_client_openai, "RESPONSE_CACHE", LLMResponseCache())
+    calls = []
+
+    def fake_complete(pack, history, memo, prefetched_tools=None, rec=None, deadline=None, offer_tools=True):
+        calls.append(pack)
+        return "Arraignment is your first court date."
+
+    monkeypatch.setattr(llm_client_openai, "_complete", fake_complete)
+    pack = {"case_summary": {}, "latest_user_message": "What is arraignment?"}
+
+    first = llm_client_openai.call_llm_with_context_pack(pack, history=[])
+    assert llm_client_openai.call_llm_with_context_pack(dict(pack), history=[]) == first
+    assert list(llm_client_openai.stream_llm_with_context_pack(pack, history=[])) == [first]
+    assert len(calls) == 1
+
+    llm_client_openai.call_llm_with_context_pack(pack, history=[], use_cache=False)
+    assert len(calls) == 2
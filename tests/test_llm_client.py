@@ -0,0 +1,264 @@
+import llm_client_openai
+from llm_client_openai import get_async_client, get_client
+
+
+def test_client_is_reused_until_key_or_base_url_changes(monkeypatch):
+    monkeypatch.setattr(llm_client_openai, "_client", None)
+    monkeypatch.setattr(llm_client_openai, "_async_client", None)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-1")
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+
+    first = get_client()
+    assert get_client() is first
+    assert get_async_client() is get_async_client()
+
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9999/v1")
+    second = get_client()
+    assert second is not first
+    assert str(second.base_url).startswith("http://127.0.0.1:9999/v1")
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-2")
+    assert get_client() is not second
+
+
+def _chunk(content=None, tool_calls=None):
+    from types import SimpleNamespace as NS
+    return NS(choices=[NS(delta=NS(content=content, tool_calls=tool_calls))])
+
+
+def _tool_delta(index, id=None, name=None, arguments=None):
+    from types import SimpleNamespace as NS
+    return NS(index=index, id=id, function=NS(name=name, arguments=arguments))
+
+
+class _FakeCompletions:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return iter(self.streams.pop(0))
+
+
+def test_stream_assembles_tool_calls_and_streams_second_completion(monkeypatch):
+    from types import SimpleNamespace as NS
+    from llm_client_openai import stream_llm_with_context_pack
+
+    completions = _FakeCompletions([
+        [
+            _chunk(tool_calls=[_tool_delta(0, id="call_1", name="search_case_record", arguments='{"query_')]),
+            _chunk(tool_calls=[_tool_delta(0, arguments='type": "dates"}')]),
+        ],
+        [_chunk("Your "), _chunk("arraignment "), _chunk("was in 2023.")],
+    ])
+    monkeypatch.setattr(llm_client_openai, "get_client", lambda: NS(chat=NS(completions=completions)))
+    monkeypatch.setattr(llm_client_openai, "run_tool", lambda name, parsed, pack, memo, deadline=None: {"tool": name, **parsed})
+
+    out = list(stream_llm_with_context_pack({"case_summary": {}}, history=[]))
+
+    assert out == ["Your ", "arraignment ", "was in 2023."]
+    second = completions.requests[1]["messages"]
+    assert second[-2]["tool_calls"][0]["function"]["arguments"] == '{"query_type": "dates"}'
+    assert second[-1] == {
+        "role": "tool",
+        "tool_call_id": "call_1",
+        "content": '{"tool": "search_case_record", "query_type": "dates"}',
+    }
+
+
+def test_prefetched_tools_stay_offered_and_avoided_call_is_counted(monkeypatch):
+    from types import SimpleNamespace as NS
+    from llm_client_openai import call_llm_with_context_pack, prefetch_metrics
+
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        return NS(choices=[NS(message=NS(content="Your bond was $5,000.", tool_calls=None))])
+
+    monkeypatch.setattr(llm_client_openai, "get_client", lambda: NS(chat=NS(completions=NS(create=create))))
+    before = prefetch_metrics()
+
+    pack = {"case_summary": {}, "prefetched_tools": {"search_case_record": {"matches": []}}}
+    out = call_llm_with_context_pack(pack, history=[], use_cache=False, prefetched_tools=["search_case_record"])
+
+    assert out == "Your bond was $5,000."
+    # still offered, so the model can refine a search the prediction got wrong
+    assert [t["function"]["name"] for t in requests[0]["tools"]] == ["search_case_record", "get_outcome_stats"]
+    after = prefetch_metrics()
+    assert after["second_call_avoided"] == before["second_call_avoided"] + 1
+    assert after["second_call_needed"] == before["second_call_needed"]
+
+    call_llm_with_context_pack(pack, history=[], use_cache=False, offer_tools=False)
+    assert "tools" not in requests[1]
+
+
+def test_stats_turn_with_inlined_stats_takes_one_completion(monkeypatch):
+    from types import SimpleNamespace as NS
+    from llm_client_openai import call_llm_with_context_pack, prefetch_metrics
+
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        system = kwargs["messages"][0]["content"]
+        # a model that follows the prompt: the stats mandate is lifted once comparison_stats is inlined
+        assert "call get_outcome_stats unless comparison_stats is already present" in system
+        return NS(choices=[NS(message=NS(content="Most similar cases were dismissed.", tool_calls=None))])
+
+    monkeypatch.setattr(llm_client_openai, "get_client", lambda: NS(chat=NS(completions=NS(create=create))))
+    before = prefetch_metrics()
+
+    pack = {"case_summary": {}, "comparison_stats": {"sample_size": 40, "outcomes_pct": {"dismissed": 60.0}}}
+    out = call_llm_with_context_pack(pack, history=[], use_cache=False, prefetched_tools=["get_outcome_stats"], intent="stats")
+
+    assert out == "Most similar cases were dismissed."
+    assert len(requests) == 1
+    assert prefetch_metrics()["second_call_avoided"] == before["second_call_avoided"] + 1
+
+
+def test_tool_calls_run_concurrently_in_order_with_timeouts(monkeypatch):
+    import threading
+    import time
+
+    barrier = threading.Barrier(2, timeout=2)
+
+    def fake_run_tool(name, parsed, pack, memo, deadline=None):
+        if name == "slow_tool":
+            time.sleep(0.5)
+            return {"late": True}
+        barrier.wait()  # only passes if both calls are in flight at once
+        return {"tool": name, **parsed}
+
+    monkeypatch.setattr(llm_client_openai, "run_tool", fake_run_tool)
+    monkeypatch.setitem(llm_client_openai.TOOL_TIMEOUTS_SEC, "slow_tool", 0.05)
+
+    out = llm_client_openai._run_tool_calls(
+        [
+            ("c1", "get_outcome_stats", '{"stage_id": "x"}'),
+            ("c2", "slow_tool", "{}"),
+            ("c3", "search_case_record", '{"query_type": "dates"}'),
+        ],
+        {},
+        None,
+    )
+
+    assert [m["tool_call_id"] for m in out] == ["c1", "c2", "c3"]
+    assert out[0]["content"] == '{"tool": "get_outcome_stats", "stage_id": "x"}'
+    assert '"skipped": true' in out[1]["content"]
+    assert out[2]["content"] == '{"tool": "search_case_record", "query_type": "dates"}'
+
+
+def test_tool_timeout_counts_from_start_and_queued_calls_are_cancelled(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(llm_client_openai, "_tool_pool", pool)
+    monkeypatch.setitem(llm_client_openai.TOOL_TIMEOUTS_SEC, "lookup", 0.5)
+    ran = []
+
+    def fake_run_tool(name, parsed, pack, memo, deadline=None):
+        ran.append(name)
+        time.sleep(0.3)
+        return {"ok": True}
+
+    monkeypatch.setattr(llm_client_openai, "run_tool", fake_run_tool)
+
+    # another request holds the only worker for 0.3s: 0.3 queued + 0.3 running is past 0.5 from
+    # dispatch, but within 0.5 of the tool starting
+    pool.submit(time.sleep, 0.3)
+    out = llm_client_openai._run_tool_calls([("c1", "lookup", "{}")], {}, None)
+    assert out[0]["content"] == '{"ok": true}'
+
+    # worker busy for longer than the timeout: the call is dropped, not run later
+    release = threading.Event()
+    pool.submit(release.wait, 5)
+    out = llm_client_openai._run_tool_calls([("c2", "lookup", "{}")], {}, None)
+    release.set()
+    pool.shutdown(wait=True)
+    assert "did not start" in out[0]["content"]
+    assert ran == ["lookup"]
+
+
+def test_model_initiated_stats_call_carries_the_request_deadline(monkeypatch):
+    import pytest
+    import tools
+    from deadline import Deadline, DeadlineExceeded
+    from tool_memo import ToolMemo
+
+    seen = []
+    monkeypatch.setattr(tools, "get_outcome_stats", lambda **kw: seen.append(kw["deadline"]) or {"sample_size": 1})
+    deadline = Deadline.after(30)
+
+    out = llm_client_openai._run_tool_calls(
+        [("c1", "get_outcome_stats", '{"stage_id": "S"}')], {}, ToolMemo(), deadline
+    )
+
+    assert out[0]["content"] == '{"sample_size": 1}'
+    assert seen == [deadline]
+
+    # nothing is dispatched once the budget is gone
+    with pytest.raises(DeadlineExceeded):
+        llm_client_openai._run_tool_calls(
+            [("c2", "get_outcome_stats", '{"stage_id": "T"}')], {}, ToolMemo(), Deadline.after(0)
+        )
+    assert len(seen) == 1
+
+
+def test_completions_under_a_deadline_are_not_retried_by_the_sdk(monkeypatch):
+    from types import SimpleNamespace as NS
+    from deadline import Deadline
+
+    options = []
+    shared = NS(with_options=lambda **kw: options.append(kw) or "no-retry client")
+    monkeypatch.setattr(llm_client_openai, "get_client", lambda: shared)
+
+    assert llm_client_openai._client_for(None) is shared
+    assert llm_client_openai._client_for(Deadline.after(30)) == "no-retry client"
+    assert options == [{"max_retries": 0}]
+
+
+def test_prompt_prefix_is_stable_across_turns():
+    from llm_client_openai import _build_messages
+
+    case = {"stage": {"stage_id": "POST_ARRAIGNMENT_PRETRIAL"}, "case_summary": {"case_id": "1", "charge": {"class": "4"}}}
+    turn1 = _build_messages({**case, "latest_user_message": "What is pretrial?"}, [])
+    # same case context built in a different key order, plus per-turn stats
+    reordered = {"case_summary": case["case_summary"], "stage": case["stage"]}
+    turn2 = _build_messages(
+        {**reordered, "comparison_stats": {"sample_size": 3}, "latest_user_message": "How do similar cases go?"},
+        [{"role": "user", "content": "What is pretrial?"}, {"role": "assistant", "content": "It is..."}],
+    )
+
+    assert turn2[:2] == turn1[:2]
+    assert turn2[2:4] == [{"role": "user", "content": "What is pretrial?"}, {"role": "assistant", "content": "It is..."}]
+    assert "comparison_stats" not in turn2[1]["content"]
+    assert "comparison_stats" in turn2[-1]["content"]
+    assert turn2[-1]["content"].index("TURN_CONTEXT_JSON") < turn2[-1]["content"].index("How do similar cases go?")
+
+
+def test_cached_tokens_are_logged(caplog):
+    import logging
+    from types import SimpleNamespace as NS
+
+    usage = NS(prompt_tokens=2000, completion_tokens=50, prompt_tokens_details=NS(cached_tokens=1536))
+    with caplog.at_level(logging.INFO, logger="llm_client_openai"):
+        llm_client_openai._log_usage(usage, "first")
+
+    assert "cached_tokens=1536" in caplog.text
+    assert "cached_pct=77" in caplog.text
+
+
+def test_conversation_summary_sits_between_case_context_and_history():
+    from llm_client_openai import _build_messages
+
+    msgs = _build_messages(
+        {"case_summary": {}, "conversation_summary": "User asked about bond.", "latest_user_message": "And now?"},
+        [{"role": "user", "content": "hi"}],
+    )
+    assert msgs[2]["content"].startswith("EARLIER_CONVERSATION_SUMMARY:\nUser asked about bond.")
+    assert msgs[3] == {"role": "user", "content": "hi"}
+    assert "conversation_summary" not in msgs[1]["content"]
@@ -0,0 +1,63 @@
+from types import SimpleNamespace as NS
+
+import llm_client_openai
+from llm_telemetry import LLMCallRecord, LLMTelemetry, TELEMETRY
+
+
+def test_snapshot_aggregates_per_intent_with_histograms():
+    t = LLMTelemetry()
+    t.record(LLMCallRecord(intent="stats", completions=2, tools=["get_outcome_stats"], prompt_tokens=1800,
+                           latency_ms=2400.0, prefetched_tools=["search_case_record"]))
+    t.record(LLMCallRecord(intent="stats", completions=1, prompt_tokens=900, latency_ms=700.0,
+                           prefetched_tools=["get_outcome_stats"]))
+    t.record(LLMCallRecord(intent="plain", cache_hit=True, latency_ms=0.2))
+
+    snap = t.snapshot()
+    stats = snap["by_intent"]["stats"]
+    assert stats["calls"] == 2
+    assert stats["completions"] == {"2": 1, "1": 1}
+    assert stats["tools"] == {"get_outcome_stats": 1}
+    latency = stats["histograms"]["latency_ms"]
+    assert [b["count"] for b in latency["buckets"] if b["count"]] == [1, 1]
+    assert latency["n"] == 2
+
+    plain = snap["by_intent"]["plain"]
+    assert plain["cache_hits"] == 1
+    assert plain["histograms"]["prompt_tokens"]["n"] == 0  # no completion ran
+
+    assert snap["tool_prefetch"] == {
+        "prefetched_turns": 2, "second_call_avoided": 1, "second_call_needed": 1, "avoided_rate": 0.5,
+    }
+
+
+def test_stream_call_records_ttft_tokens_and_tools(monkeypatch):
+    def chunk(content=None, usage=None):
+        choices = [NS(delta=NS(content=content, tool_calls=None))] if content else []
+        return NS(choices=choices, usage=usage)
+
+    usage = NS(prompt_tokens=1200, completion_tokens=40, prompt_tokens_details=NS(cached_tokens=1024))
+    create = lambda **kw: iter([chunk("Hi "), chunk("there."), chunk(usage=usage)])
+    monkeypatch.setattr(llm_client_openai, "get_client", lambda: NS(chat=NS(completions=NS(create=create))))
+    TELEMETRY.reset()
+
+    out = list(llm_client_openai.stream_llm_with_context_pack({"case_summary": {}}, [], use_cache=False, intent="timeline"))
+
+    assert out == ["Hi ", "there."]
+    rec = TELEMETRY.snapshot()["recent"][-1]
+    assert rec["intent"] == "timeline" and rec["streamed"] and rec["completions"] == 1
+    assert (rec["prompt_tokens"], rec["cached_tokens"], rec["completion_tokens"]) == (1200, 1024, 40)
+    assert rec["ttft_ms"] is not None and rec["latency_ms"] >= rec["ttft_ms"]
+
+
+def test_non_llm_turns_are_counted_outside_the_latency_histograms():
+    t = LLMTelemetry()
+    t.record(LLMCallRecord(intent="where_am_i", completions=1, latency_ms=900.0))
+    t.record_non_llm("where_am_i")
+    t.record_non_llm("where_am_i")
+    t.record_non_llm("simulator")
+
+    snap = t.snapshot()
+    assert snap["non_llm_turns"] == {"simulator": 1, "where_am_i": 2}
+    assert snap["by_intent"]["where_am_i"]["histograms"]["latency_ms"]["n"] == 1
+    assert snap["by_intent"]["where_am_i"]["histograms"]["latency_ms"]["p50"] >= 850
+    assert "simulator" not in snap["by_intent"]
@@ -0,0 +1,48 @@
+import random
+
+from quantile_sketch import QuantileSketch
+
+
+def _exact(sorted_vals, q):
+    return sorted_vals[int(round(q * (len(sorted_vals) - 1)))]
+
+
+def test_quantiles_within_relative_error():
+    rng = random.Random(7)
+    vals = [int(rng.lognormvariate(5, 1)) for _ in range(5000)]
+    sk = QuantileSketch(relative_accuracy=0.01).add_all(vals)
+    vals.sort()
+
+    for q in (0.01, 0.25, 0.5, 0.75, 0.9, 0.99):
+        exact = _exact(vals, q)
+        assert abs(sk.quantile(q) - exact) <= 0.01 * exact
+
+
+def test_merge_equals_single_sketch():
+    vals = list(range(0, 2000, 3))
+    whole = QuantileSketch().add_all(vals)
+
+    parts = [QuantileSketch().add_all(vals[i::4]) for i in range(4)]
+    merged = parts[0]
+    for p in parts[1:]:
+        merged.merge(p)
+
+    assert merged.count == whole.count
+    assert merged.bins == whole.bins
+    assert merged.zero_count == whole.zero_count
+    assert merged.quantile(0.5) == whole.quantile(0.5)
+
+
+def test_retraction_and_roundtrip():
+    sk = QuantileSketch().add_all([0, 10, 20, 30])
+    sk.add(30, count=-1)
+
+    restored = QuantileSketch.from_dict(sk.to_dict())
+
+    assert restored.count == 3
+    assert restored.quantile(0.0) == 0.0
+    assert abs(restored.quantile(1.0) - 20) <= 0.2
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert QuantileSketch().quantile(0.5) is None
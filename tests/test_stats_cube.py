@@ -0,0 +1,91 @@
+import threading
+
+import stats_cube
+from stats_cube import build_cohort_cube, partition_rows
+from stats_service import compute_comparison_stats
+
+
+ROWS = [
+    {
+        "offense_category": "Narcotics" if i % 3 else "Retail Theft",
+        "updated_offense_category": "Narcotics" if i % 3 else "Theft",
+        "disposition_charged_class": "4" if i % 2 else "3",
+        "charge_disposition": ["Plea Of Guilty", "Nolle Prosequi", "Finding Not Guilty"][i % 3],
+        "arraignment_date": f"{2015 + i % 5}-01-01T00:00:00.000",
+        "disposition_date": f"{2015 + i % 5}-{1 + i % 12:02d}-15T00:00:00.000",
+    }
+    for i in range(120)
+]
+
+
+def test_partition_by_disposition_year_streams_bounded_chunks():
+    consumed = []
+
+    def rows():
+        for r in ROWS:
+            consumed.append(r)
+            yield r
+
+    chunks = partition_rows(rows(), by="disposition_year", chunk_rows=10)
+    key, first = next(chunks)
+
+    # the first full chunk comes out before the whole input has been read
+    assert len(first) == 10 and len(consumed) < len(ROWS)
+
+    rest = list(chunks)
+    assert sorted({k for k, _ in [(key, first), *rest]}) == ["2015", "2016", "2017", "2018", "2019"]
+    assert all(len(c) <= 10 for _, c in rest)
+    assert len(first) + sum(len(c) for _, c in rest) == len(ROWS)
+
+
+def test_process_pool_cube_matches_direct_cohort_stats():
+    cube = build_cohort_cube(ROWS, partition_by="disposition_year", max_workers=2, chunk_rows=7)
+
+    # cells are keyed lowercase, but results carry the portal's spelling, like a live compute
+    for stage_id, oc, cls in [
+        ("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", "4"),
+        ("POST_ARRAIGNMENT_PRETRIAL", "Theft", ""),
+        ("POST_ARRAIGNMENT_EARLY_PRETRIAL", "", ""),
+    ]:
+        direct = compute_comparison_stats(
+            ROWS,
+            user_stage_id=stage_id,
+            offense_category=oc or None,
+            charge_class=cls or None,
+        )
+        assert cube[(stage_id, oc.lower(), cls)].result() == direct
+
+
+def test_publish_cube_waits_for_the_cohort_key_lock(monkeypatch):
+    from stats_service import DispositionSnapshot, cohort_cache_key
+
+    snapshot = DispositionSnapshot()
+    monkeypatch.setattr(stats_cube, "DISPOSITION_SNAPSHOT", snapshot)
+    cube = build_cohort_cube(ROWS, max_workers=1)
+    key = cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", "4")
+
+    lock = snapshot.key_lock(key)
+    lock.acquire()
+    t = threading.Thread(target=stats_cube.publish_cube, args=(cube, [key]))
+    t.start()
+    t.join(0.1)
+    assert snapshot.get(key) is None  # blocked behind the "refresh" holding the lock
+
+    lock.release()
+    t.join(2)
+    assert snapshot.get(key).result["cohort_definition"]["offense_category"] == "Narcotics"
+
+
+def test_publish_cube_keeps_the_cohorts_delta_state(monkeypatch):
+    from stats_service import CohortState, DispositionSnapshot, cohort_cache_key
+
+    snapshot = DispositionSnapshot()
+    monkeypatch.setattr(stats_cube, "DISPOSITION_SNAPSHOT", snapshot)
+    key = cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", "4")
+    state = CohortState(user_stage_id=key[0], offense_category="Narcotics", charge_class="4")
+    snapshot.put(key, {"sample_size": 0}, state)
+
+    stats_cube.publish_cube(build_cohort_cube(ROWS, max_workers=1), [key])
+
+    assert snapshot.get(key).state is state
+    assert snapshot.get(key).result["sample_size"] > 0
@@ -39,3 +39,364 @@ def test_compute_comparison_stats_empty_input():
 
     assert stats["sample_size"] == 0
     assert stats["outcomes_pct"] == {}
+
+
+class _FakeStreamResponse:
+    encoding = "utf-8"
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self._body = body
+        self._chunk_size = chunk_size
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self._body), self._chunk_size):
+            yield self._body[i:i + self._chunk_size]
+
+
+def test_iter_json_array_decodes_across_chunk_boundaries():
+    import json
+    from stats_service import _iter_json_array
+
+    rows = [{"charge_disposition": "Nolle Prosequi", "n": i, "note": "café"} for i in range(25)]
+    body = json.dumps(rows).encode("utf-8")
+
+    decoded = list(_iter_json_array(_FakeStreamResponse(body, chunk_size=7)))
+
+    assert decoded == rows
+
+
+def test_iter_json_array_rejects_truncated_body():
+    import json
+    import pytest
+    from stats_service import _iter_json_array
+
+    body = json.dumps([{"n": i} for i in range(5)]).encode("utf-8")
+
+    for cut in (body[:-1], body[:-6]):  # missing "]" / cut mid-object
+        with pytest.raises(ValueError, match="Truncated"):
+            list(_iter_json_array(_FakeStreamResponse(cut, chunk_size=7)))
+
+
+def test_accumulator_matches_batch_stats():
+    from stats_service import CohortStatsAccumulator
+
+    rows = [
+        {"charge_disposition": "Plea Of Guilty", "disposition_date": "2023-03-01", "arraignment_date": "2023-01-01"},
+        {"charge_disposition": "Nolle Prosequi", "disposition_date": "2023-02-01", "arraignment_date": "2023-01-01"},
+        {"charge_disposition": "Nolle Prosequi", "disposition_date": "2023-02-01"},  # never arraigned
+    ]
+
+    acc = CohortStatsAccumulator(
+        user_stage_id="POST_ARRAIGNMENT_PRETRIAL",
+        offense_category=None,
+        charge_class=None,
+    )
+    for r in rows:
+        acc.add(r)
+
+    streamed = acc.result()
+    batch = compute_comparison_stats(
+        rows,
+        user_stage_id="POST_ARRAIGNMENT_PRETRIAL",
+        offense_category=None,
+        charge_class=None,
+    )
+
+    assert streamed == batch
+    assert streamed["sample_size"] == 2
+    assert streamed["time_to_disposition_days"]["n"] == 2
+
+
+def test_parallel_fetch_yields_pages_in_offset_order(monkeypatch):
+    import time
+    import stats_service
+    from stats_service import DispositionQuery, iter_dispositions
+
+    calls = []
+
+    def fake_fetch_page(query, offset, order):
+        calls.append((offset, order))
+        # later pages finish first; output must still be ordered
+        time.sleep(0.01 * (3 - offset // 2))
+        return [{"i": i} for i in range(offset, min(offset + query.limit, 7))]
+
+    monkeypatch.setattr(stats_service, "count_dispositions", lambda q: 7)
+    monkeypatch.setattr(stats_service, "_fetch_page", fake_fetch_page)
+
+    rows = list(iter_dispositions(DispositionQuery(where="x", limit=2, max_workers=3)))
+
+    assert [r["i"] for r in rows] == list(range(7))
+    assert sorted(off for off, _ in calls) == [0, 2, 4, 6]
+    assert all(order == ":id" for _, order in calls)
+
+
+def test_failed_refresh_keeps_previous_good_result(monkeypatch):
+    import requests
+    import stats_service
+
+    key = stats_service.cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", None)
+    good = {"sample_size": 10}
+    snapshot = stats_service.DispositionSnapshot()
+    snapshot.put(key, good)
+    monkeypatch.setattr(stats_service, "DISPOSITION_SNAPSHOT", snapshot)
+
+    def boom(query):
+        raise requests.exceptions.ConnectionError()
+
+    monkeypatch.setattr(stats_service, "iter_dispositions", boom)
+
+    out = stats_service.compute_comparison_stats_for_user_context(
+        user_stage_id="POST_ARRAIGNMENT_PRETRIAL",
+        user_offense_category="Narcotics",
+        user_charge_class=None,
+        refresh=True,
+    )
+
+    assert out is good
+
+
+def test_accumulators_merge_across_partitions():
+    from stats_service import CohortStatsAccumulator
+
+    rows = [
+        {"charge_disposition": "Plea Of Guilty", "disposition_date": f"2023-{m:02d}-01", "arraignment_date": "2023-01-01"}
+        for m in range(1, 13)
+    ]
+
+    def acc():
+        return CohortStatsAccumulator(
+            user_stage_id="POST_ARRAIGNMENT_PRETRIAL", offense_category=None, charge_class=None
+        )
+
+    whole = acc().add_all(rows).result()
+    merged = acc().add_all(rows[:5]).merge(acc().add_all(rows[5:])).result()
+
+    assert merged == whole
+    assert merged["time_to_disposition_days"]["n"] == 12
+
+
+def test_stage_transition_matrix_covers_each_milestone_pair():
+    rows = [
+        {
+            "charge_disposition": "Plea Of Guilty",
+            "arrest_date": "2023-01-01T00:00:00.000",
+            "arraignment_date": "2023-01-11T00:00:00.000",
+            "disposition_date": "2023-04-11T00:00:00.000",
+        },
+        {
+            "charge_disposition": "Nolle Prosequi",
+            "arrest_date": "2023-02-01",
+            "arraignment_date": "2023-01-01",  # out of order -> skipped for that pair
+            "disposition_date": "2023-03-01",
+        },
+    ]
+
+    stats = compute_comparison_stats(
+        rows,
+        user_stage_id="POST_ARRAIGNMENT_PRETRIAL",
+        offense_category=None,
+        charge_class=None,
+    )
+    by_pair = {(t["from"], t["to"]): t for t in stats["stage_transitions"]}
+
+    assert set(by_pair) == {
+        ("arrest_date", "arraignment_date"),
+        ("arrest_date", "disposition_date"),
+        ("arraignment_date", "disposition_date"),
+    }
+
+    arrest_to_arraignment = by_pair[("arrest_date", "arraignment_date")]
+    assert arrest_to_arraignment["n"] == 1
+    assert arrest_to_arraignment["out_of_order_skipped"] == 1
+    assert abs(arrest_to_arraignment["median"] - 10) <= 0.1
+
+    hist = by_pair[("arraignment_date", "disposition_date")]["histogram"]
+    assert sum(b["count"] for b in hist) == 2
+    assert [b["count"] for b in hist if b["from_days"] == 90] == [1]
+
+
+def test_cohort_refresh_folds_only_changed_rows(monkeypatch):
+    import stats_service
+    from stats_service import CohortState
+
+    base = [
+        {":id": "a", ":updated_at": "2024-01-01T00:00:00.000Z", "charge_disposition": "Nolle Prosequi",
+         "disposition_date": "2023-02-01", "arraignment_date": "2023-01-01"},
+        {":id": "b", ":updated_at": "2024-01-02T00:00:00.000Z", "charge_disposition": "Plea Of Guilty",
+         "disposition_date": "2023-03-01", "arraignment_date": "2023-01-01"},
+    ]
+    delta = [
+        # row b corrected: now a finding of not guilty
+        {":id": "b", ":updated_at": "2024-02-01T00:00:00.000Z", "charge_disposition": "Finding Not Guilty",
+         "disposition_date": "2023-03-01", "arraignment_date": "2023-01-01"},
+        {":id": "c", ":updated_at": "2024-02-02T00:00:00.000Z", "charge_disposition": "Nolle Prosequi",
+         "disposition_date": "2023-04-01", "arraignment_date": "2023-01-01"},
+    ]
+    queries = []
+
+    def fake_iter(query):
+        queries.append(query)
+        return iter(base if len(queries) == 1 else delta)
+
+    monkeypatch.setattr(stats_service, "iter_dispositions", fake_iter)
+
+    state = CohortState(user_stage_id="POST_ARRAIGNMENT_PRETRIAL", offense_category=None, charge_class=None)
+    state.build()
+    assert state.result()["outcomes_counts"] == {"dismissed_or_nolle": 1, "convicted": 1}
+
+    fetched = state.refresh()
+    out = state.result()
+
+    assert fetched == 2
+    assert ":updated_at >= '2024-01-02T00:00:00.000'" in queries[1].where
+    assert out["sample_size"] == 3
+    assert out["outcomes_counts"] == {"dismissed_or_nolle": 2, "acquitted": 1}
+    assert out["time_to_disposition_days"]["n"] == 3
+    assert out["data_as_of"] == "2024-02-02T00:00:00.000Z"
+
+
+def test_cohort_refresh_rebuilds_to_drop_rows_edited_out_of_the_cohort(monkeypatch):
+    import stats_service
+    from stats_service import CohortState
+
+    row = {"charge_disposition": "Nolle Prosequi", "disposition_date": "2023-02-01", "arraignment_date": "2023-01-01"}
+    base = [
+        dict(row, **{":id": "a", ":updated_at": "2024-01-01T00:00:00.000Z"}),
+        dict(row, **{":id": "b", ":updated_at": "2024-01-02T00:00:00.000Z"}),
+    ]
+    # row b was reclassified upstream: it no longer matches the cohort $where, so no query returns it
+    after_edit = base[:1]
+    queries = []
+
+    def fake_iter(query):
+        queries.append(query)
+        return iter(base if len(queries) == 1 else after_edit)
+
+    monkeypatch.setattr(stats_service, "iter_dispositions", fake_iter)
+
+    state = CohortState(user_stage_id="POST_ARRAIGNMENT_PRETRIAL", offense_category=None, charge_class=None)
+    state.build()
+    assert state.result()["sample_size"] == 2
+
+    # a delta refresh can't see the edit
+    state.refresh()
+    assert state.result()["sample_size"] == 2
+
+    state.built_at -= state.full_rebuild_sec
+    state.refresh()
+
+    assert ":updated_at" not in queries[-1].where
+    assert state.result()["sample_size"] == 1
+
+
+def test_outcome_stats_tool_reads_shared_snapshot(monkeypatch):
+    import stats_service
+    import tools
+
+    key = stats_service.cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", "4")
+    cached = {"sample_size": 42}
+    snapshot = stats_service.DispositionSnapshot()
+    snapshot.put(key, cached)
+    monkeypatch.setattr(stats_service, "DISPOSITION_SNAPSHOT", snapshot)
+
+    def no_fetch(query):
+        raise AssertionError("tool must not download dispositions when the snapshot is fresh")
+
+    monkeypatch.setattr(stats_service, "iter_dispositions", no_fetch)
+
+    out = tools.get_outcome_stats(stage_id="POST_ARRAIGNMENT_PRETRIAL", offense_category="narcotics", charge_class="4")
+
+    assert out is cached
+
+
+def test_snapshot_entries_expire():
+    from stats_service import DispositionSnapshot
+
+    snapshot = DispositionSnapshot(ttl_sec=10, error_ttl_sec=1)
+    ok = snapshot.put(("s", "", ""), {"sample_size": 1})
+    err = snapshot.put(("s", "x", ""), {"skipped": True})
+
+    assert ok.is_fresh(now=ok.fetched_at + 5)
+    assert not ok.is_fresh(now=ok.fetched_at + 11)
+    assert not err.is_fresh(now=err.fetched_at + 5)
+
+
+def test_ingest_row_converts_dates_to_epoch_days_once():
+    from stats_service import EPOCH_DAYS_KEY, NO_DATE, TRANSITION_DATE_KEYS, _time_to_disposition_days, ingest_row
+
+    row = ingest_row({
+        "arraignment_date": "1970-01-11T00:00:00.000",
+        "disposition_date": "1970-02-10T00:00:00.000",
+        "arrest_date": "not a date",
+    })
+    days = dict(zip(TRANSITION_DATE_KEYS, row[EPOCH_DAYS_KEY]))
+
+    assert days["arraignment_date"] == 10
+    assert days["disposition_date"] == 40
+    assert days["arrest_date"] == NO_DATE
+    assert days["sentence_date"] == NO_DATE
+
+    # downstream consumers read the ingested ints, not the strings
+    row["disposition_date"] = "garbage"
+    assert _time_to_disposition_days(row) == 30
+
+
+def test_low_budget_serves_stale_stats_without_fetching(monkeypatch):
+    import stats_service
+    from deadline import Deadline
+
+    key = stats_service.cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Narcotics", None)
+    stale = {"sample_size": 10}
+    snapshot = stats_service.DispositionSnapshot(ttl_sec=0)
+    snapshot.put(key, stale)
+    monkeypatch.setattr(stats_service, "DISPOSITION_SNAPSHOT", snapshot)
+
+    def no_fetch(query):
+        raise AssertionError("must not start a cohort fetch without budget")
+
+    monkeypatch.setattr(stats_service, "iter_dispositions", no_fetch)
+
+    args = dict(user_stage_id="POST_ARRAIGNMENT_PRETRIAL", user_offense_category="Narcotics", user_charge_class=None)
+    out = stats_service.compute_comparison_stats_for_user_context(**args, deadline=Deadline.after(1))
+    assert out is stale
+
+    # cold cohort: skipped, and the skip is not cached
+    other = dict(args, user_offense_category="Theft")
+    out = stats_service.compute_comparison_stats_for_user_context(**other, deadline=Deadline.after(1))
+    assert out["skipped"] and "time" in out["reason"]
+    assert snapshot.get(stats_service.cohort_cache_key("POST_ARRAIGNMENT_PRETRIAL", "Theft", None)) is None
+
+
+def test_socrata_requests_under_a_deadline_are_not_retried():
+    import stats_service
+    from deadline import Deadline
+
+    def retries(query):
+        return stats_service._thread_session(query.http_retries()).get_adapter("https://").max_retries.total
+
+    assert retries(stats_service.DispositionQuery()) == 4
+    assert retries(stats_service.DispositionQuery(deadline=Deadline.after(30))) == 0
+
+
+def test_stats_wait_keeps_the_llm_reserve(monkeypatch):
+    import stats_service
+    from deadline import Deadline
+
+    snapshot = stats_service.DispositionSnapshot()
+    monkeypatch.setattr(stats_service, "DISPOSITION_SNAPSHOT", snapshot)
+    monkeypatch.setattr(stats_service, "STATS_MIN_BUDGET_SEC", 0.0)
+    monkeypatch.setattr(stats_service, "STATS_LLM_RESERVE_SEC", 0.8)
+
+    args = dict(user_stage_id="POST_ARRAIGNMENT_PRETRIAL", user_offense_category="Theft", user_charge_class=None)
+    # the warmer is building this cohort
+    lock = snapshot.key_lock(stats_service.cohort_cache_key(args["user_stage_id"], "Theft", None))
+    lock.acquire()
+    try:
+        deadline = Deadline.after(1.0)
+        out = stats_service.compute_comparison_stats_for_user_context(**args, deadline=deadline)
+    finally:
+        lock.release()
+
+    assert out["skipped"]
+    # gave up with the reserve still left for the answer
+    assert deadline.remaining() > 0.6
@@ -0,0 +1,44 @@
+from template_answers import fast_path_mode, render_timeline_summary, render_where_am_i
+
+PACK = {
+    "stage": {"stage_id": "POST_ARRAIGNMENT_PRETRIAL", "stage_label": "Pretrial"},
+    "stage_card": {
+        "title": "Pretrial (post-arraignment)",
+        "where_you_are": "Case is post-arraignment.",
+        "what_this_means": ["Arraignment has occurred"],
+        "what_usually_happens_next": ["Pretrial conferences are often scheduled", "Discovery materials may be exchanged"],
+        "what_not_yet": ["No disposition recorded"],
+        "data_limits": "Public dataset does not include upcoming court dates.",
+    },
+}
+
+
+def test_timeline_summary_lists_events_and_current_node():
+    timeline = {
+        "stage": "Pretrial",
+        "now_node_id": "arraignment_date",
+        "nodes": [
+            {"id": "arrest_date", "date": "2023-01-05", "title": "Arrest"},
+            {"id": "arraignment_date", "date": "2023-03-02", "title": "Arraignment"},
+        ],
+    }
+    text = render_timeline_summary(timeline, PACK)
+
+    assert "- Jan 5, 2023: Arrest\n- Mar 2, 2023: Arraignment" in text
+    assert "The highlighted step, Arraignment on Mar 2, 2023" in text
+    assert "Pretrial conferences are often scheduled. Discovery materials may be exchanged." in text
+    assert render_timeline_summary({"nodes": []}, PACK).startswith("Your timeline is empty")
+
+
+def test_where_am_i_uses_stage_card():
+    text = render_where_am_i(PACK)
+    assert text.startswith("Right now, your record shows you’re in the Pretrial stage. Case is post-arraignment.")
+    assert "What hasn’t happened yet: No disposition recorded." in text
+
+
+def test_fast_path_mode_is_selectable_per_intent(monkeypatch):
+    assert fast_path_mode("timeline") == "template"
+    monkeypatch.setenv("FAST_PATH_TIMELINE", "template+llm")
+    monkeypatch.setenv("FAST_PATH_WHERE_AM_I", "bogus")
+    assert fast_path_mode("timeline") == "template+llm"
+    assert fast_path_mode("where_am_i") == "llm"
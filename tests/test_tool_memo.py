@@ -0,0 +1,49 @@
+from tool_memo import ToolMemo, memo_key
+
+
+def test_outcome_stats_key_ignores_case_and_whitespace():
+    a = memo_key("get_outcome_stats", {"stage_id": "POST_ARRAIGNMENT_PRETRIAL", "offense_category": "Narcotics", "charge_class": "4"})
+    b = memo_key("get_outcome_stats", {"stage_id": "POST_ARRAIGNMENT_PRETRIAL", "offense_category": " narcotics ", "charge_class": "4 "})
+
+    assert a == b
+
+
+def test_request_and_session_scopes():
+    session_store = {}
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"sample_size": 3}
+
+    turn1 = ToolMemo(session_store)
+    turn1.call("get_outcome_stats", {"stage_id": "S"}, compute)
+    turn1.call("get_outcome_stats", {"stage_id": "S"}, compute)
+
+    turn2 = ToolMemo(session_store)
+    turn2.call("get_outcome_stats", {"stage_id": "S"}, compute)
+
+    assert len(calls) == 1
+    assert turn1.hits == 1 and turn2.hits == 1
+
+
+def test_failed_results_are_not_reused_across_turns():
+    session_store = {}
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"skipped": True, "reason": "timeout"}
+
+    ToolMemo(session_store).call("get_outcome_stats", {"stage_id": "S"}, compute)
+    ToolMemo(session_store).call("get_outcome_stats", {"stage_id": "S"}, compute)
+
+    assert len(calls) == 2
+
+
+def test_case_scoped_tools_do_not_leak_between_cases():
+    memo = ToolMemo()
+    a = memo.call("search_case_record", {"query_type": "dates"}, lambda: "case-1", scope="1")
+    b = memo.call("search_case_record", {"query_type": "DATES"}, lambda: "case-2", scope="2")
+
+    assert (a, b) == ("case-1", "case-2")
@@ -0,0 +1,113 @@
+# tool_memo.py
+# Memoizes tool results within one /chat request and across a session's turns.
+# - Key: tool name + normalized arguments (+ the active case id for case-scoped tools)
+# - Request scope: everything, including skipped/error results (never repeat work in one turn)
+# - Session scope: only successful results, with a TTL so stats don't go stale in long sessions
+# Shared by api.py (stats hook) and llm_client_openai.py (LLM tool calls, which may run concurrently).
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+from stats_service import cohort_cache_key
+
+
+TOOL_MEMO_TTL_SEC = float(os.getenv("TOOL_MEMO_TTL_SEC", "900"))
+
+
+def _normalize_value(v: Any) -> Any:
+    if isinstance(v, str):
+        return " ".join(v.split())
+    return v
+
+
+def _normalize_outcome_stats_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    stage_id, oc, cls = cohort_cache_key(args.get("stage_id"), args.get("offense_category"), args.get("charge_class"))
+    return {"stage_id": stage_id, "offense_category": oc, "charge_class": cls}
+
+
+def _normalize_search_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: _normalize_value(v) for k, v in args.items() if v not in (None, "")}
+    out["query_type"] = (out.get("query_type") or "all").strip().lower()
+    if "contains_text" in out:
+        # matching in search_case_record is case-insensitive
+        out["contains_text"] = out["contains_text"].lower()
+    return out
+
+
+_NORMALIZERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "get_outcome_stats": _normalize_outcome_stats_args,
+    "search_case_record": _normalize_search_args,
+}
+
+
+def memo_key(tool_name: str, args: Dict[str, Any], scope: Optional[str] = None) -> str:
+    normalize = _NORMALIZERS.get(tool_name)
+    if normalize:
+        norm = normalize(args or {})
+    else:
+        norm = {k: _normalize_value(v) for k, v in (args or {}).items() if v not in (None, "")}
+    return json.dumps([tool_name, scope or "", norm], sort_keys=True, default=str)
+
+
+def _cacheable_across_turns(result: Any) -> bool:
+    return not (isinstance(result, dict) and (result.get("skipped") or result.get("error")))
+
+
+class ToolMemo:
+    """
+    One instance per request. Pass the session's dict as session_store to share
+    results across turns (Session.tool_memo).
+    """
+
+    def __init__(
+        self,
+        session_store: Optional[Dict[str, Tuple[float, Any]]] = None,
+        *,
+        ttl_sec: float = TOOL_MEMO_TTL_SEC,
+    ):
+        self._request: Dict[str, Any] = {}
+        self._session = session_store if session_store is not None else {}
+        self.ttl_sec = ttl_sec
+        # guards the dicts only; tools themselves run unlocked so concurrent calls overlap
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def call(
+        self,
+        tool_name: str,
+        args: Dict[str, Any],
+        fn: Callable[[], Any],
+        *,
+        scope: Optional[str] = None,
+    ) -> Any:
+        key = memo_key(tool_name, args, scope)
+
+        with self._lock:
+            if key in self._request:
+                self.hits += 1
+                return self._request[key]
+
+            cached = self._session.get(key)
+            if cached is not None and (time.time() - cached[0]) < self.ttl_sec:
+                self.hits += 1
+                self._request[key] = cached[1]
+                return cached[1]
+
+            self.misses += 1
+
+        result = fn()
+
+        with self._lock:
+            self._request[key] = result
+            if _cacheable_across_turns(result):
+                now = time.time()
+                for k in [k for k, (ts, _) in self._session.items() if now - ts >= self.ttl_sec]:
+                    self._session.pop(k, None)
+                self._session[key] = (now, result)
+        return result
@@ -3,6 +3,8 @@ from __future__ import annotations
 from typing import Any, Dict, Optional, List, Tuple
 from datetime import datetime, timedelta
 
+from deadline import Deadline
+
 # -----------------------------
 # Existing search tool constants
 # -----------------------------
@@ -334,47 +336,41 @@ def search_case_record(
 
 
 # -----------------------------
-# Outcome stats tool (unchanged)
+# Outcome stats tool
 # -----------------------------
 
+# Reads the same shared, TTL'd disposition snapshot (stats_service.DISPOSITION_SNAPSHOT)
+# as the /chat stats hook, so a tool call right after the hook is a cache hit.
 from stats_service import (
-    fetch_dispositions,
-    DispositionQuery,
+    SUPPORTED_STAGE_IDS_FOR_STATS,
     compute_comparison_stats_for_user_context,
 )
 
-_DISP_CACHE: dict[str, Any] = {"rows": None, "fetched_at": None}
-
-from typing import Optional, Dict, Any
-
 
 def get_outcome_stats(
     *,
     stage_id: Optional[str],
     offense_category: Optional[str] = None,
     charge_class: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
 ) -> Dict[str, Any]:
     if not stage_id:
         return {"skipped": True, "reason": "Missing stage_id"}
 
-    if stage_id not in {"POST_ARRAIGNMENT_EARLY_PRETRIAL", "POST_ARRAIGNMENT_PRETRIAL"}:
+    if stage_id not in SUPPORTED_STAGE_IDS_FOR_STATS:
         return {
             "skipped": True,
             "reason": "Stats currently supported only for post-arraignment stages.",
             "user_stage_id": stage_id,
         }
 
-    q = DispositionQuery(where="disposition_date IS NOT NULL", limit=50000)
-    rows = fetch_dispositions(q)
-
-    stats = compute_comparison_stats_for_user_context(
+    return compute_comparison_stats_for_user_context(
         user_stage_id=stage_id,
         user_offense_category=offense_category,
         user_charge_class=charge_class,
+        deadline=deadline,
     )
 
-    return stats
-
 
 # -----------------------------
 # NEW: Timeline builder (clean)